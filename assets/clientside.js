@@ -0,0 +1,129 @@
+// Clientside callbacks: page switching, navigation highlighting, KPI card selection/highlighting and
+// KPI number formatting run in the browser, so these no longer cost a round-trip to the server.
+// With DATA_PUSH the browser also listens for data changes here instead of polling.
+// Registered from dashboard.py with ClientsideFunction(namespace='dashboard', function_name=...).
+
+(function () {
+    var PAGES = ['/', '/page-2', '/page-3', '/page-4', '/page-5'];
+
+    var SHOW = {'display': 'block'};
+    var HIDE = {'display': 'none'};
+
+    var NAV_BASE = {
+        'fontWeight': 'bold',
+        'textDecoration': 'none',
+        'padding': '6.5px 18px',
+        'borderRadius': '22px',
+        'fontSize': '0.98rem'
+    };
+    var NAV_ACTIVE = Object.assign({}, NAV_BASE, {
+        'color': 'white',
+        'backgroundColor': '#1976d2',
+        'border': 'none',
+        'boxShadow': '0 2px 8px rgba(25, 118, 210, 0.10)'
+    });
+    var NAV_INACTIVE = Object.assign({}, NAV_BASE, {
+        'color': '#1976d2',
+        'backgroundColor': 'white',
+        'border': '1.5px solid #1976d2',
+        'boxShadow': '0 2px 8px rgba(25, 118, 210, 0.05)'
+    });
+
+    var CARD_STYLE = {'padding': '10px', 'textAlign': 'center', 'cursor': 'pointer', 'border': '1px solid #ddd', 'borderRadius': '5px', 'margin': '0 5px'};
+    var CARD_ACTIVE_STYLE = Object.assign({}, CARD_STYLE, {'border': '2px solid #007BFF', 'boxShadow': '0 0 5px #007BFF'});
+
+    // Card order of every analysis page; PO Count is never a selectable measure
+    var KPI_MEASURES = ['Order Amount', 'Revenue Amount', 'Cash Amount', 'Backlog Amount', 'Pending Amount'];
+    var KPI_CARDS = KPI_MEASURES.concat(['PO Count']);
+
+    var amountFormat = new Intl.NumberFormat('en-US', {maximumFractionDigits: 0});
+    var countFormat = new Intl.NumberFormat('en-US');
+
+    function pageIndex(pathname) {
+        var index = PAGES.indexOf(pathname);
+        return index < 0 ? 0 : index;  // unknown paths show the Main Dashboard
+    }
+
+    function actualColumn(base, measureCols) {
+        return (measureCols && measureCols[base]) || base;
+    }
+
+    function formatKpi(base, value) {
+        if (value === null || value === undefined) {
+            return 'N/A';
+        }
+        return base === 'PO Count' ? countFormat.format(value) : '€' + amountFormat.format(value);
+    }
+
+    var dataPush = null;
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        dashboard: {
+            display_page: function (pathname) {
+                var active = pageIndex(pathname);
+                return PAGES.map(function (_, i) { return i === active ? SHOW : HIDE; });
+            },
+
+            // Refresh token of the page mounted at `path`: a new value on every tick or navigation while
+            // it is the visible page, no_update while hidden (so hidden pages send no requests)
+            page_refresh: function (path, pathname) {
+                if (PAGES[pageIndex(pathname)] !== path) {
+                    return window.dash_clientside.no_update;
+                }
+                return Date.now();
+            },
+
+            navigation: function (pathname) {
+                var active = pageIndex(pathname);
+                return PAGES.map(function (_, i) { return i === active ? NAV_ACTIVE : NAV_INACTIVE; });
+            },
+
+            // Inputs are the five KPI cards of a page in KPI_MEASURES order, then State measure-cols-store
+            select_measure: function () {
+                var ctx = window.dash_clientside.callback_context;
+                var measureCols = arguments[KPI_MEASURES.length];
+                if (!ctx.triggered.length) {
+                    return window.dash_clientside.no_update;
+                }
+                var cardId = ctx.triggered[0].prop_id.split('.')[0];
+                for (var i = 0; i < KPI_MEASURES.length; i++) {
+                    if (ctx.inputs_list[i].id === cardId) {
+                        return actualColumn(KPI_MEASURES[i], measureCols);
+                    }
+                }
+                return window.dash_clientside.no_update;
+            },
+
+            card_styles: function (selected, measureCols) {
+                return KPI_CARDS.map(function (base) {
+                    var active = base !== 'PO Count' && selected === actualColumn(base, measureCols);
+                    return active ? CARD_ACTIVE_STYLE : CARD_STYLE;
+                });
+            },
+
+            // One EventSource per tab; every data token pushed by the server that differs from
+            // data-version-store is written into it, which re-renders the visible page once
+            connect_data_push: function (url, token) {
+                if (!url || dataPush || !window.EventSource) {
+                    return;
+                }
+                var last = token;
+                dataPush = new window.EventSource(url);
+                dataPush.addEventListener('data-version', function (event) {
+                    var token = JSON.parse(event.data);
+                    if (token !== last) {
+                        window.dash_clientside.set_props('data-version-store', {data: token});
+                    }
+                    last = token;
+                });
+            },
+
+            // kpis: {base measure: raw number} from the server; a missing store or value renders 'N/A'
+            format_kpis: function (kpis) {
+                return KPI_CARDS.map(function (base) {
+                    return formatKpi(base, kpis ? kpis[base] : null);
+                });
+            }
+        }
+    });
+})();
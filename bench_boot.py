@@ -0,0 +1,50 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Boot benchmark: how long `import dashboard` takes in a fresh interpreter, i.e. what a gunicorn worker pays
+# before it can accept requests. Run it before and after changes touching imports or startup.
+#   python bench_boot.py                          both startup modes, 5 runs each
+#   python bench_boot.py --mode deferred --max-seconds 2.5
+#                                                 exits 1 when the median import is slower (for CI)
+# Data loading uses whatever credentials are configured; without them the eager mode's fetch fails fast.
+
+HEAVY_MODULES = ['plotly.express', 'googleapiclient.discovery']
+
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+import dashboard
+print(json.dumps({'seconds': time.perf_counter() - started, 'loaded': [m for m in %r if m in sys.modules]}))
+''' % (HEAVY_MODULES,)
+
+def boot_once(mode):
+    env = dict(os.environ, STARTUP_MODE=mode, LOG_LEVEL='ERROR', HISTORY_DB=os.environ.get('HISTORY_DB', ''))
+    out = subprocess.run([sys.executable, '-c', CHILD], env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def bench(mode, runs):
+    results = [boot_once(mode) for _ in range(runs)]
+    seconds = sorted(r['seconds'] for r in results)
+    median = statistics.median(seconds)
+    print(f"{mode:>8}: median {median:.3f}s  min {seconds[0]:.3f}s  max {seconds[-1]:.3f}s  "
+          f"heavy modules imported: {', '.join(results[-1]['loaded']) or 'none'}")
+    return median
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure dashboard import (worker boot) time')
+    parser.add_argument('--mode', choices=['deferred', 'eager', 'both'], default='both')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, help='fail when the median deferred (or --mode) import is slower')
+    args = parser.parse_args()
+
+    modes = ['deferred', 'eager'] if args.mode == 'both' else [args.mode]
+    medians = {mode: bench(mode, args.runs) for mode in modes}
+    if args.max_seconds is not None and medians[modes[0]] > args.max_seconds:
+        print(f"❌ {modes[0]} boot {medians[modes[0]]:.3f}s exceeds {args.max_seconds}s")
+        sys.exit(1)
+    sys.exit(0)
@@ -0,0 +1,196 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+# Concurrency benchmark of the gthread profile: one gunicorn worker serving page renders from 1, 2, 4, ...
+# threads, driven by a fixed number of concurrent clients. Throughput should grow with the threads up to the
+# number of cores (the aggregations and JSON encoding release the GIL only in parts, so expect less than linear).
+#   python bench_threads.py                          threads 1 2 4 8, 100k synthetic sheet rows, 15 s each
+#   python bench_threads.py --threads 1 4 --seconds 30 --min-scaling 1.5
+#                                                    exits 1 when the most threads do not reach 1.5x one thread
+# The server loads a synthetic sheet from a temporary history store (no Google credentials needed), with the
+# figure cache off so every request runs its query and builds its figures.
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PAGE_PATHS = {'main': '/', 'p2': '/page-2', 'p3': '/page-3', 'p4': '/page-4', 'p1': '/page-5'}
+# region, year and period dropdowns and measure store of each page's render callback
+PAGE_INPUTS = {
+    'main': ('main-region', 'main-year', 'main-period', None),
+    'p1': ('p1-region-filter', 'year-filter1', 'p1-period-filter', 'measure-store'),
+    'p2': ('specific-region-filter', 'region-year-filter', 'p2-period-filter', 'region-measure-store'),
+    'p3': ('sm-region-filter', 'sm-year-filter', 'p3-period-filter', 'sm-measure-store'),
+    'p4': ('year-region-filter', 'p4-year-filter', 'p4-period-filter', 'year-measure-store'),
+}
+REGIONS = [f'Region {i}' for i in range(1, 6)] + ['All']
+YEARS = [None, 2023, 2024, 2025]
+PERIODS = [None, 'Monthly', 'Quarterly']
+MEASURES = ['Order Amount', 'Revenue Amount', 'Cash Amount', 'Backlog Amount', 'Pending Amount']
+
+def synthetic_sheet(rows, seed=0):
+    """Cleaned sheet rows (history store layout) with realistic cardinalities: a few regions, many customers."""
+    rng = np.random.default_rng(seed)
+    pick = lambda prefix, n: np.array([f'{prefix} {i}' for i in range(1, n + 1)])[rng.integers(0, n, rows)]
+    months = pd.date_range('2023-01-01', periods=36, freq='MS')
+    return pd.DataFrame({
+        'SM': pick('SM', 12),
+        'Month': months[rng.integers(0, len(months), rows)],
+        'Customer': pick('Customer', 300),
+        'Project': pick('Project', 80),
+        'PO REF': pick('PO', max(rows // 4, 1)),
+        'Region': pick('Region', 5),
+        'Order Amount': rng.integers(100, 20000, rows).astype(float),
+        'Revenue Amount': rng.integers(100, 20000, rows).astype(float),
+        'Cash Amount': rng.integers(100, 20000, rows).astype(float),
+        'Pending Amount': rng.integers(0, 2000, rows).astype(float),
+        'Backlog Amount': rng.integers(0, 2000, rows).astype(float),
+    })
+
+def write_history(path, rows, seed=0):
+    """Store a synthetic sheet as the newest version of a history store at path (in a child interpreter)."""
+    child = ('import sys, bench_threads, dashboard\n'
+             f'data = bench_threads.synthetic_sheet({rows}, {seed})\n'
+             'sys.exit(0 if dashboard.record_sheet_version(data, dashboard.compute_df_hash(data)) else 1)\n')
+    env = dict(os.environ, HISTORY_DB=path, STARTUP_MODE='deferred', LOG_LEVEL='ERROR')
+    subprocess.run([sys.executable, '-c', child], env=env, cwd=ROOT, check=True)
+
+def start_server(port, history_db, threads, workdir, extra_env=None):
+    """gunicorn with the threads profile on port, serving the stored synthetic sheet; returns once /ready is 200.
+
+    extra_env overrides the server environment (another GUNICORN_PROFILE, the figure cache, ...).
+    """
+    env = dict(os.environ, PORT=str(port), GUNICORN_PROFILE='threads', GUNICORN_THREADS=str(threads),
+               HISTORY_DB=history_db, MONITOR_LOCK_FILE=os.path.join(workdir, 'monitor.lock'),
+               HOOK_STAMP_FILE=os.path.join(workdir, 'hook.stamp'), SHEETS_BUDGET_FILE=os.path.join(workdir, 'budget.json'),
+               FIGURE_CACHE_SIZE='0', LOG_LEVEL='WARNING', GOOGLE_CREDENTIALS='')
+    env.update(extra_env or {})
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'dashboard:server'],
+                              env=env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 300
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {server.returncode}")
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/ready', timeout=5) as resp:
+                if resp.status == 200:
+                    return server
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("server did not become ready")
+
+def get_json(base, path):
+    with urllib.request.urlopen(base + path, timeout=30) as resp:
+        return json.load(resp)
+
+def post_callback(base, payload):
+    """POST one callback payload; returns its HTTP status (204 counts as success: nothing to update)."""
+    req = urllib.request.Request(base + '/_dash-update-component', data=json.dumps(payload).encode('utf-8'), method='POST',
+                                 headers={'Content-Type': 'application/json', 'Accept-Encoding': 'gzip'})
+    try:
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            resp.read()
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+def callback_payload(dependency, values, pathname):
+    """Request body of a callback from its /_dash-dependencies entry: inputs from values (else None), url state."""
+    outputs = [dict(zip(('id', 'property'), o.split('.', 1))) for o in dependency['output'].strip('.').split('...')]
+    def prop(item, value):
+        return {'id': item['id'], 'property': item['property'], 'value': value}
+    return {
+        'output': dependency['output'],
+        'outputs': outputs if len(outputs) > 1 else outputs[0],
+        'inputs': [prop(i, values.get(i['id'])) for i in dependency['inputs']],
+        'state': [prop(s, pathname if s['id'] == 'url' else values.get(s['id'])) for s in dependency['state']],
+        'changedPropIds': [f"{dependency['inputs'][-1]['id']}.{dependency['inputs'][-1]['property']}"],
+    }
+
+def render_payloads(base, seed=0, count=200):
+    """Page render callbacks of every page with varied region, year, period and measure."""
+    dependencies = get_json(base, '/_dash-dependencies')
+    renders = {page: next(d for d in dependencies if f'{page}-render-key.data' in d['output']) for page in PAGE_PATHS}
+    rnd = random.Random(seed)
+    payloads = []
+    for i in range(count):
+        page = rnd.choice(list(PAGE_PATHS))
+        region, year, period, measure = PAGE_INPUTS[page]
+        values = {f'{page}-refresh': i + 1,
+                  region: rnd.choice(REGIONS if page != 'main' else REGIONS[:-1] + [None]),
+                  year: rnd.choice(YEARS),
+                  period: rnd.choice(PERIODS)}
+        if measure:
+            values[measure] = rnd.choice(MEASURES)
+        payloads.append(callback_payload(renders[page], values, PAGE_PATHS[page]))
+    return payloads
+
+def drive(base, payloads, clients, seconds):
+    """Send payloads round-robin from `clients` threads for `seconds`; returns (completed, errors, elapsed)."""
+    counts = {'done': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def client(offset):
+        i = offset
+        while time.monotonic() < deadline:
+            status = post_callback(base, payloads[i % len(payloads)])
+            with lock:
+                counts['done' if status in (200, 204) else 'errors'] += 1
+            i += clients
+
+    started = time.monotonic()
+    workers = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return counts['done'], counts['errors'], time.monotonic() - started
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Page render throughput of one gthread worker by thread count')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--clients', type=int, default=16, help='concurrent clients (same for every thread count)')
+    parser.add_argument('--seconds', type=float, default=15)
+    parser.add_argument('--rows', type=int, default=100_000, help='synthetic sheet rows')
+    parser.add_argument('--port', type=int, default=8091)
+    parser.add_argument('--min-scaling', type=float, help='fail when the most threads reach less than this x one thread')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_threads_')
+    history_db = os.path.join(workdir, 'history.sqlite')
+    write_history(history_db, args.rows)
+    print(f"{args.rows} synthetic rows, {args.clients} clients, {args.seconds:g}s per run, {os.cpu_count()} CPUs")
+
+    results = {}
+    for threads in args.threads:
+        server = start_server(args.port, history_db, threads, workdir)
+        try:
+            base = f'http://127.0.0.1:{args.port}'
+            payloads = render_payloads(base)
+            drive(base, payloads[:10], min(args.clients, 4), 2)  # warm up: engine models, layout, imports
+            done, errors, elapsed = drive(base, payloads, args.clients, args.seconds)
+        finally:
+            server.terminate()
+            server.wait()
+        results[threads] = done / elapsed
+        scaling = results[threads] / results[args.threads[0]]
+        print(f"threads {threads:>3}: {results[threads]:7.2f} req/s  ({done} ok, {errors} errors)  x{scaling:.2f}")
+
+    if args.min_scaling is not None:
+        scaling = results[args.threads[-1]] / results[args.threads[0]]
+        if scaling < args.min_scaling:
+            print(f"❌ {args.threads[-1]} threads reach x{scaling:.2f} of {args.threads[0]}, below x{args.min_scaling}")
+            sys.exit(1)
+    sys.exit(0)
@@ -1,44 +1,340 @@
 import dash
-from dash import dcc, html, Input, Output, State, callback_context, dash_table
-import plotly.express as px
+from dash import dcc, html, Input, Output, State, callback_context, dash_table, ClientsideFunction
 import pandas as pd
 import numpy as np
-from datetime import datetime
+import plotly.colors
+import plotly.graph_objects as go
+import plotly.io
+from datetime import datetime, timedelta
+import gzip
 import io
 import json
-import traceback
+import logging
+import sys
 import os
 import time
-import zipfile
+import random
 import threading
 import hashlib
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
+import hmac
+import cProfile
+import functools
+import collections
+import contextlib
+import sqlite3
+import tempfile
+from urllib.parse import urlencode
+from flask import Response, request, jsonify, g, send_from_directory
+try:
+    import fcntl  # cross-worker lock of the Sheets call budget (POSIX only)
+except ImportError:
+    fcntl = None
 
 # Global variables for data caching (in-memory, no files needed)
 last_modified_time = 0
 monitoring_active = True
 
-# Cached transformed data (in-memory)
-cached_orders = pd.DataFrame()
-cached_revenues = pd.DataFrame()
-cached_cash = pd.DataFrame()
-cached_merged = pd.DataFrame()
-cached_measure_cols = {}
-data_lock = threading.Lock()
-last_sheet_hash = ''  # Will be set after first transform
+last_sheet_check_at = None  # when the sheet was last fetched successfully (changed or not)
+sheet_monitor_thread = None
+
+# ---------- Data model registry ----------
+#
+# The loaded model is an immutable snapshot: the fact tables, the merged table and the measure column map,
+# plus its version and where it came from. transform_data() builds a new snapshot and publish_model() swaps
+# it in with a single reference assignment, so readers take no lock: a request calls current_model() once
+# and uses that snapshot throughout, even if a refresh publishes another one meanwhile. Frames in a
+# published snapshot are never modified. subscribe_model(fn) runs fn(snapshot) after every publish (the
+# figure pre-render); the data push streams are woken after the subscribers.
+
+ModelSnapshot = collections.namedtuple('ModelSnapshot', [
+    'version',        # bumped by every publish; part of each page's render key and figure cache key
+    'orders', 'revenues', 'cash', 'merged', 'measure_cols',
+    'source',         # None (nothing loaded yet), 'sheet' or 'history' (a version from the local history store)
+    'built_at',       # when the model was built
+    'sheet_hash',     # hash of the sheet rows it was built from ('' if unknown)
+    'sheet_version',  # stored history version of those rows (None when history is off or not yet recorded)
+])
+EMPTY_MODEL = ModelSnapshot(0, pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), {}, None, None, '', None)
+
+_model = {'current': EMPTY_MODEL}
+_model_publish_lock = threading.Lock()
+_model_subscribers = []
+data_changed = threading.Condition()  # notified after every publish (wakes the data push streams)
+
+def current_model():
+    """The published model snapshot (EMPTY_MODEL until the first load)."""
+    return _model['current']
+
+def subscribe_model(fn):
+    """Run fn(snapshot) after every publish_model() (usable as a decorator)."""
+    _model_subscribers.append(fn)
+    return fn
+
+def publish_model(orders, revenues, cash, merged, measure_cols, source, sheet_hash='', sheet_version=None):
+    """Publish a newly built model as the next version, run the subscribers and wake the data push streams."""
+    with _model_publish_lock:
+        snapshot = ModelSnapshot(_model['current'].version + 1, orders, revenues, cash, merged, measure_cols,
+                                 source, datetime.now(), sheet_hash or '', sheet_version)
+        _model['current'] = snapshot
+    for subscriber in list(_model_subscribers):
+        try:
+            subscriber(snapshot)
+        except Exception as e:
+            logger.warning(f"Model subscriber {subscriber.__name__} failed: {e}", exc_info=True)
+    with data_changed:
+        data_changed.notify_all()
+    return snapshot
+
+def set_model_sheet_version(sheet_hash, sheet_version):
+    """Record the stored history version of the published model, if it is still the one built from sheet_hash."""
+    with _model_publish_lock:
+        if _model['current'].sheet_hash == sheet_hash:
+            _model['current'] = _model['current']._replace(sheet_version=sheet_version)
+
+# ---------- Logging ----------
+#
+# One JSON object per line on stdout (LOG_FORMAT=text for plain lines), filtered by LOG_LEVEL. The default
+# INFO keeps the request path silent: per-request messages are DEBUG, and those logged with
+# extra={'sample': True} are further sampled down to LOG_SAMPLE_RATE so DEBUG stays usable under load.
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 0.01))
+
+_LOG_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'sample'}
+
+class JsonLogFormatter(logging.Formatter):
+    """Single-line JSON records: time, level, logger, message, the record's extra fields and the exception."""
+    def format(self, record):
+        entry = {'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+                 'level': record.levelname, 'logger': record.name, 'message': record.getMessage()}
+        entry.update({k: v for k, v in vars(record).items() if k not in _LOG_RECORD_FIELDS})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class SampleFilter(logging.Filter):
+    """Lets through only LOG_SAMPLE_RATE of the records logged with extra={'sample': True}."""
+    def filter(self, record):
+        return not getattr(record, 'sample', False) or random.random() < LOG_SAMPLE_RATE
+
+logger = logging.getLogger('dashboard')
+if not logger.handlers:
+    _log_handler = logging.StreamHandler(sys.stdout)
+    _log_handler.setFormatter(JsonLogFormatter() if LOG_FORMAT == 'json'
+                              else logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    _log_handler.addFilter(SampleFilter())
+    logger.addHandler(_log_handler)
+    logger.propagate = False
+logger.setLevel(LOG_LEVEL)
+
+# ---------- Metrics (Prometheus text format, served at /metrics) ----------
+#
+# A small in-process registry: counters, gauges and histograms with labels, rendered in the Prometheus text
+# exposition format. Each gunicorn worker keeps its own registry, so scrape every worker (or run one).
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = (1e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7)
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+def define_metric(name, kind, help_text, buckets=None):
+    """Register a 'counter', 'gauge' or 'histogram' (with its upper bucket bounds)."""
+    _metrics[name] = {'kind': kind, 'help': help_text, 'buckets': buckets, 'series': {}}
+
+def _series(name, labels):
+    return _metrics[name]['series'], tuple(sorted((labels or {}).items()))
+
+def metric_inc(name, labels=None, value=1):
+    with _metrics_lock:
+        series, key = _series(name, labels)
+        series[key] = series.get(key, 0) + value
+
+def metric_set(name, labels=None, value=0):
+    with _metrics_lock:
+        series, key = _series(name, labels)
+        series[key] = value
+
+def metric_observe(name, labels=None, value=0):
+    with _metrics_lock:
+        series, key = _series(name, labels)
+        buckets = _metrics[name]['buckets']
+        counts = series.setdefault(key, [[0] * len(buckets), 0.0, 0])
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                counts[0][i] += 1
+        counts[1] += value
+        counts[2] += 1
+
+def stage_timer(name='dashboard_transform_stage_seconds'):
+    """Returns mark(stage), which observes the seconds since the previous mark (or since creation) for that stage."""
+    last = [time.perf_counter()]
+    def mark(stage):
+        now = time.perf_counter()
+        metric_observe(name, {'stage': stage}, now - last[0])
+        last[0] = now
+    return mark
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escape = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in pairs) + '}'
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    with _metrics_lock:
+        for name, metric in _metrics.items():
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['kind']}")
+            for labels, value in metric['series'].items():
+                if metric['kind'] != 'histogram':
+                    lines.append(f"{name}{_label_text(labels)} {value}")
+                    continue
+                counts, total, count = value
+                for bound, bucket_count in zip(metric['buckets'], counts):
+                    lines.append(f"{name}_bucket{_label_text(labels, [('le', f'{bound:g}')])} {bucket_count}")
+                lines.append(f"{name}_bucket{_label_text(labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{name}_sum{_label_text(labels)} {total}")
+                lines.append(f"{name}_count{_label_text(labels)} {count}")
+    return '\n'.join(lines) + '\n'
+
+define_metric('dashboard_callback_seconds', 'histogram', 'Dash callback request latency by callback (first output).', LATENCY_BUCKETS)
+define_metric('dashboard_callback_response_bytes', 'histogram', 'Dash callback response payload size by callback.', BYTES_BUCKETS)
+define_metric('dashboard_callback_wire_bytes', 'histogram', 'Dash callback response size as sent (after compression) by callback.', BYTES_BUCKETS)
+define_metric('dashboard_callback_over_budget_total', 'counter', 'Dash callback responses larger than CALLBACK_PAYLOAD_BUDGET by callback.')
+define_metric('dashboard_page_render_seconds', 'histogram', 'Rendered page callbacks by page, active filters and period.', LATENCY_BUCKETS)
+define_metric('dashboard_transform_seconds', 'histogram', 'Duration of transform_data() runs that rebuilt the model.', LATENCY_BUCKETS)
+define_metric('dashboard_transform_stage_seconds', 'histogram', 'Duration of each transform stage.', LATENCY_BUCKETS)
+define_metric('dashboard_sheet_polls_total', 'counter', 'Sheet monitor polls by outcome.')
+define_metric('dashboard_sheet_poll_delay_seconds', 'gauge', 'Delay until the next scheduled sheet poll.')
+define_metric('dashboard_cache_requests_total', 'counter', 'Cache lookups by cache and result (hit or miss).')
+define_metric('dashboard_cache_hit_ratio', 'gauge', 'Share of cache lookups that hit, since start.')
+define_metric('dashboard_model_rows', 'gauge', 'Rows of each table of the loaded model.')
+define_metric('dashboard_model_bytes', 'gauge', 'Memory of each table of the loaded model (deep).')
+define_metric('dashboard_data_version', 'gauge', 'Number of model rebuilds in this worker.')
+define_metric('dashboard_process_resident_bytes', 'gauge', 'Resident memory of this worker.')
+
+# ---------- On-demand profiling ----------
+#
+# POST /admin/profile (header X-Admin-Token: ADMIN_TOKEN) arms the next N Dash callback requests (optionally only
+# those whose first output contains ?callback=) and/or the next transform_data() runs; PROFILE_CALLBACKS and
+# PROFILE_TRANSFORM arm them at startup. Each capture is written to PROFILE_DIR as pstats (<name>.prof) or, with
+# PROFILER=pyinstrument, speedscope JSON (<name>.speedscope.json), next to <name>.json holding the callback inputs
+# that produced it. While nothing is armed the only cost is one integer check per request and per transform.
+
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+PROFILER = os.environ.get('PROFILER', 'cprofile')
+
+_profile_state = {'callbacks': int(os.environ.get('PROFILE_CALLBACKS', 0)), 'callback_match': '',
+                  'transform': int(os.environ.get('PROFILE_TRANSFORM', 0)), 'captured': []}
+_profile_state_lock = threading.Lock()
+_profile_lock = threading.Lock()  # one capture at a time: profilers are process-wide from Python 3.12
+
+def take_profile_slot(kind, callback=''):
+    """Claim one armed 'callbacks' or 'transform' capture; the caller must finish it with save_profile()."""
+    with _profile_state_lock:
+        if _profile_state[kind] <= 0 or (kind == 'callbacks' and _profile_state['callback_match'] not in callback):
+            return False
+        if not _profile_lock.acquire(blocking=False):
+            return False  # another capture is running; a later call takes the slot
+        _profile_state[kind] -= 1
+        return True
+
+def start_profiler():
+    """Start and return (kind, profiler): pyinstrument when PROFILER=pyinstrument and installed, else cProfile."""
+    if PROFILER == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+            return 'pyinstrument', profiler
+        except ImportError:
+            logger.warning("PROFILER=pyinstrument but pyinstrument is not installed, using cProfile")
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return 'cprofile', profiler
+
+def save_profile(handle, name, meta):
+    """Stop the profiler of start_profiler() and write the profile plus its metadata; releases the capture slot."""
+    kind, profiler = handle
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        slug = ''.join(ch if ch.isalnum() or ch in '-_' else '_' for ch in name)[:60]
+        base = os.path.join(PROFILE_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{slug}")
+        if kind == 'pyinstrument':
+            from pyinstrument.renderers import SpeedscopeRenderer
+            profiler.stop()
+            path = base + '.speedscope.json'
+            with open(path, 'w') as f:
+                f.write(profiler.output(renderer=SpeedscopeRenderer()))
+        else:
+            profiler.disable()
+            path = base + '.prof'
+            profiler.dump_stats(path)
+        with open(base + '.json', 'w') as f:
+            json.dump(dict(meta, profile=os.path.basename(path)), f, indent=2, default=str)
+        with _profile_state_lock:
+            _profile_state['captured'] = (_profile_state['captured'] + [os.path.basename(path)])[-50:]
+        logger.info(f"Saved profile {path}", extra={'profile': os.path.basename(path)})
+    except Exception as e:
+        logger.exception(f"Could not save profile {name}: {e}")
+    finally:
+        _profile_lock.release()
+
+def profiled(func):
+    """Run func under the profiler when a transform capture is armed."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _profile_state['transform'] or not take_profile_slot('transform'):
+            return func(*args, **kwargs)
+        started = time.perf_counter()
+        handle = start_profiler()
+        result = None
+        try:
+            result = func(*args, **kwargs)
+            return result
+        finally:
+            save_profile(handle, func.__name__, {'kind': 'transform', 'function': func.__name__, 'result': result,
+                                                 'seconds': round(time.perf_counter() - started, 3),
+                                                 'time': datetime.now().isoformat(timespec='seconds')})
+    return wrapper
 
 # Google Sheets Configuration
 GOOGLE_SHEET_ID = "15G9U072EJkvkuePmWWKgIvYwfTfvGOVMdqL6AIMUwVA"
 SHEET_NAME = "Sheet1"  # Change this if your sheet has a different name
 CREDENTIALS_FILE = "google_credentials.json"
 
+def credentials_configured():
+    """True if Google credentials are available (file or GOOGLE_CREDENTIALS env var)."""
+    return os.path.exists(CREDENTIALS_FILE) or bool(os.environ.get('GOOGLE_CREDENTIALS'))
+
+# Outcome of the last Sheets fetch, read by the poll scheduler: status is the HTTP status of a failed
+# call (429 when rate limited), budget_wait the seconds until the call budget allows another call. A fetch
+# fills its own dict and publishes it whole when it returns, so readers never see a half-updated outcome.
+_fetch_status = {'last': {'ok': None, 'status': None, 'retry_after': None, 'budget_wait': None, 'error': None}}
+_fetch_status_lock = threading.Lock()
+
+def last_fetch_status():
+    """Outcome of the last finished Sheets fetch (a complete dict, never modified after it is published)."""
+    with _fetch_status_lock:
+        return _fetch_status['last']
+
 def get_google_sheets_data():
     """
     Fetch data from Google Sheets using service account credentials.
     Returns DataFrame with the data, or None if error occurs.
     """
+    status = {'ok': False, 'status': None, 'retry_after': None, 'budget_wait': None, 'error': None}
     try:
+        # Imported here: the Google client is slow to import and only the data loading threads need it
+        from google.oauth2.service_account import Credentials
+        from googleapiclient.discovery import build
+
         # Load credentials from file or environment variable
         if os.path.exists(CREDENTIALS_FILE):
             creds_dict = json.load(open(CREDENTIALS_FILE))
@@ -46,7 +342,7 @@ def get_google_sheets_data():
             # For Render: credentials stored as environment variable
             creds_json = os.environ.get('GOOGLE_CREDENTIALS')
             if not creds_json:
-                print("Warning: Google credentials not found (local or env)")
+                logger.warning("Google credentials not found (local or env)")
                 return None
             creds_dict = json.loads(creds_json)
         
@@ -56,280 +352,361 @@ def get_google_sheets_data():
             scopes=['https://www.googleapis.com/auth/spreadsheets.readonly']
         )
         service = build('sheets', 'v4', credentials=credentials)
-        
+
+        wait = take_sheets_budget()
+        if wait > 0:
+            logger.warning(f"Sheets call budget used up, next call allowed in {wait:.0f}s")
+            status.update(budget_wait=wait, error='call budget exhausted')
+            return None
+
         # Fetch data from sheet
         sheet = service.spreadsheets()
         result = sheet.values().get(spreadsheetId=GOOGLE_SHEET_ID, range=f"{SHEET_NAME}").execute()
         values = result.get('values', [])
         
         if not values:
-            print("No data found in Google Sheet")
+            logger.warning("No data found in Google Sheet")
             return None
         
         # Convert to DataFrame
         df = pd.DataFrame(values[1:], columns=values[0])
-        print(f"[OK] Loaded {len(df)} rows from Google Sheets")
+        logger.info(f"Loaded {len(df)} rows from Google Sheets")
+        status['ok'] = True
         return df
         
     except Exception as e:
-        print(f"[ERROR] Error fetching from Google Sheets: {e}")
-        traceback.print_exc()
+        logger.exception(f"Error fetching from Google Sheets: {e}")
+        resp = getattr(e, 'resp', None)  # googleapiclient HttpError
+        status['error'] = str(e)
+        if resp is not None:
+            status['status'] = getattr(resp, 'status', None)
+            try:
+                status['retry_after'] = float(resp.get('retry-after'))
+            except (TypeError, ValueError, AttributeError):
+                pass
         return None
+    finally:
+        with _fetch_status_lock:
+            _fetch_status['last'] = status
+
+# Calendar columns attached to the merged model (derived from date_dim); not part of the row exports
+CALENDAR_COLS = ['Quarter', 'PeriodM', 'PeriodQ']
+
+def calendar_columns(month, date_dim):
+    """
+    Per-row calendar keys looked up from the date dimension: Quarter (int) and the monthly / quarterly period
+    as categoricals (integer codes in calendar order, labels like '2025-01' / '2025Q1', missing for missing months),
+    so period grouping in the callbacks is an integer groupby instead of building period strings per request.
+    """
+    dims = date_dim.set_index('Date')
+    columns = {'Quarter': month.map(dims['Quarter'])}
+    periods = {
+        'PeriodM': (dims['YearMonth'], dims['Year'] * 12 + dims['Month']),
+        'PeriodQ': (dims['Year'].astype(str) + 'Q' + dims['Quarter'].astype(str), dims['Year'] * 4 + dims['Quarter']),
+    }
+    for name, (labels, order) in periods.items():
+        categories = list(dict.fromkeys(labels.iloc[np.argsort(order.to_numpy(), kind='stable')]))
+        date_codes = labels.map({label: code for code, label in enumerate(categories)})
+        codes = month.map(date_codes).fillna(-1).astype(int).to_numpy()
+        columns[name] = pd.Categorical.from_codes(codes, categories=categories)
+    return columns
+
+def clean_sheet_data(raw_data):
+    """Clean fetched sheet rows: drop 'New SM', currency strings to numbers, Month to datetime."""
+    mark = stage_timer()
+    # Clean the data: remove 'New SM' column if exists
+    if 'New SM' in raw_data.columns:
+        raw_data = raw_data.drop('New SM', axis=1)
+        logger.debug("Removed 'New SM' column")
+
+    # Convert currency columns to numeric (remove € symbol and commas)
+    currency_cols = ['Order Amount', 'Revenue Amount', 'Cash Amount', 'Pending Amount', 'Backlog Amount']
+    for col in currency_cols:
+        if col in raw_data.columns:
+            raw_data[col] = raw_data[col].astype(str).str.replace('€', '').str.replace(',', '').astype(float)
+    logger.debug("Converted currency columns to numeric")
+    mark('currency')
+
+    # Convert Month to datetime (handle formats like 'January/22', '1/22/2026', etc)
+    if 'Month' in raw_data.columns:
+        logger.debug(f"Raw Month values (first 3): {raw_data['Month'].head(3).tolist()}")
+        try:
+            def parse_flexible_date(val):
+                try:
+                    if pd.isna(val):
+                        return pd.NaT
+
+                    val_str = str(val).strip()
+
+                    # Try different formats - ORDER MATTERS!
+                    formats = [
+                        '%B/%y',         # January/22 - TRY THIS FIRST
+                        '%b/%y',         # Jan/22
+                        '%m/%d/%Y',      # 1/22/2026
+                        '%m/%d/%y',      # 1/22/26
+                        '%d/%m/%Y',      # 22/1/2026
+                        '%d/%m/%y',      # 22/1/26
+                    ]
+
+                    for fmt in formats:
+                        try:
+                            result = pd.to_datetime(val_str, format=fmt)
+                            return result
+                        except:
+                            continue
+
+                    # Last resort: let pandas try without format
+                    return pd.to_datetime(val_str, errors='coerce')
+                except:
+                    return pd.NaT
+
+            # Apply parsing directly to raw values (don't use pd.to_datetime first!)
+            raw_data['Month'] = raw_data['Month'].apply(parse_flexible_date)
+
+            logger.debug(f"Month after parsing (first 3): {raw_data['Month'].head(3).tolist()}")
+            logger.debug(f"Month NaT count: {raw_data['Month'].isna().sum()}")
+            logger.debug("Converted Month to datetime")
+        except Exception as e:
+            logger.exception(f"Error converting Month: {e}")
+    mark('dates')
+    return raw_data
+
+def find_measure_col(df, base_name):
+    """Defensive mapping: find the actual column name in the merged dataframe for an expected measure."""
+    # exact match
+    if base_name in df.columns:
+        return base_name
+    # look for columns that contain the base_name
+    matches = [c for c in df.columns if base_name in c]
+    if matches:
+        return matches[0]
+    # case-insensitive contains
+    base_lower = base_name.lower()
+    for c in df.columns:
+        if base_lower in c.lower():
+            return c
+    return None
+
+def build_model(raw_data):
+    """
+    Create the dimension/fact tables and the merged model from cleaned sheet rows (nothing is cached here).
+    Returns (orders_fact, revenues_fact, cash_fact, merged, measure_cols).
+    """
+    mark = stage_timer()
+    logger.debug("Creating dim tables...")
+    customer_dim = pd.DataFrame({
+        'Customer': sorted(raw_data['Customer'].dropna().unique()),
+        'CustomerID': range(1, len(raw_data['Customer'].dropna().unique()) + 1)
+    })
+    logger.debug(f"Customer_Dim: {customer_dim.shape}")
+
+    project_dim = pd.DataFrame({
+        'Project': sorted(raw_data['Project'].dropna().unique()),
+        'ProjectID': range(1, len(raw_data['Project'].dropna().unique()) + 1)
+    })
+    logger.debug(f"Project_Dim: {project_dim.shape}")
+
+    sm_dim = pd.DataFrame({
+        'SM': sorted(raw_data['SM'].dropna().unique()),
+        'SMID': range(1, len(raw_data['SM'].dropna().unique()) + 1)
+    })
+    logger.debug(f"SM_Dim: {sm_dim.shape}")
+
+    unique_dates = sorted(raw_data['Month'].dropna().unique())
+    logger.debug(f"Unique dates before filtering: {unique_dates[:3] if len(unique_dates) > 0 else 'EMPTY'}")
+    logger.debug(f"Types: {[type(d).__name__ for d in unique_dates[:3]] if len(unique_dates) > 0 else 'EMPTY'}")
+
+    # Filter out any non-datetime values that might still exist
+    unique_dates = [d for d in unique_dates if isinstance(d, pd.Timestamp) or hasattr(d, 'year')]
+    logger.debug(f"Unique dates after filtering: {len(unique_dates)} dates")
+
+    if not unique_dates:
+        logger.warning("No valid dates found after conversion, using default")
+        unique_dates = [pd.Timestamp.today()]
+    else:
+        logger.debug(f"Found {len(unique_dates)} valid dates")
+
+    date_dim = pd.DataFrame({
+        'Date': unique_dates,
+        'DateID': range(1, len(unique_dates) + 1),
+        'Year': [int(d.year) if hasattr(d, 'year') else 2026 for d in unique_dates],
+        'Month': [int(d.month) if hasattr(d, 'month') else 1 for d in unique_dates],
+        'Quarter': [((int(d.month) if hasattr(d, 'month') else 1) - 1) // 3 + 1 for d in unique_dates],
+        'YearMonth': [d.strftime('%Y-%m') if hasattr(d, 'strftime') else '2026-01' for d in unique_dates]
+    })
+    logger.debug(f"Date_Dim: {date_dim.shape}")
+
+    po_ref_dim = pd.DataFrame({
+        'PO REF': sorted(raw_data['PO REF'].dropna().unique()),
+        'PO REF ID': range(1, len(raw_data['PO REF'].dropna().unique()) + 1)
+    })
+    logger.debug(f"PO REF_Dim: {po_ref_dim.shape}")
+
+    region_dim = pd.DataFrame({
+        'Region': sorted(raw_data['Region'].dropna().unique()),
+        'Region_ID': range(1, len(raw_data['Region'].dropna().unique()) + 1)
+    })
+    logger.debug(f"Region_Dim: {region_dim.shape}")
+
+    logger.debug("Creating lookup dict...")
+    customer_lookup = dict(zip(customer_dim['Customer'], customer_dim['CustomerID']))
+    project_lookup = dict(zip(project_dim['Project'], project_dim['ProjectID']))
+    sm_lookup = dict(zip(sm_dim['SM'], sm_dim['SMID']))
+    region_lookup = dict(zip(region_dim['Region'], region_dim['Region_ID']))
+    po_ref_lookup = dict(zip(po_ref_dim['PO REF'], po_ref_dim['PO REF ID']))
+
+    mark('dims')
+
+    # Handle NaN values in lookups
+    def safe_lookup(lookup_dict, value):
+        if pd.isna(value):
+            return None
+        return lookup_dict.get(value, None)
+
+    orders_fact = pd.DataFrame({
+        'SM': raw_data['SM'],
+        'Month': raw_data['Month'],
+        'Customer': raw_data['Customer'],
+        'Project': raw_data['Project'],
+        'PO REF': raw_data['PO REF'],
+        'Order Amount': raw_data['Order Amount'],
+        'Revenue Amount': raw_data['Revenue Amount'],
+        'Cash Amount': raw_data['Cash Amount'],
+        'Pending Amount': raw_data['Pending Amount'],
+        'Backlog Amount': raw_data['Backlog Amount'],
+        'CustomerID': [safe_lookup(customer_lookup, cust) for cust in raw_data['Customer']],
+        'ProjectID': [safe_lookup(project_lookup, proj) for proj in raw_data['Project']],
+        'SMID': [safe_lookup(sm_lookup, sm) for sm in raw_data['SM']],
+        'OrderDateID': range(1, len(raw_data) + 1),
+        'PO REF ID': [safe_lookup(po_ref_lookup, po) for po in raw_data['PO REF']],
+        'Region': raw_data['Region'],
+        'Region_ID': [safe_lookup(region_lookup, reg) for reg in raw_data['Region']]
+    })
+    logger.debug(f"Orders_Fact: {orders_fact.shape}")
+
+    revenues_fact = pd.DataFrame({
+        'UserID': range(1336346, 1336346 + len(raw_data)),
+        'Customer': raw_data['Customer'],
+        'Month': raw_data['Month'],
+        'Project': raw_data['Project'],
+        'SM': raw_data['SM'],
+        'PO REF': raw_data['PO REF'],
+        'Revenue Amount': raw_data['Revenue Amount'],
+        'Region': raw_data['Region'],
+        'CustomerID': [safe_lookup(customer_lookup, cust) for cust in raw_data['Customer']],
+        'ProjectID': [safe_lookup(project_lookup, proj) for proj in raw_data['Project']],
+        'SMID': [safe_lookup(sm_lookup, sm) for sm in raw_data['SM']],
+        'RevenueDateID': range(1, len(raw_data) + 1),
+        'PO REF ID': [safe_lookup(po_ref_lookup, po) for po in raw_data['PO REF']],
+        'Region_ID': [safe_lookup(region_lookup, reg) for reg in raw_data['Region']]
+    })
+    logger.debug(f"Revenues_Fact: {revenues_fact.shape}")
+
+    cash_fact = pd.DataFrame({
+        'UserID': range(2000000, 2000000 + len(raw_data)),
+        'Customer': raw_data['Customer'],
+        'Month': raw_data['Month'],
+        'Project': raw_data['Project'],
+        'SM': raw_data['SM'],
+        'PO REF': raw_data['PO REF'],
+        'Cash Amount': raw_data['Cash Amount'],
+        'Region': raw_data['Region'],
+        'CustomerID': [safe_lookup(customer_lookup, cust) for cust in raw_data['Customer']],
+        'ProjectID': [safe_lookup(project_lookup, proj) for proj in raw_data['Project']],
+        'SMID': [safe_lookup(sm_lookup, sm) for sm in raw_data['SM']],
+        'CashDateID': range(1, len(raw_data) + 1),
+        'PO REF ID': [safe_lookup(po_ref_lookup, po) for po in raw_data['PO REF']],
+        'Region_ID': [safe_lookup(region_lookup, reg) for reg in raw_data['Region']]
+    })
+    logger.debug(f"Cash_Fact: {cash_fact.shape}")
+    mark('facts')
+
+    # Create merged dataset
+    common_cols = [col for col in ["Customer", "Project", "Month", "SM", "PO REF", "Region"] if col in orders_fact.columns and col in revenues_fact.columns and col in cash_fact.columns]
+    merged = orders_fact.merge(revenues_fact, on=common_cols, how="outer", suffixes=("_order", "_revenue"))
+    merged = merged.merge(cash_fact, on=common_cols, how="outer", suffixes=("", "_cash"))
+
+    # Ensure Year column exists on merged (derived from Month when possible)
+    try:
+        if 'Month' in merged.columns:
+            # use dt.year where possible
+            try:
+                merged['Year'] = merged['Month'].dt.year
+            except Exception:
+                merged['Year'] = merged['Month'].apply(lambda d: int(getattr(d, 'year', None)) if pd.notna(d) else None)
+    except Exception:
+        pass
+
+    try:
+        if 'Month' in merged.columns:
+            for col, values in calendar_columns(merged['Month'], date_dim).items():
+                merged[col] = values
+    except Exception as e:
+        logger.warning(f"Could not attach calendar columns: {e}")
 
-def transform_data():
+    measure_cols = {}
+    for base in ["Order Amount", "Revenue Amount", "Cash Amount", "Backlog Amount", "Pending Amount"]:
+        measure_cols[base] = find_measure_col(merged, base)
+    logger.debug(f"Mapped measure columns: {measure_cols}")
+    mark('merge')
+    return orders_fact, revenues_fact, cash_fact, merged, measure_cols
+
+@profiled
+def transform_data(clean_data=None, sheet_hash=None, sheet_version=None):
     """
     Transform data from Google Sheets and create dimension/fact tables.
     This function contains the logic from transform_data.py
+
+    clean_data: already cleaned sheet rows (e.g. a version from the history store) to load instead of
+    fetching the sheet, with their sheet_hash and stored sheet_version if known. Freshly fetched sheet
+    versions are appended to the history store.
     """
+    global last_sheet_check_at
     try:
-        print("Starting data transformation from Google Sheets...")
-        
-        # Fetch data from Google Sheets
-        raw_data = get_google_sheets_data()
-        if raw_data is None or raw_data.empty:
-            print("❌ Failed to fetch data from Google Sheets")
-            return False
-        
-        print(f"   Raw data shape: {raw_data.shape}")
-        
-        # Clean the data: remove 'New SM' column if exists
-        if 'New SM' in raw_data.columns:
-            raw_data = raw_data.drop('New SM', axis=1)
-            print("   Removed 'New SM' column")
-        
-        # Convert currency columns to numeric (remove € symbol and commas)
-        currency_cols = ['Order Amount', 'Revenue Amount', 'Cash Amount', 'Pending Amount', 'Backlog Amount']
-        for col in currency_cols:
-            if col in raw_data.columns:
-                raw_data[col] = raw_data[col].astype(str).str.replace('€', '').str.replace(',', '').astype(float)
-        print("   [OK] Converted currency columns to numeric")
-        
-        # Convert Month to datetime (handle formats like 'January/22', '1/22/2026', etc)
-        if 'Month' in raw_data.columns:
-            print(f"   [DEBUG] Raw Month values (first 3): {raw_data['Month'].head(3).tolist()}")
-            try:
-                def parse_flexible_date(val):
-                    try:
-                        if pd.isna(val):
-                            return pd.NaT
-                        
-                        val_str = str(val).strip()
-                        
-                        # Try different formats - ORDER MATTERS!
-                        formats = [
-                            '%B/%y',         # January/22 - TRY THIS FIRST
-                            '%b/%y',         # Jan/22
-                            '%m/%d/%Y',      # 1/22/2026
-                            '%m/%d/%y',      # 1/22/26
-                            '%d/%m/%Y',      # 22/1/2026
-                            '%d/%m/%y',      # 22/1/26
-                        ]
-                        
-                        for fmt in formats:
-                            try:
-                                result = pd.to_datetime(val_str, format=fmt)
-                                return result
-                            except:
-                                continue
-                        
-                        # Last resort: let pandas try without format
-                        return pd.to_datetime(val_str, errors='coerce')
-                    except:
-                        return pd.NaT
-                
-                # Apply parsing directly to raw values (don't use pd.to_datetime first!)
-                raw_data['Month'] = raw_data['Month'].apply(parse_flexible_date)
-                
-                print(f"   [DEBUG] After parsing: {raw_data['Month'].head(3).tolist()}")
-                print(f"   [DEBUG] NaT count: {raw_data['Month'].isna().sum()}")
-                print("   [OK] Converted Month to datetime")
-            except Exception as e:
-                print(f"   [ERROR] Error converting Month: {e}")
-                traceback.print_exc()
-
-        print("\n Creating Dim Tables...")
-        customer_dim = pd.DataFrame({
-            'Customer': sorted(raw_data['Customer'].dropna().unique()),
-            'CustomerID': range(1, len(raw_data['Customer'].dropna().unique()) + 1)
-        })
-        print(f"   Customer_Dim: {customer_dim.shape}")
-
-        project_dim = pd.DataFrame({
-            'Project': sorted(raw_data['Project'].dropna().unique()),
-            'ProjectID': range(1, len(raw_data['Project'].dropna().unique()) + 1)
-        })
-        print(f"   Project_Dim: {project_dim.shape}")
-
-        sm_dim = pd.DataFrame({
-            'SM': sorted(raw_data['SM'].dropna().unique()),
-            'SMID': range(1, len(raw_data['SM'].dropna().unique()) + 1)
-        })
-        print(f"   SM_Dim: {sm_dim.shape}")
-
-        unique_dates = sorted(raw_data['Month'].dropna().unique())
-        print(f"   [DEBUG] Unique dates before filtering: {unique_dates[:3] if len(unique_dates) > 0 else 'EMPTY'}")
-        print(f"   [DEBUG] Types: {[type(d).__name__ for d in unique_dates[:3]] if len(unique_dates) > 0 else 'EMPTY'}")
-        
-        # Filter out any non-datetime values that might still exist
-        unique_dates = [d for d in unique_dates if isinstance(d, pd.Timestamp) or hasattr(d, 'year')]
-        print(f"   [DEBUG] Unique dates after filtering: {len(unique_dates)} dates")
-        
-        if not unique_dates:
-            print("[WARN] No valid dates found after conversion, using default")
-            unique_dates = [pd.Timestamp.today()]
+        logger.debug("Starting data transformation from Google Sheets...")
+        started = time.perf_counter()
+
+        if clean_data is None:
+            # Fetch data from Google Sheets
+            mark = stage_timer()
+            raw_data = get_google_sheets_data()
+            mark('fetch')
+            if raw_data is None or raw_data.empty:
+                logger.warning("Failed to fetch data from Google Sheets")
+                return False
+
+            logger.debug(f"Raw data shape: {raw_data.shape}")
+            last_sheet_check_at = datetime.now()
+            clear_data_flag()
+            sheet_hash = compute_df_hash(raw_data)
+            if sheet_hash == current_model().sheet_hash and not current_model().merged.empty:
+                logger.debug("Sheet unchanged since the loaded version, keeping the cached model")
+                metric_inc('dashboard_cache_requests_total', {'cache': 'sheet_hash', 'result': 'hit'})
+                return True
+            metric_inc('dashboard_cache_requests_total', {'cache': 'sheet_hash', 'result': 'miss'})
+            raw_data = clean_sheet_data(raw_data)
         else:
-            print(f"   [OK] Found {len(unique_dates)} valid dates")
-        
-        date_dim = pd.DataFrame({
-            'Date': unique_dates,
-            'DateID': range(1, len(unique_dates) + 1),
-            'Year': [int(d.year) if hasattr(d, 'year') else 2026 for d in unique_dates],
-            'Month': [int(d.month) if hasattr(d, 'month') else 1 for d in unique_dates],
-            'Quarter': [((int(d.month) if hasattr(d, 'month') else 1) - 1) // 3 + 1 for d in unique_dates],
-            'YearMonth': [d.strftime('%Y-%m') if hasattr(d, 'strftime') else '2026-01' for d in unique_dates]
-        })
-        print(f"   Date_Dim: {date_dim.shape}")
-
-        po_ref_dim = pd.DataFrame({
-            'PO REF': sorted(raw_data['PO REF'].dropna().unique()),
-            'PO REF ID': range(1, len(raw_data['PO REF'].dropna().unique()) + 1)
-        })
-        print(f"   PO REF_Dim: {po_ref_dim.shape}")
-
-        region_dim = pd.DataFrame({
-            'Region': sorted(raw_data['Region'].dropna().unique()),
-            'Region_ID': range(1, len(raw_data['Region'].dropna().unique()) + 1)
-        })
-        print(f"   Region_Dim: {region_dim.shape}")
-
-        print("\n Creating lookup dict...")
-        customer_lookup = dict(zip(customer_dim['Customer'], customer_dim['CustomerID']))
-        project_lookup = dict(zip(project_dim['Project'], project_dim['ProjectID']))
-        sm_lookup = dict(zip(sm_dim['SM'], sm_dim['SMID']))
-        region_lookup = dict(zip(region_dim['Region'], region_dim['Region_ID']))
-        po_ref_lookup = dict(zip(po_ref_dim['PO REF'], po_ref_dim['PO REF ID']))
-
-        # Handle NaN values in lookups
-        def safe_lookup(lookup_dict, value):
-            if pd.isna(value):
-                return None
-            return lookup_dict.get(value, None)
-
-        orders_fact = pd.DataFrame({
-            'SM': raw_data['SM'],
-            'Month': raw_data['Month'],
-            'Customer': raw_data['Customer'],
-            'Project': raw_data['Project'],
-            'PO REF': raw_data['PO REF'],
-            'Order Amount': raw_data['Order Amount'],
-            'Revenue Amount': raw_data['Revenue Amount'],
-            'Cash Amount': raw_data['Cash Amount'],
-            'Pending Amount': raw_data['Pending Amount'],
-            'Backlog Amount': raw_data['Backlog Amount'],
-            'CustomerID': [safe_lookup(customer_lookup, cust) for cust in raw_data['Customer']],
-            'ProjectID': [safe_lookup(project_lookup, proj) for proj in raw_data['Project']],
-            'SMID': [safe_lookup(sm_lookup, sm) for sm in raw_data['SM']],
-            'OrderDateID': range(1, len(raw_data) + 1),
-            'PO REF ID': [safe_lookup(po_ref_lookup, po) for po in raw_data['PO REF']],
-            'Region': raw_data['Region'],
-            'Region_ID': [safe_lookup(region_lookup, reg) for reg in raw_data['Region']]
-        })
-        print(f"   Orders_Fact: {orders_fact.shape}")
-
-        revenues_fact = pd.DataFrame({
-            'UserID': range(1336346, 1336346 + len(raw_data)),
-            'Customer': raw_data['Customer'],
-            'Month': raw_data['Month'],
-            'Project': raw_data['Project'],
-            'SM': raw_data['SM'],
-            'PO REF': raw_data['PO REF'],
-            'Revenue Amount': raw_data['Revenue Amount'],
-            'Region': raw_data['Region'],
-            'CustomerID': [safe_lookup(customer_lookup, cust) for cust in raw_data['Customer']],
-            'ProjectID': [safe_lookup(project_lookup, proj) for proj in raw_data['Project']],
-            'SMID': [safe_lookup(sm_lookup, sm) for sm in raw_data['SM']],
-            'RevenueDateID': range(1, len(raw_data) + 1),
-            'PO REF ID': [safe_lookup(po_ref_lookup, po) for po in raw_data['PO REF']],
-            'Region_ID': [safe_lookup(region_lookup, reg) for reg in raw_data['Region']]
-        })
-        print(f"   Revenues_Fact: {revenues_fact.shape}")
-
-        cash_fact = pd.DataFrame({
-            'UserID': range(2000000, 2000000 + len(raw_data)),
-            'Customer': raw_data['Customer'],
-            'Month': raw_data['Month'],
-            'Project': raw_data['Project'],
-            'SM': raw_data['SM'],
-            'PO REF': raw_data['PO REF'],
-            'Cash Amount': raw_data['Cash Amount'],
-            'Region': raw_data['Region'],
-            'CustomerID': [safe_lookup(customer_lookup, cust) for cust in raw_data['Customer']],
-            'ProjectID': [safe_lookup(project_lookup, proj) for proj in raw_data['Project']],
-            'SMID': [safe_lookup(sm_lookup, sm) for sm in raw_data['SM']],
-            'CashDateID': range(1, len(raw_data) + 1),
-            'PO REF ID': [safe_lookup(po_ref_lookup, po) for po in raw_data['PO REF']],
-            'Region_ID': [safe_lookup(region_lookup, reg) for reg in raw_data['Region']]
-        })
-        print(f"   Cash_Fact: {cash_fact.shape}")
-
-        # Create merged dataset
-        common_cols = [col for col in ["Customer", "Project", "Month", "SM", "PO REF", "Region"] if col in orders_fact.columns and col in revenues_fact.columns and col in cash_fact.columns]
-        merged = orders_fact.merge(revenues_fact, on=common_cols, how="outer", suffixes=("_order", "_revenue"))
-        merged = merged.merge(cash_fact, on=common_cols, how="outer", suffixes=("", "_cash"))
-
-        # Cache the transformed data in memory (no file needed!)
-        global cached_orders, cached_revenues, cached_cash, cached_merged, cached_measure_cols, data_lock
-        # Use a lock to make assignments thread-safe when monitor thread runs
-        with data_lock:
-            cached_orders = orders_fact
-            cached_revenues = revenues_fact
-            cached_cash = cash_fact
-            cached_merged = merged
-
-        # Ensure Year column exists on merged (derived from Month when possible)
-        try:
-            if 'Month' in cached_merged.columns:
-                # use dt.year where possible
-                try:
-                    cached_merged['Year'] = cached_merged['Month'].dt.year
-                except Exception:
-                    cached_merged['Year'] = cached_merged['Month'].apply(lambda d: int(getattr(d, 'year', None)) if pd.notna(d) else None)
-        except Exception:
-            pass
+            raw_data = clean_data
 
-        # Defensive mapping: find actual column names in merged dataframe for expected measures
-        def find_measure_col(df, base_name):
-            # exact match
-            if base_name in df.columns:
-                return base_name
-            # look for columns that contain the base_name
-            matches = [c for c in df.columns if base_name in c]
-            if matches:
-                return matches[0]
-            # case-insensitive contains
-            base_lower = base_name.lower()
-            for c in df.columns:
-                if base_lower in c.lower():
-                    return c
-            return None
+        orders_fact, revenues_fact, cash_fact, merged, measure_cols = build_model(raw_data)
 
-        cached_measure_cols = {}
-        for base in ["Order Amount", "Revenue Amount", "Cash Amount", "Backlog Amount", "Pending Amount"]:
-            found = find_measure_col(cached_merged, base)
-            cached_measure_cols[base] = found
+        # Publish the new snapshot (the subscribers, e.g. the default view pre-render, run before it returns)
+        mark = stage_timer()
+        model = publish_model(orders_fact, revenues_fact, cash_fact, merged, measure_cols,
+                              'history' if clean_data is not None else 'sheet', sheet_hash, sheet_version)
+        mark('publish')
+        elapsed = time.perf_counter() - started
+        metric_observe('dashboard_transform_seconds', None, elapsed)
 
-        print(f"   [DEBUG] Mapped measure columns: {cached_measure_cols}")
+        logger.info("Transformation completed, data cached in memory",
+                    extra={'seconds': round(elapsed, 3), 'data_version': model.version, 'orders': orders_fact.shape,
+                           'revenues': revenues_fact.shape, 'cash': cash_fact.shape, 'merged': merged.shape})
 
-        print(f"\n [OK] Transformation completed! Data cached in memory")
-        print(f"     Orders: {orders_fact.shape}")
-        print(f"     Revenues: {revenues_fact.shape}")
-        print(f"     Cash: {cash_fact.shape}")
-        print(f"     Merged: {merged.shape}")
-            
+        if clean_data is None:
+            record_sheet_version(raw_data, sheet_hash)
         return True
     except Exception as e:
-        print(f"Error in transform_data: {e}")
-        traceback.print_exc()
+        logger.exception(f"Error in transform_data: {e}")
         return False
 
 def monitor_data_file():
@@ -340,7 +717,7 @@ def monitor_data_file():
     # Monitoring of a local file is optional and not used in the Render deployment.
     # Keep a safe no-op implementation to avoid NameError or syntax issues.
     global last_modified_time, monitoring_active
-    print("monitor_data_file: file monitoring is disabled in this environment")
+    logger.debug("monitor_data_file: file monitoring is disabled in this environment")
     return
 
 
@@ -353,96 +730,613 @@ def compute_df_hash(df: pd.DataFrame) -> str:
         return ''
 
 
+# ---------- Sheet poll scheduler ----------
+#
+# The monitor's interval adapts: it shortens after an edit (edits come in bursts) and grows by
+# SHEET_POLL_GROWTH on every poll without change, up to SHEET_POLL_MAX_INTERVAL. Failed polls back off
+# exponentially (from at least 60 s on 429s, honouring Retry-After), and every delay is jittered so
+# workers drift apart instead of polling in lockstep. All Sheets calls of all workers share a budget of
+# SHEETS_CALLS_PER_MINUTE, counted in SHEETS_BUDGET_FILE under a file lock.
+
+SHEET_POLL_MIN_INTERVAL = float(os.environ.get('SHEET_POLL_MIN_INTERVAL', 5))
+SHEET_POLL_MAX_INTERVAL = float(os.environ.get('SHEET_POLL_MAX_INTERVAL', 300))
+SHEET_POLL_GROWTH = float(os.environ.get('SHEET_POLL_GROWTH', 1.5))
+SHEET_POLL_BACKOFF_MAX = float(os.environ.get('SHEET_POLL_BACKOFF_MAX', 900))
+SHEETS_CALLS_PER_MINUTE = int(os.environ.get('SHEETS_CALLS_PER_MINUTE', 30))  # 0 disables the budget
+SHEETS_BUDGET_FILE = os.environ.get('SHEETS_BUDGET_FILE', 'sheets_budget.json')
+
+_budget_lock = threading.Lock()
+_poll_state = {'base_interval': None, 'interval': None, 'next_delay': None, 'next_poll_at': None,
+               'last_outcome': None, 'last_poll': None, 'last_change': None, 'last_error': None,
+               'errors': 0, 'polls': 0, 'changes': 0, 'budget_waits': 0}
+
+def _budget_calls(update=None):
+    """Timestamps of the Sheets calls of the last minute (all workers); `update(calls)` may append under the lock."""
+    with _budget_lock, open(SHEETS_BUDGET_FILE, 'a+') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)  # released when the file is closed
+        f.seek(0)
+        now = time.time()
+        try:
+            calls = [t for t in json.loads(f.read() or '[]') if now - t < 60]
+        except ValueError:
+            calls = []
+        if update is not None and update(calls, now):
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps(calls))
+        return calls
+
+def take_sheets_budget():
+    """Claim one Sheets API call from the shared per-minute budget; returns 0, or the seconds until one frees up."""
+    if SHEETS_CALLS_PER_MINUTE <= 0:
+        return 0.0
+    wait = [0.0]
+    def claim(calls, now):
+        if len(calls) >= SHEETS_CALLS_PER_MINUTE:
+            wait[0] = max(0.1, 60 - (now - min(calls)))
+            return False
+        calls.append(now)
+        return True
+    try:
+        _budget_calls(claim)
+    except OSError as e:
+        logger.warning(f"Sheets call budget unavailable ({e}), not enforcing it")
+        return 0.0
+    return wait[0]
+
+def schedule_next_poll(outcome, base_interval, fetch=None):
+    """
+    Seconds until the next poll after a poll with the given outcome: 'changed', 'unchanged', 'error',
+    'rate_limited' or 'budget'. base_interval is the configured interval the schedule starts from, and
+    fetch the last_fetch_status() of that poll's fetch (for its budget wait, Retry-After and error).
+    """
+    fetch = fetch or {}
+    st = _poll_state
+    interval = st['interval'] or base_interval
+    if outcome == 'changed':
+        st['errors'] = 0
+        interval = min(base_interval, max(SHEET_POLL_MIN_INTERVAL, base_interval / 3))
+        delay = interval * random.uniform(0.9, 1.1)
+    elif outcome == 'unchanged':
+        st['errors'] = 0
+        interval = min(max(base_interval, SHEET_POLL_MAX_INTERVAL), interval * SHEET_POLL_GROWTH)
+        delay = interval * random.uniform(0.9, 1.1)
+    elif outcome == 'budget':
+        delay = (fetch.get('budget_wait') or interval) + random.uniform(0, 5)
+    else:
+        st['errors'] += 1
+        floor = max(base_interval, 60) if outcome == 'rate_limited' else base_interval
+        delay = min(SHEET_POLL_BACKOFF_MAX, floor * 2 ** (st['errors'] - 1))
+        delay = random.uniform(delay / 2, delay)  # "equal jitter": at least half the backoff
+        delay = max(delay, fetch.get('retry_after') or 0)
+    st.update(base_interval=base_interval, interval=interval, next_delay=round(delay, 1),
+              next_poll_at=datetime.fromtimestamp(time.time() + delay).isoformat(timespec='seconds'),
+              last_outcome=outcome, last_poll=datetime.now().isoformat(timespec='seconds'))
+    st['polls'] += 1
+    metric_inc('dashboard_sheet_polls_total', {'outcome': outcome})
+    metric_set('dashboard_sheet_poll_delay_seconds', None, round(delay, 1))
+    if outcome == 'changed':
+        st['changes'] += 1
+        st['last_change'] = st['last_poll']
+    elif outcome == 'budget':
+        st['budget_waits'] += 1
+    elif outcome != 'unchanged':
+        st['last_error'] = fetch.get('error') or outcome
+    return delay
+
+def poll_schedule_state():
+    """Snapshot of the poll schedule and of the shared Sheets call budget (for /monitor/poll)."""
+    state = dict(_poll_state)
+    try:
+        used = len(_budget_calls()) if SHEETS_CALLS_PER_MINUTE > 0 else None
+    except OSError:
+        used = None
+    state['budget'] = {'calls_per_minute': SHEETS_CALLS_PER_MINUTE, 'used_last_minute': used}
+    state['last_fetch'] = dict(last_fetch_status())
+    return state
+
 def start_sheet_monitor(poll_interval: int = 30):
     """Start a background thread that polls Google Sheets for changes and re-runs transform_data()."""
-    global monitoring_active, last_sheet_hash
+    global monitoring_active, sheet_monitor_thread
 
     if not monitoring_active:
         monitoring_active = True
 
     def _monitor():
-        print(f"sheet_monitor: starting with interval={poll_interval}s")
+        logger.info(f"sheet_monitor: starting with interval={poll_interval}s")
         while monitoring_active:
+            base_interval = int(os.environ.get('SHEET_POLL_INTERVAL', poll_interval))
+            version = current_model().version
+            fetch = None
             try:
-                df = get_google_sheets_data()
-                if df is None:
-                    print("sheet_monitor: unable to fetch sheet (None)")
-                    time.sleep(int(os.environ.get('SHEET_POLL_INTERVAL', poll_interval)))
-                    continue
-
-                new_hash = compute_df_hash(df)
-                if last_sheet_hash != new_hash:
-                    print("sheet_monitor: change detected in Google Sheet, running transform...")
-                    print(f"sheet_monitor: old hash={last_sheet_hash[:8] if last_sheet_hash else 'NONE'}..., new hash={new_hash[:8]}...")
-                    # Run transform using the fresh df by temporarily writing it to a global
-                    # We prefer transform_data to re-fetch, but to avoid double fetching, call transform_data()
-                    # and let it fetch again; after success update last_sheet_hash.
+                # transform_data() fetches once, and only rebuilds when the sheet hash changed; the fetch
+                # outcome is taken under the same lock, so it is this poll's and not another refresh's
+                with refresh_lock:
                     ok = transform_data()
-                    if ok:
-                        with data_lock:
-                            last_sheet_hash = new_hash
-                        print("sheet_monitor: transform succeeded, cache updated")
-                        print(f"sheet_monitor: updated last_sheet_hash={last_sheet_hash[:8]}...")
-                    else:
-                        print("sheet_monitor: transform failed")
+                    fetch = last_fetch_status()
+                if ok:
+                    outcome = 'changed' if current_model().version != version else 'unchanged'
+                elif fetch.get('budget_wait'):
+                    outcome = 'budget'
+                elif fetch.get('status') == 429:
+                    outcome = 'rate_limited'
                 else:
-                    print(f"sheet_monitor: no change detected (hash={new_hash[:8]}...)")
+                    outcome = 'error'
             except Exception as e:
-                print(f"sheet_monitor: error during poll: {e}")
-                traceback.print_exc()
-            time.sleep(int(os.environ.get('SHEET_POLL_INTERVAL', poll_interval)))
+                logger.exception(f"sheet_monitor: error during poll: {e}")
+                outcome = 'error'
+            delay = schedule_next_poll(outcome, base_interval, fetch)
+            # unchanged polls are the common case, so they only show at DEBUG
+            logger.log(logging.DEBUG if outcome == 'unchanged' else logging.INFO, f"sheet_monitor: {outcome}, next poll in {delay:.0f}s",
+                       extra={'outcome': outcome, 'next_delay': round(delay, 1)})
+            _wait_for_next_poll(delay)
 
     t = threading.Thread(target=_monitor, daemon=True)
     t.start()
-    print(f"✅ Sheet monitor started (daemon thread)")
+    sheet_monitor_thread = t
+    logger.info("Sheet monitor started (daemon thread)")
     return t
 
+# ---------- Push refresh (sheet change webhook) ----------
+#
+# The sheet's Apps Script trigger POSTs /hooks/sheet-changed with the shared secret. Hooks are debounced:
+# a burst of edits (or hooks arriving while a refresh runs) coalesces into one transform_data() run once
+# the sheet has been quiet for HOOK_DEBOUNCE_SECONDS. With the hook configured, polling only remains as a
+# slow fallback for missed hooks, and the hook touches HOOK_STAMP_FILE so the other workers refresh too.
+
+SHEET_HOOK_SECRET = os.environ.get('SHEET_HOOK_SECRET', '')
+HOOK_DEBOUNCE_SECONDS = float(os.environ.get('HOOK_DEBOUNCE_SECONDS', 5))
+HOOK_STAMP_FILE = os.environ.get('HOOK_STAMP_FILE', 'sheet_changed.stamp')
+FALLBACK_POLL_INTERVAL = int(os.environ.get('SHEET_FALLBACK_POLL_INTERVAL', 600))
+
+refresh_lock = threading.Lock()  # one transform at a time between the monitor and the hook refresh
+_refresh_cond = threading.Condition()
+_refresh_state = {'due': None, 'running': False, 'thread': None, 'stamp': None,
+                  'hooks': 0, 'refreshes': 0, 'last_refresh': None}
+
+def sheet_poll_interval(default=15):
+    """Seconds between sheet polls: SHEET_POLL_INTERVAL, else the slow fallback when the hook is configured."""
+    if os.environ.get('SHEET_POLL_INTERVAL'):
+        return int(os.environ['SHEET_POLL_INTERVAL'])
+    return FALLBACK_POLL_INTERVAL if SHEET_HOOK_SECRET else default
+
+def _hook_stamp():
+    try:
+        return os.stat(HOOK_STAMP_FILE).st_mtime_ns
+    except OSError:
+        return None
+
+_refresh_state['stamp'] = _hook_stamp()  # only stamps newer than startup count as hooks
+
+def _touch_hook_stamp():
+    try:
+        with open(HOOK_STAMP_FILE, 'a'):
+            os.utime(HOOK_STAMP_FILE)
+        _refresh_state['stamp'] = _hook_stamp()  # this worker already scheduled its refresh
+    except OSError as e:
+        logger.warning(f"Could not touch {HOOK_STAMP_FILE}: {e}")
+
+def _refresh_worker():
+    while True:
+        with _refresh_cond:
+            while _refresh_state['due'] is None or _refresh_state['due'] > time.monotonic():
+                due = _refresh_state['due']
+                _refresh_cond.wait(None if due is None else due - time.monotonic())
+            _refresh_state['due'] = None
+            _refresh_state['running'] = True
+        try:
+            logger.info("sheet_refresh: running debounced refresh...")
+            with refresh_lock:
+                ok = transform_data()
+                fetch = last_fetch_status()
+            if ok:
+                logger.info("sheet_refresh: done")
+            else:
+                logger.warning("sheet_refresh: transform failed")
+            if not ok and fetch.get('budget_wait'):
+                request_sheet_refresh(delay=fetch['budget_wait'])  # retry once the budget allows
+        except Exception as e:
+            logger.exception(f"sheet_refresh: error during refresh: {e}")
+        finally:
+            with _refresh_cond:
+                _refresh_state['running'] = False
+                _refresh_state['refreshes'] += 1
+                _refresh_state['last_refresh'] = datetime.now().isoformat(timespec='seconds')
+                _refresh_cond.notify_all()
+
+def request_sheet_refresh(delay=None):
+    """Schedule a refresh `delay` seconds (default HOOK_DEBOUNCE_SECONDS) from now; later calls push it back."""
+    with _refresh_cond:
+        _refresh_state['hooks'] += 1
+        _refresh_state['due'] = time.monotonic() + (HOOK_DEBOUNCE_SECONDS if delay is None else delay)
+        if _refresh_state['thread'] is None or not _refresh_state['thread'].is_alive():
+            _refresh_state['thread'] = threading.Thread(target=_refresh_worker, daemon=True)
+            _refresh_state['thread'].start()
+        _refresh_cond.notify_all()
+
+# ---------- Data push to browsers (server-sent events) ----------
+#
+# With DATA_PUSH on, each tab keeps one EventSource on /events/data-version and the server sends the data
+# token whenever a transform finishes, so tabs re-render within a second of new data and send nothing while
+# idle (the polling intervals are disabled). Streams end after SSE_STREAM_SECONDS and the browser reconnects,
+# so no worker thread is held forever. Each open tab holds a worker thread: run gunicorn with threads.
+
+DATA_PUSH = os.environ.get('DATA_PUSH', '').lower() in ('1', 'true', 'yes', 'sse')
+SSE_HEARTBEAT_SECONDS = float(os.environ.get('SSE_HEARTBEAT_SECONDS', 15))
+SSE_STREAM_SECONDS = float(os.environ.get('SSE_STREAM_SECONDS', 300))
+
+def data_push_token(model=None):
+    """Token of the loaded data (or of model): the sheet hash, which is the same in every worker serving the same data."""
+    model = model or current_model()
+    return model.sheet_hash or f'v{model.version}'
+
+def data_version_events():
+    """SSE stream: the current data token on connect and after every change, comments as keep-alive."""
+    deadline = time.monotonic() + SSE_STREAM_SECONDS
+    token = None
+    yield "retry: 2000\n\n"
+    while time.monotonic() < deadline:
+        current = data_push_token()
+        if current != token:
+            token = current
+            yield f"event: data-version\ndata: {json.dumps(token)}\n\n"
+        else:
+            yield ": keep-alive\n\n"
+        timeout = min(SSE_HEARTBEAT_SECONDS, max(0.0, deadline - time.monotonic()))
+        with data_changed:
+            data_changed.wait_for(lambda: data_push_token() != token, timeout)
+
+def _wait_for_next_poll(seconds):
+    """Sleep until the next poll; a hook received by another worker (HOOK_STAMP_FILE changed) schedules a refresh."""
+    if not SHEET_HOOK_SECRET:
+        time.sleep(seconds)
+        return
+    deadline = time.monotonic() + seconds
+    while monitoring_active and time.monotonic() < deadline:
+        time.sleep(min(1.0, max(0.0, deadline - time.monotonic())))
+        stamp = _hook_stamp()
+        if stamp is not None and stamp != _refresh_state['stamp']:
+            _refresh_state['stamp'] = stamp
+            request_sheet_refresh()
+
 def load_data():
     """
-    Load cached transformed data from memory (no file reading needed).
+    (orders, revenues, cash, merged, measure_cols) of the published model (scripts; the app reads current_model()).
     """
-    global cached_orders, cached_revenues, cached_cash, cached_merged, cached_measure_cols
-    
-    # If data is cached, return it
-    if not cached_merged.empty:
-        print("[OK] Returning cached data")
-        return cached_orders, cached_revenues, cached_cash, cached_merged, cached_measure_cols
+    model = current_model()
+    if not model.merged.empty:
+        logger.debug("Returning cached data", extra={'sample': True})
+        return model.orders, model.revenues, model.cash, model.merged, model.measure_cols
     else:
-        print("[WARN] No cached data available, returning empty dataframes")
+        logger.warning("No cached data available, returning empty dataframes", extra={'sample': True})
         empty_df = pd.DataFrame()
         return empty_df, empty_df, empty_df, empty_df, {}
 
-def is_data_updated(flag_file="data_updated.txt"):
-    """Check if data was updated"""
-    return os.path.exists(flag_file)
-
-# Initialize data (load only; heavy initialization and monitoring are performed only when running the script directly)
-print("Initializing dashboard...")
-print("Attempting to fetch data from Google Sheets and transform...")
+# data_updated.txt, written by an external loader, switches the browsers to fast polling until the sheet has
+# been fetched again. Request threads only read it (a stat at most once a second per process); the fetch in
+# transform_data() removes it.
+DATA_FLAG_FILE = 'data_updated.txt'
+_data_flag = {'checked': 0.0, 'present': False}
+
+def is_data_updated(flag_file=DATA_FLAG_FILE):
+    """Check if data was updated (the flag file exists)"""
+    if flag_file != DATA_FLAG_FILE:
+        return os.path.exists(flag_file)
+    now = time.monotonic()
+    if now - _data_flag['checked'] >= 1.0:
+        _data_flag.update(checked=now, present=os.path.exists(flag_file))
+    return _data_flag['present']
+
+def clear_data_flag():
+    """Remove the data updated flag once the sheet has been fetched (the data it announced is loaded)."""
+    try:
+        os.remove(DATA_FLAG_FILE)
+    except FileNotFoundError:
+        return
+    except OSError as e:
+        logger.warning(f"Could not remove {DATA_FLAG_FILE}: {e}")
+        return
+    _data_flag.update(checked=time.monotonic(), present=False)
+
+# ---------- Sheet version history (local SQLite store) ----------
+#
+# Every new sheet version is appended, cleaned and at fact grain, to a local SQLite file (HISTORY_DB;
+# empty disables it). A restart warms up from the newest stored version before Google Sheets answers,
+# the app keeps serving that version while Sheets is unreachable, and exports can be taken "as of" any
+# stored version (?as_of=<version>, see /history/versions).
+
+HISTORY_DB = os.environ.get('HISTORY_DB', 'sheet_history.sqlite')
+SHEET_FACT_COLS = ['SM', 'Month', 'Customer', 'Project', 'PO REF', 'Region',
+                   'Order Amount', 'Revenue Amount', 'Cash Amount', 'Pending Amount', 'Backlog Amount']
+AS_OF_CACHE_SIZE = int(os.environ.get('AS_OF_CACHE_SIZE', 2))  # built models of prior versions kept in memory
+# retention, applied on every append; the newest version is always kept (0 disables a limit)
+HISTORY_KEEP_VERSIONS = int(os.environ.get('HISTORY_KEEP_VERSIONS', 50))
+HISTORY_KEEP_DAYS = float(os.environ.get('HISTORY_KEEP_DAYS', 0))
+
+_as_of_models = {}
+_as_of_lock = threading.Lock()
+
+def _history_connect():
+    conn = sqlite3.connect(HISTORY_DB, timeout=30)
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        # incremental auto-vacuum lets a prune hand the pages of dropped versions back to the file system; it must
+        # be set before the first table (and before WAL writes the header), and a store created without it is
+        # converted once by a VACUUM
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        if conn.execute("SELECT count(*) FROM sqlite_master").fetchone()[0]:
+            try:
+                conn.execute("VACUUM")
+            except sqlite3.OperationalError as e:
+                logger.warning(f"Could not convert {HISTORY_DB} to incremental vacuum: {e}")
+    conn.execute("PRAGMA journal_mode=WAL")  # readers in other workers are not blocked by an append
+    columns = ', '.join(f'"{col}" {"REAL" if col.endswith("Amount") else "TEXT"}' for col in SHEET_FACT_COLS)
+    conn.executescript(f"""
+        CREATE TABLE IF NOT EXISTS sheet_versions (
+            version INTEGER PRIMARY KEY AUTOINCREMENT, sheet_hash TEXT NOT NULL, fetched_at TEXT NOT NULL, rows INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS sheet_rows (version INTEGER NOT NULL, row INTEGER NOT NULL, {columns});
+        CREATE INDEX IF NOT EXISTS idx_sheet_rows_version ON sheet_rows (version, "SM", "Region", "Month");
+        CREATE INDEX IF NOT EXISTS idx_sheet_rows_version_month ON sheet_rows (version, "Month", "Region");
+    """)
+    return conn
+
+def _prune_history(conn, newest):
+    """Delete the versions beyond HISTORY_KEEP_VERSIONS or older than HISTORY_KEEP_DAYS (never newest), in conn's transaction.
+    Returns the number of versions deleted."""
+    conditions, params = [], []
+    if HISTORY_KEEP_VERSIONS > 0:
+        conditions.append("version NOT IN (SELECT version FROM sheet_versions ORDER BY version DESC LIMIT ?)")
+        params.append(HISTORY_KEEP_VERSIONS)
+    if HISTORY_KEEP_DAYS > 0:
+        conditions.append("fetched_at < ?")
+        params.append((datetime.now() - timedelta(days=HISTORY_KEEP_DAYS)).isoformat(timespec='seconds'))
+    if not conditions:
+        return 0
+    pruned = [v for (v,) in conn.execute(f"SELECT version FROM sheet_versions WHERE version != ? AND ({' OR '.join(conditions)})",
+                                         [newest, *params])]
+    if pruned:
+        marks = ', '.join('?' * len(pruned))
+        conn.execute(f"DELETE FROM sheet_rows WHERE version IN ({marks})", pruned)
+        conn.execute(f"DELETE FROM sheet_versions WHERE version IN ({marks})", pruned)
+        logger.info(f"Pruned {len(pruned)} old sheet versions from {HISTORY_DB}")
+    return len(pruned)
+
+def record_sheet_version(data, sheet_hash):
+    """Append cleaned sheet rows as a new version unless the newest stored version has the same hash."""
+    if not HISTORY_DB:
+        return None
+    try:
+        rows = data.reindex(columns=SHEET_FACT_COLS)
+        rows['Month'] = pd.to_datetime(rows['Month'], errors='coerce').dt.strftime('%Y-%m-%d')
+        rows = rows.astype(object).where(rows.notna(), None)
+        conn = _history_connect()
+        pruned = 0
+        try:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")  # one writer at a time across workers
+                latest = conn.execute("SELECT version, sheet_hash FROM sheet_versions ORDER BY version DESC LIMIT 1").fetchone()
+                if latest and latest[1] == sheet_hash:
+                    version = latest[0]
+                else:
+                    version = conn.execute("INSERT INTO sheet_versions (sheet_hash, fetched_at, rows) VALUES (?, ?, ?)",
+                                           (sheet_hash, datetime.now().isoformat(timespec='seconds'), len(rows))).lastrowid
+                    placeholders = ', '.join('?' * (len(SHEET_FACT_COLS) + 2))
+                    quoted = ', '.join(f'"{col}"' for col in SHEET_FACT_COLS)
+                    conn.executemany(f"INSERT INTO sheet_rows (version, row, {quoted}) VALUES ({placeholders})",
+                                     ((version, i, *values) for i, values in enumerate(rows.itertuples(index=False, name=None))))
+                    logger.info(f"Stored sheet version {version} ({len(rows)} rows) in {HISTORY_DB}")
+                    pruned = _prune_history(conn, version)
+            if pruned:
+                conn.executescript("PRAGMA incremental_vacuum")  # truncate the freed pages off the file
+        finally:
+            conn.close()
+        set_model_sheet_version(sheet_hash, version)
+        return version
+    except Exception as e:
+        logger.warning(f"Could not store sheet version: {e}", exc_info=True)
+        return None
 
-# Try to transform data once at startup
-if get_google_sheets_data() is not None:
-    transform_data()
-    # Set the initial hash so monitor can detect changes
+def load_sheet_version(version=None):
+    """Return (version, sheet_hash, cleaned rows) of a stored version (newest if None), or (None, None, None)."""
+    if not HISTORY_DB or not os.path.exists(HISTORY_DB):
+        return None, None, None
     try:
-        initial_df = get_google_sheets_data()
-        if initial_df is not None:
-            last_sheet_hash = compute_df_hash(initial_df)
-            print(f"[OK] Initial sheet hash set: {last_sheet_hash[:8]}...")
+        conn = _history_connect()
+        try:
+            if version is None:
+                found = conn.execute("SELECT version, sheet_hash FROM sheet_versions ORDER BY version DESC LIMIT 1").fetchone()
+            else:
+                found = conn.execute("SELECT version, sheet_hash FROM sheet_versions WHERE version = ?", (version,)).fetchone()
+            if not found:
+                return None, None, None
+            quoted = ', '.join(f'"{col}"' for col in SHEET_FACT_COLS)
+            data = pd.read_sql_query(f"SELECT {quoted} FROM sheet_rows WHERE version = ? ORDER BY row", conn, params=(found[0],))
+        finally:
+            conn.close()
+        data['Month'] = pd.to_datetime(data['Month'])
+        return found[0], found[1], data
     except Exception as e:
-        print(f"[WARN] Could not compute initial hash: {e}")
-    print("✅ Transformation completed successfully")
-    # Start the background monitor thread to detect changes
-    print("\n[STARTING] Background sheet monitor...")
-    start_sheet_monitor(poll_interval=15)  # Poll every 15 seconds (adjust as needed)
-else:
-    print("⚠️ Could not fetch data from Google Sheets, will try on next request")
+        logger.warning(f"Could not load sheet version {version}: {e}", exc_info=True)
+        return None, None, None
+
+def list_sheet_versions():
+    """Stored sheet versions, newest first."""
+    if not HISTORY_DB or not os.path.exists(HISTORY_DB):
+        return []
+    conn = _history_connect()
+    try:
+        rows = conn.execute("SELECT version, sheet_hash, fetched_at, rows FROM sheet_versions ORDER BY version DESC").fetchall()
+    finally:
+        conn.close()
+    return [{'version': v, 'sheet_hash': h, 'fetched_at': at, 'rows': n} for v, h, at, n in rows]
+
+def load_data_as_of(version):
+    """ModelSnapshot of a stored sheet version (not published; version 0), or None if it is unknown."""
+    with _as_of_lock:
+        hit = version in _as_of_models
+        metric_inc('dashboard_cache_requests_total', {'cache': 'as_of_model', 'result': 'hit' if hit else 'miss'})
+        if hit:
+            return _as_of_models[version]
+    found, sheet_hash, data = load_sheet_version(version)
+    if data is None:
+        return None
+    model = ModelSnapshot(0, *build_model(data), 'history', datetime.now(), sheet_hash, found)
+    with _as_of_lock:
+        _as_of_models[version] = model
+        while len(_as_of_models) > AS_OF_CACHE_SIZE:
+            _as_of_models.pop(next(iter(_as_of_models)))
+    return model
+
+# ---------- Startup ----------
+#
+# STARTUP_MODE=deferred (default): importing the module only registers the app, its layout and callbacks.
+# initialize_data() then runs in a background warmer thread, started once per worker process by the first
+# request (or a server hook); /ready answers 503 until it has loaded a model.
+# STARTUP_MODE=eager: initialize_data() runs during the import, as before.
+# STARTUP_MODE=preload (gunicorn --preload, see gunicorn.conf.py): the import loads the model but starts no
+# thread, so the master can fork safely and the workers share the model's pages copy-on-write. Each worker
+# then calls start_worker() after the fork.
+#
+# However many workers there are, one of them (the holder of MONITOR_LOCK_FILE) runs the sheet monitor. The
+# others follow the history store: they load each new sheet version the monitor records instead of polling
+# the sheet themselves, and take over the lock if the monitoring worker exits. Without a history store every
+# worker monitors the sheet on its own.
+STARTUP_MODE = os.environ.get('STARTUP_MODE', 'deferred').lower()
+MONITOR_LOCK_FILE = os.environ.get('MONITOR_LOCK_FILE', 'sheet_monitor.lock')
+FOLLOW_INTERVAL = float(os.environ.get('FOLLOW_INTERVAL', 5))
+_warmup = {'pid': None, 'thread': None, 'started': None, 'seconds': None}
+_warmup_lock = threading.Lock()
+_refresh_role = {'pid': None, 'role': None, 'lock_file': None, 'follows': 0}
+
+def load_initial_model():
+    """Warm start from the history store, then fetch and transform the sheet; False when neither loaded a model."""
+    logger.info("Initializing dashboard...")
+
+    # Warm start: serve the newest stored sheet version until (or while) Google Sheets cannot be reached
+    warm_version, warm_hash, warm_data = load_sheet_version()
+    warm_started = warm_data is not None and transform_data(clean_data=warm_data, sheet_hash=warm_hash, sheet_version=warm_version)
+    if warm_started:
+        logger.info(f"Warm start from stored sheet version {warm_version} ({len(warm_data)} rows)")
+
+    logger.info("Attempting to fetch data from Google Sheets and transform...")
+
+    # One fetch: transform_data() sets the hash the monitor compares against (and skips an unchanged warm start)
+    if transform_data():
+        logger.info("Transformation completed successfully")
+        return True
+    if warm_started:
+        logger.warning("Could not fetch data from Google Sheets, serving the stored version until it is reachable")
+        return True
+    return False
 
-orders, revenues, cash, merged, measure_cols = load_data()
+def initialize_data():
+    """Load the initial model, then start keeping it fresh (sheet monitor or history follower)."""
+    if load_initial_model() or credentials_configured():
+        # without a model this stays unready (/ready answers 503) until the monitor's retries load the sheet
+        start_sheet_refresh()
+    else:
+        logger.warning("Could not fetch data from Google Sheets, will try on next request")
+
+def take_monitor_lock():
+    """True when this process holds MONITOR_LOCK_FILE (taking it if free); the lock ends with the process."""
+    if fcntl is None or not MONITOR_LOCK_FILE:
+        return True
+    if _refresh_role['lock_file'] is not None and _refresh_role['pid'] == os.getpid():
+        return True
+    lock_file = open(MONITOR_LOCK_FILE, 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _refresh_role.update(pid=os.getpid(), lock_file=lock_file)
+    return True
+
+def latest_sheet_version():
+    """(version, sheet_hash) of the newest stored sheet version, or (None, None)."""
+    if not HISTORY_DB or not os.path.exists(HISTORY_DB):
+        return None, None
+    conn = _history_connect()
+    try:
+        found = conn.execute("SELECT version, sheet_hash FROM sheet_versions ORDER BY version DESC LIMIT 1").fetchone()
+    finally:
+        conn.close()
+    return found or (None, None)
+
+def _follow_history():
+    while True:
+        time.sleep(FOLLOW_INTERVAL)
+        if take_monitor_lock():
+            logger.info("history_follower: monitoring worker exited, taking over the sheet monitor")
+            _refresh_role['role'] = 'monitor'
+            start_sheet_monitor(poll_interval=sheet_poll_interval())
+            return
+        try:
+            version, sheet_hash = latest_sheet_version()
+            if sheet_hash is None or sheet_hash == current_model().sheet_hash:
+                continue
+            version, sheet_hash, data = load_sheet_version(version)
+            with refresh_lock:
+                ok = data is not None and transform_data(clean_data=data, sheet_hash=sheet_hash, sheet_version=version)
+            if ok:
+                _refresh_role['follows'] += 1
+                logger.info(f"history_follower: loaded sheet version {version}")
+        except Exception as e:
+            logger.exception(f"history_follower: error loading the newest sheet version: {e}")
+
+def start_sheet_refresh():
+    """Keep this process's model fresh: run the sheet monitor if no other worker does, else follow the history."""
+    if _refresh_role['role'] is not None and _refresh_role['pid'] == os.getpid():
+        return _refresh_role['role']
+    _refresh_role['pid'] = os.getpid()
+    if not HISTORY_DB or take_monitor_lock():
+        _refresh_role['role'] = 'monitor'
+        # Start the background monitor thread to detect changes
+        logger.info("Starting background sheet monitor...")
+        start_sheet_monitor(poll_interval=sheet_poll_interval())  # 15 s, or the slow fallback when the hook is configured
+    else:
+        _refresh_role['role'] = 'follower'
+        logger.info(f"Another worker monitors the sheet, following {HISTORY_DB}")
+        threading.Thread(target=_follow_history, name='history-follower', daemon=True).start()
+    return _refresh_role['role']
+
+def start_warmup():
+    """Start the data warmer thread of this process (once per pid, so forked workers get their own)."""
+    with _warmup_lock:
+        if _warmup['pid'] == os.getpid():
+            return _warmup['thread']
+
+        def warm():
+            started = time.perf_counter()
+            try:
+                initialize_data()
+            except Exception as e:
+                logger.exception(f"Data warmup failed: {e}")
+            _warmup['seconds'] = round(time.perf_counter() - started, 3)
+            logger.info(f"Data warmup finished in {_warmup['seconds']}s", extra={'seconds': _warmup['seconds']})
+
+        thread = threading.Thread(target=warm, name='data-warmer', daemon=True)
+        _warmup.update(pid=os.getpid(), thread=thread, started=datetime.now().isoformat(timespec='seconds'), seconds=None)
+        thread.start()
+        return thread
+
+def start_worker():
+    """Per-worker start after a fork (gunicorn post_fork): the data warmer, or with a preloaded model its refresh."""
+    if STARTUP_MODE == 'deferred':
+        start_warmup()
+    if STARTUP_MODE != 'preload':
+        return
+    with _warmup_lock:
+        if _warmup['pid'] == os.getpid():
+            return
+        _warmup['pid'] = os.getpid()
+    if not current_model().merged.empty or credentials_configured():
+        start_sheet_refresh()
 
 # Helper functions for safe access when data is empty or missing columns (important for platform imports)
 def safe_unique(column):
     """Return sorted unique values for column from merged, or empty list if not available."""
+    merged = current_model().merged
     try:
         if isinstance(merged, pd.DataFrame) and column in merged.columns:
             return sorted(merged[column].dropna().unique())
@@ -452,6 +1346,7 @@ def safe_unique(column):
 
 def safe_month_range():
     """Return (min, max) of Month column or (today, today) when unavailable."""
+    merged = current_model().merged
     try:
         if isinstance(merged, pd.DataFrame) and 'Month' in merged.columns and not merged['Month'].dropna().empty:
             return merged['Month'].min(), merged['Month'].max()
@@ -462,6 +1357,7 @@ def safe_month_range():
 
 def safe_years():
     """Return sorted list of valid years (positive ints) from merged."""
+    merged = current_model().merged
     try:
         if isinstance(merged, pd.DataFrame) and 'Year' in merged.columns:
             years = sorted([y for y in merged['Year'].dropna().unique() if y and y > 0])
@@ -472,16 +1368,359 @@ def safe_years():
 
 dropdown_cols = ["Customer", "Project", "SM", "PO REF"]
 
+# Keys of the page filter stores that map directly to columns of the merged data
+ROW_FILTER_COLS = ["Customer", "Project", "SM", "PO REF", "Region", "Year"]
+# Rows per chunk when streaming row-level exports (keeps memory bounded for large results)
+EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', 50000))
+
+def applied_filters(df, filters):
+    """(column, value) pairs of the row filters that apply to df; None, "" and "All" mean no filter."""
+    applied = []
+    for col in ROW_FILTER_COLS:
+        val = (filters or {}).get(col)
+        if val is None or val == "" or val == "All" or col not in df.columns:
+            continue
+        applied.append((col, val))
+    return applied
+
+def filter_mask(df, filters):
+    """Return a boolean mask selecting the rows of df that match the applied filters (no copy of df)."""
+    mask = np.ones(len(df), dtype=bool)
+    for col, val in applied_filters(df, filters):
+        mask &= (df[col] == val).to_numpy()
+    return mask
+
+def build_row_export_url(fmt, filters=None):
+    """URL of the row-level export endpoint for the given format and page filters."""
+    params = {'format': fmt}
+    if filters:
+        params['filters'] = json.dumps(filters)
+    return f"/export/rows?{urlencode(params)}"
+
+def build_chart_zip_url(page, filters=None, measures=None, fmt='csv'):
+    """URL of the bulk chart export for one page (or 'all') with the given filters and selected measures."""
+    params = {'page': page, 'format': fmt}
+    if filters:
+        params['filters'] = json.dumps(filters)
+    if measures:
+        params['measures'] = json.dumps(measures)
+    return f"/export/charts.zip?{urlencode(params)}"
+
 # Single Dash app instance
 app = dash.Dash(__name__, suppress_callback_exceptions=True)
 app.title = "SM Insight Board"
 server = app.server
 
+@server.before_request
+def _start_worker_warmup():
+    # the first request a worker process sees starts its data warmer or refresh (if no server hook has already)
+    if STARTUP_MODE != 'eager' and _warmup['pid'] != os.getpid():
+        start_worker()
+
 # Health endpoint for platform checks (useful for Railway / monitoring)
 @server.route("/health")
 def health():
+    """Liveness: the process answers. Cheap on purpose; see /ready for the model state."""
     return "OK", 200
 
+def _age_seconds(moment):
+    return None if moment is None else round((datetime.now() - moment).total_seconds(), 1)
+
+@server.route("/ready")
+def ready():
+    """Readiness: 200 once a model is loaded, 503 before (e.g. the startup fetch failed and no history exists)."""
+    model = current_model()
+    loaded = not model.merged.empty
+    state = {
+        'ready': loaded,
+        'data_version': model.version,
+        'model_source': model.source,
+        'sheet_version': model.sheet_version,
+        'sheet_hash': model.sheet_hash[:8] if model.sheet_hash else None,
+        'last_transform': model.built_at.isoformat(timespec='seconds') if model.built_at else None,
+        'last_transform_age_seconds': _age_seconds(model.built_at),
+        'last_sheet_check': last_sheet_check_at.isoformat(timespec='seconds') if last_sheet_check_at else None,
+        'last_sheet_check_age_seconds': _age_seconds(last_sheet_check_at),
+        'rows': {table: len(getattr(model, table)) for table in ('orders', 'revenues', 'cash', 'merged')},
+    }
+    state['monitor'] = {
+        'running': sheet_monitor_thread is not None and sheet_monitor_thread.is_alive(),
+        'last_outcome': _poll_state['last_outcome'],
+        'next_poll_at': _poll_state['next_poll_at'],
+        'errors': _poll_state['errors'],
+    }
+    state['startup'] = {'mode': STARTUP_MODE, 'warmup_started': _warmup['started'], 'warmup_seconds': _warmup['seconds'],
+                        'refresh_role': _refresh_role['role'] if _refresh_role['pid'] == os.getpid() else None,
+                        'versions_followed': _refresh_role['follows']}
+    return jsonify(state), 200 if loaded else 503
+
+MAIN_FILTER_INPUTS = {'main-year': 'Year', 'main-region': 'Region', 'main-sm': 'SM'}
+_model_metrics_version = [None]
+
+def callback_filter_label(inputs):
+    """('Region+Year', 'Monthly') labels of a page callback's inputs: names of the filters set (not their values) and the period."""
+    columns, periods = dict(MAIN_FILTER_INPUTS), {'main-period'}
+    for spec in PAGE_SPECS.values():
+        columns.update({dropdown_id: col for col, dropdown_id in spec['filters'].items()})
+        periods.add(spec['period'])
+    active, period = set(), 'none'
+    for item in inputs:
+        if not isinstance(item, dict):
+            continue
+        input_id, value = item.get('id'), item.get('value')
+        if input_id in periods:
+            period = value or 'none'
+        elif input_id in columns and value not in (None, '', [], 'All'):
+            active.add(columns[input_id])
+    return '+'.join(sorted(active)) or 'none', period
+
+def update_model_metrics():
+    """Model size, memory and cache hit ratio gauges (model memory is measured once per data version)."""
+    model = current_model()
+    version = model.version
+    if _model_metrics_version[0] != version:
+        for table in ('orders', 'revenues', 'cash', 'merged'):
+            frame = getattr(model, table)
+            metric_set('dashboard_model_rows', {'table': table}, len(frame))
+            metric_set('dashboard_model_bytes', {'table': table}, int(frame.memory_usage(deep=True).sum()))
+        _model_metrics_version[0] = version
+    metric_set('dashboard_data_version', None, version)
+    try:
+        with open('/proc/self/statm') as f:
+            metric_set('dashboard_process_resident_bytes', None, int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE'))
+    except (OSError, ValueError, AttributeError):
+        pass
+    with _metrics_lock:
+        lookups = dict(_metrics['dashboard_cache_requests_total']['series'])
+    totals = {}
+    for labels, count in lookups.items():
+        labels = dict(labels)
+        hits, total = totals.get(labels['cache'], (0, 0))
+        totals[labels['cache']] = (hits + (count if labels['result'] == 'hit' else 0), total + count)
+    for cache, (hits, total) in totals.items():
+        metric_set('dashboard_cache_hit_ratio', {'cache': cache}, round(hits / total, 4) if total else 0)
+
+@server.route("/metrics")
+def metrics():
+    """Prometheus scrape endpoint of this worker."""
+    update_model_metrics()
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+# ---------- Response compression and payload budget ----------
+#
+# Text responses (callback figure JSON, table records and chart stores, the layout, the static JS/CSS) are
+# compressed with brotli when the client accepts it and the brotli package is installed, else gzip. Streamed
+# responses (the SSE feed, the row exports) are left alone. Static files are compressed once per path and
+# encoding. Callback payloads over CALLBACK_PAYLOAD_BUDGET bytes (uncompressed; 0 disables) are logged with
+# their inputs.
+
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))  # 0 disables compression
+COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))  # gzip level of callbacks; brotli uses quality 5
+CALLBACK_PAYLOAD_BUDGET = int(os.environ.get('CALLBACK_PAYLOAD_BUDGET', 1_000_000))
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/javascript', 'text/javascript', 'text/css', 'text/html',
+                          'text/plain', 'image/svg+xml')
+STATIC_PREFIXES = ('/_dash-component-suites/', '/assets/')
+_static_compressed = {}
+_static_compressed_lock = threading.Lock()
+
+def _brotli():
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+def response_encoding():
+    """'br' or 'gzip' (whichever the request accepts and this process supports, brotli first), else None."""
+    accepted = request.accept_encodings
+    if accepted['br'] and _brotli() is not None:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def compress_bytes(data, encoding, static=False):
+    """Compress data as 'br' or 'gzip'; static files get the slower, higher settings since they are compressed once."""
+    if encoding == 'br':
+        return _brotli().compress(data, quality=9 if static else 5)
+    return gzip.compress(data, compresslevel=9 if static else COMPRESS_LEVEL, mtime=0)
+
+def _warn_over_budget(callback, body, size):
+    inputs = {str(item.get('id')): item.get('value') for item in body.get('inputs', []) if isinstance(item, dict)}
+    metric_inc('dashboard_callback_over_budget_total', {'callback': callback})
+    inputs = json.dumps(inputs, default=str)[:2000]
+    logger.warning(f"Callback {callback} returned {size} bytes, over the {CALLBACK_PAYLOAD_BUDGET} byte budget; inputs {inputs}",
+                   extra={'callback': callback, 'bytes': size, 'budget': CALLBACK_PAYLOAD_BUDGET})
+
+def _static_compressed_data(key, data, encoding):
+    with _static_compressed_lock:
+        compressed = _static_compressed.get(key)
+    if compressed is None:
+        compressed = compress_bytes(data, encoding, static=True)
+        with _static_compressed_lock:
+            _static_compressed[key] = compressed
+    return compressed
+
+@server.after_request
+def _compress_response(response):
+    """Compress text responses (registered first, so it runs after the other after_request hooks)."""
+    path = request.path
+    static = path.startswith(STATIC_PREFIXES)
+    if response.status_code != 200:
+        return response
+    try:
+        callback = None
+        if path.endswith('/_dash-update-component'):
+            body = request.get_json(silent=True) or {}
+            callback = str(body.get('output', '')).strip('.').split('...')[0]
+            size = response.calculate_content_length() or 0
+            if CALLBACK_PAYLOAD_BUDGET and size > CALLBACK_PAYLOAD_BUDGET:
+                _warn_over_budget(callback, body, size)
+        encoding = response_encoding() if COMPRESS_MIN_BYTES else None
+        if (encoding is None or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+        if response.direct_passthrough:
+            if not static:
+                return response
+            response.direct_passthrough = False  # /assets/ files are sent as a file wrapper; read it
+        elif response.is_streamed:
+            return response  # generators: SSE and the streamed exports
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_BYTES:
+            return response
+        if static:
+            compressed = _static_compressed_data((path, response.get_etag()[0] or len(data), encoding), data, encoding)
+        else:
+            compressed = compress_bytes(data, encoding)
+            if callback is not None:
+                metric_observe('dashboard_callback_wire_bytes', {'callback': callback}, len(compressed))
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        # each encoding is its own representation, so it gets its own validator (and its own 304s)
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f'{etag}-{encoding}', weak)
+            response.make_conditional(request)
+    except Exception as e:
+        logger.warning(f"Could not compress {path}: {e}")
+    return response
+
+@server.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+    if _profile_state['callbacks'] and request.path.endswith('/_dash-update-component'):
+        body = request.get_json(silent=True) or {}
+        callback = str(body.get('output', '')).strip('.').split('...')[0]
+        if take_profile_slot('callbacks', callback):
+            g.profile = (start_profiler(), callback, body)
+
+@server.after_request
+def _finish_callback_profile(response):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        handle, callback, body = profile
+        save_profile(handle, callback, {'kind': 'callback', 'callback': callback, 'status': response.status_code,
+                                        'seconds': round(time.perf_counter() - g.request_started, 3),
+                                        'inputs': body.get('inputs'), 'state': body.get('state'),
+                                        'time': datetime.now().isoformat(timespec='seconds')})
+    return response
+
+@server.after_request
+def _record_callback_metrics(response):
+    """Latency and payload size of every Dash callback request; rendered pages also by filters and period."""
+    started = getattr(g, 'request_started', None)
+    if started is None or not request.path.endswith('/_dash-update-component'):
+        return response
+    try:
+        elapsed = time.perf_counter() - started
+        body = request.get_json(silent=True) or {}
+        outputs = str(body.get('output', '')).strip('.').split('...')
+        callback = outputs[0]
+        size = response.calculate_content_length() or 0
+        metric_observe('dashboard_callback_seconds', {'callback': callback}, elapsed)
+        metric_observe('dashboard_callback_response_bytes', {'callback': callback}, size)
+        render_keys = [o.split('.')[0] for o in outputs if o.endswith('-render-key.data')]
+        if render_keys and response.status_code == 200:
+            filters, period = callback_filter_label(body.get('inputs', []))
+            page = render_keys[0][:-len('-render-key')]
+            metric_observe('dashboard_page_render_seconds', {'page': page, 'filters': filters, 'period': period}, elapsed)
+    except Exception as e:
+        logger.warning(f"Could not record callback metrics: {e}")
+    return response
+
+def _admin_denied():
+    """Error response unless the request carries the admin token (the admin routes 404 without ADMIN_TOKEN)."""
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'admin endpoints are not configured'}), 404
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+        return jsonify({'error': 'invalid admin token'}), 401
+    return None
+
+@server.route("/admin/profile", methods=["GET", "POST"])
+def admin_profile():
+    """Arm captures with POST ?callbacks=N&callback=<output substring>&transform=N; GET shows what is armed and captured."""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    if request.method == 'POST':
+        try:
+            callbacks = int(request.args.get('callbacks', 0))
+            transform = int(request.args.get('transform', 0))
+        except ValueError:
+            return jsonify({'error': 'callbacks and transform must be integers'}), 400
+        with _profile_state_lock:
+            _profile_state.update(callbacks=callbacks, transform=transform, callback_match=request.args.get('callback', ''))
+        logger.info("Profiling armed", extra={'callbacks': callbacks, 'transform': transform})
+    with _profile_state_lock:
+        return jsonify(dict(_profile_state, profile_dir=PROFILE_DIR, profiler=PROFILER))
+
+@server.route("/admin/profile/<path:name>")
+def admin_profile_download(name):
+    """Download a captured profile (or its .json metadata) from PROFILE_DIR."""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    return send_from_directory(os.path.abspath(PROFILE_DIR), name, as_attachment=True)
+
+@server.route("/hooks/sheet-changed", methods=["POST"])
+def sheet_changed_hook():
+    """Called by the sheet's Apps Script trigger with the X-Hook-Secret header; schedules a debounced refresh."""
+    if not SHEET_HOOK_SECRET:
+        return jsonify({'error': 'sheet hook is not configured'}), 404
+    supplied = request.headers.get('X-Hook-Secret', '')
+    if not hmac.compare_digest(supplied.encode('utf-8'), SHEET_HOOK_SECRET.encode('utf-8')):
+        return jsonify({'error': 'invalid hook secret'}), 401
+    request_sheet_refresh()
+    _touch_hook_stamp()
+    return jsonify({'queued': True, 'debounce_seconds': HOOK_DEBOUNCE_SECONDS}), 202
+
+@server.route("/monitor/poll")
+def poll_schedule():
+    """Current sheet poll schedule, last fetch outcome and Sheets call budget usage of this worker."""
+    return jsonify(poll_schedule_state())
+
+@server.route("/events/data-version")
+def data_version_stream():
+    """Server-sent events telling open tabs that the data changed (DATA_PUSH)."""
+    if not DATA_PUSH:
+        return jsonify({'error': 'data push is not enabled'}), 404
+    return Response(data_version_events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@server.route("/history/versions")
+def history_versions():
+    """Stored sheet versions (newest first) and the version currently served; use them as ?as_of= on the exports."""
+    return jsonify({'current': current_model().sheet_version, 'versions': list_sheet_versions()})
+
+def request_model():
+    """ModelSnapshot for an export request: the live model, or a stored sheet version with ?as_of=<version> (None if unknown)."""
+    as_of = request.args.get('as_of')
+    if not as_of:
+        return current_model()
+    return load_data_as_of(int(as_of))
+
 def dropdown_filter(id, column):
     opts = safe_unique(column)
     return dcc.Dropdown(
@@ -541,7 +1780,7 @@ def region_filter(id):
     )
 
 def create_chart_card(fig, chart_id):
-    title = fig.layout.title.text or "Chart"
+    title = fig['layout'].get('title', {}).get('text') or "Chart"
     return html.Div([
         dcc.Graph(figure=fig, config={'displayModeBar': False}, style={'height': '300px'}),
         html.Button(f"Export '{title}' Data", id=f"export-{chart_id}", style={'marginTop': '6px', 'fontSize': '0.75rem', 'padding': '2px 6px'})
@@ -558,13 +1797,28 @@ def create_kpi_card(title, value_id, card_id):
         n_clicks=0
     )
 
+def create_export_links(prefix):
+    """Links that download the row-level filtered data and all chart data of a page (hrefs kept in sync with the page filters)."""
+    link_style = {'marginLeft': '8px', 'fontSize': '0.75rem', 'color': '#1976d2'}
+    return html.Div([
+        html.Span("Export filtered rows:", style={'fontSize': '0.75rem'}),
+        html.A("CSV", id=f"{prefix}-export-rows-csv", href=build_row_export_url('csv'), style=link_style),
+        html.A("XLSX", id=f"{prefix}-export-rows-xlsx", href=build_row_export_url('xlsx'), style=link_style),
+        html.A("Parquet", id=f"{prefix}-export-rows-parquet", href=build_row_export_url('parquet'), style=link_style),
+        html.Span(" | ", style={'fontSize': '0.75rem', 'marginLeft': '8px'}),
+        html.A("All charts (zip)", id=f"{prefix}-export-charts-zip", href=build_chart_zip_url(prefix), style=link_style),
+    ], style={'textAlign': 'right', 'margin': '6px 2cm'})
+
 def create_page1_layout():
     return html.Div([
         # Use actual column name from measure_cols if available to keep store consistent with dataframe columns
-        dcc.Store(id='measure-store', data=measure_cols.get("Order Amount", "Order Amount")),
+        dcc.Store(id='measure-store', data=current_model().measure_cols.get("Order Amount", "Order Amount")),
         dcc.Store(id='p1-chart1-store'),
         dcc.Store(id='p1-chart2-store'),
         dcc.Store(id='p1-filter-store'),
+        dcc.Store(id='p1-kpi-store'),
+        dcc.Store(id='p1-refresh'),
+        dcc.Store(id='p1-render-key'),
         dcc.Download(id="download-p1-chart1"),
         dcc.Download(id="download-p1-chart2"),
         html.Div([
@@ -605,16 +1859,20 @@ def create_page1_layout():
         
         html.Hr(style={'margin': '8px 0'}),
         dcc.Loading(type="circle", children=html.Div(id="page1-cards")),
-        dcc.Loading(type="circle", children=html.Div(id="sm-summary-table"))
+        dcc.Loading(type="circle", children=html.Div(id="sm-summary-table")),
+        create_export_links('p1')
     ], style={'backgroundColor': '#f8f9fa', 'padding': '8px', 'borderRadius': '6px', 'border': '1px solid #dee2e6'})
 
 def create_page2_layout():
     return html.Div([
         # Default to actual column name for Revenue Amount
-        dcc.Store(id='region-measure-store', data=measure_cols.get("Revenue Amount", "Revenue Amount")),
+        dcc.Store(id='region-measure-store', data=current_model().measure_cols.get("Revenue Amount", "Revenue Amount")),
         dcc.Store(id='p2-chart1-store'),
         dcc.Store(id='p2-chart2-store'),
         dcc.Store(id='p2-filter-store'),
+        dcc.Store(id='p2-kpi-store'),
+        dcc.Store(id='p2-refresh'),
+        dcc.Store(id='p2-render-key'),
         dcc.Download(id="download-p2-chart1"),
         dcc.Download(id="download-p2-chart2"),
         html.Div([
@@ -653,15 +1911,19 @@ def create_page2_layout():
         
         html.Hr(style={'margin': '8px 0'}),
         dcc.Loading(type="circle", children=html.Div(id="region-charts")),
-        dcc.Loading(type="circle", children=html.Div(id="region-summary-table"))
+        dcc.Loading(type="circle", children=html.Div(id="region-summary-table")),
+        create_export_links('p2')
     ], style={'backgroundColor': '#f8f9fa', 'padding': '8px', 'borderRadius': '6px', 'border': '1px solid #dee2e6'})
 
 def create_page3_layout():
     return html.Div([
-        dcc.Store(id='sm-measure-store', data=measure_cols.get("Order Amount", "Order Amount")),
+        dcc.Store(id='sm-measure-store', data=current_model().measure_cols.get("Order Amount", "Order Amount")),
         dcc.Store(id='p3-chart1-store'),
         dcc.Store(id='p3-chart2-store'),
         dcc.Store(id='p3-filter-store'),
+        dcc.Store(id='p3-kpi-store'),
+        dcc.Store(id='p3-refresh'),
+        dcc.Store(id='p3-render-key'),
         dcc.Download(id="download-p3-chart1"),
         dcc.Download(id="download-p3-chart2"),
         html.Div([
@@ -700,15 +1962,19 @@ def create_page3_layout():
         
         html.Hr(style={'margin': '8px 0'}),
         dcc.Loading(type="circle", children=html.Div(id="sm-charts")),
-        dcc.Loading(type="circle", children=html.Div(id="sm-summary-table-page3"))
+        dcc.Loading(type="circle", children=html.Div(id="sm-summary-table-page3")),
+        create_export_links('p3')
     ], style={'backgroundColor': '#f8f9fa', 'padding': '8px', 'borderRadius': '6px', 'border': '1px solid #dee2e6'})
 
 def create_page4_layout():
     return html.Div([
-        dcc.Store(id='year-measure-store', data=measure_cols.get("Revenue Amount", "Revenue Amount")),
+        dcc.Store(id='year-measure-store', data=current_model().measure_cols.get("Revenue Amount", "Revenue Amount")),
         dcc.Store(id='p4-chart1-store'),
         dcc.Store(id='p4-chart2-store'),
         dcc.Store(id='p4-filter-store'),
+        dcc.Store(id='p4-kpi-store'),
+        dcc.Store(id='p4-refresh'),
+        dcc.Store(id='p4-render-key'),
         dcc.Download(id="download-p4-chart1"),
         dcc.Download(id="download-p4-chart2"),
         html.Div([
@@ -747,7 +2013,8 @@ def create_page4_layout():
         
         html.Hr(style={'margin': '8px 0'}),
         dcc.Loading(type="circle", children=html.Div(id="year-charts")),
-        dcc.Loading(type="circle", children=html.Div(id="year-summary-table"))
+        dcc.Loading(type="circle", children=html.Div(id="year-summary-table")),
+        create_export_links('p4')
     ], style={'backgroundColor': '#f8f9fa', 'padding': '8px', 'borderRadius': '6px', 'border': '1px solid #dee2e6'})
 
 def create_main_dashboard_layout():
@@ -755,6 +2022,9 @@ def create_main_dashboard_layout():
         dcc.Store(id='main-chart1-store'),
         dcc.Store(id='main-chart2-store'),
         dcc.Store(id='main-filter-store'),
+        dcc.Store(id='main-kpi-store'),
+        dcc.Store(id='main-refresh'),
+        dcc.Store(id='main-render-key'),
         dcc.Download(id="download-main-chart1"),
         dcc.Download(id="download-main-chart2"),
         html.Div([
@@ -785,130 +2055,122 @@ def create_main_dashboard_layout():
         ], style={'display': 'flex', 'flexDirection': 'row'}),
         html.Hr(style={'margin': '8px 0'}),
         dcc.Loading(type="circle", children=html.Div(id='main-charts')),
-        dcc.Loading(type="circle", children=html.Div(id='main-summary-table'))
+        dcc.Loading(type="circle", children=html.Div(id='main-summary-table')),
+        create_export_links('main')
     ], style={'backgroundColor': '#f8f9fa', 'padding': '8px', 'borderRadius': '6px', 'border': '1px solid #dee2e6'})
 
-app.layout = html.Div([
-    dcc.Location(id='url', refresh=False),
-    dcc.Store(id='shared-dropdowns', data={}),
-    html.Div([
-        # Header
+# Navigation links (static; the active link is highlighted clientside from the pathname)
+NAV_ITEMS = [
+    ('🏠 Main Dashboard', '/'),
+    ('🌍 Region Analysis', '/page-2'),
+    ('👥 SM Analysis', '/page-3'),
+    ('📈 Year-wise Analysis', '/page-4'),
+    ('📋 PO Analysis', '/page-5'),
+]
+
+def build_layout():
+    """The whole app layout; dropdown options, dates and measure columns come from the data loaded right now."""
+    return html.Div([
+        dcc.Location(id='url', refresh=False),
+        dcc.Store(id='shared-dropdowns', data={}),
+        # base measure -> actual merged column, read by the clientside KPI card callbacks
+        dcc.Store(id='measure-cols-store', data=current_model().measure_cols),
         html.Div([
-            # Logo (left)
-            html.Img(src='/assets/gif1.gif', style={'height': '48px', 'marginRight': '18px', 'marginTop': '-8px'}),
-            # Titles and glassy line (right)
+            # Header
             html.Div([
-                html.H1(
-                    "SM Insight Board",
-                    style={
-                        'textAlign': 'center',
-                        'margin': '0',
-                        'marginTop': '0',
-                        'padding': '0',
-                        'paddingTop': '0',
-                        'color': '#2c3e50',
-                        'fontSize': '1.3rem',
-                        'fontWeight': 'bold',
-                        'fontFamily': 'Lora, serif',
-                    }
-                ),
-                html.Div(style={
-                    'height': '5px',
-                    'width': '100%',
-                    'background': 'linear-gradient(90deg, #1976d2 0%, #40bfff 100%)',
-                    'borderRadius': '6px',
-                    'boxShadow': '0 2px 12px 0 rgba(25, 118, 210, 0.25)',
-                    'backdropFilter': 'blur(2px)',
-                    'opacity': 0.85,
-                    'margin': '0.5rem 0 1.2rem 0',
-                }),
-            ], style={'flexGrow': 1}),
-        ], style={'width': '100%', 'display': 'flex', 'alignItems': 'center', 'marginBottom': '10px', 'marginTop': '0', 'paddingTop': '0'}),
-        # Navigation
-        html.Div([
-            html.Div(id='navigation-links', style={'flex': '1', 'display': 'flex', 'alignItems': 'center'})
-        ], style={'display': 'flex', 'alignItems': 'center', 'justifyContent': 'flex-start', 'marginBottom': '0'}),
-        html.Hr(style={'margin': '8px 0 10px 0', 'borderColor': '#dee2e6'}),
-        # Main content area - all pages are rendered here but hidden/shown by a callback
-        html.Div(id='page-content', children=[
-            # Page 1: Main Dashboard (mounted at '/')
-            html.Div(create_main_dashboard_layout(), id='page-1-layout', style={'display': 'block'}),
-            # Page 2: Region Analysis (mounted at '/page-2')
-            html.Div(create_page2_layout(), id='page-2-layout', style={'display': 'none'}),
-            # Page 3: SM Analysis (mounted at '/page-3')
-            html.Div(create_page3_layout(), id='page-3-layout', style={'display': 'none'}),
-            # Page 4: Year-wise Analysis (mounted at '/page-4')
-            html.Div(create_page4_layout(), id='page-4-layout', style={'display': 'none'}),
-            # Page 5: PO Analysis (mounted at '/page-5')
-            html.Div(create_page1_layout(), id='page-5-layout', style={'display': 'none'})
-        ])
-    ], className='dash-container'),
-    dcc.Interval(id='data-refresh-interval', interval=600*1000, n_intervals=0),  # every 600 seconds [10 minutes]
-    # hidden fast interval (enabled when data update flag is present)
-    dcc.Interval(id='fast-data-refresh-interval', interval=5*1000, n_intervals=0, disabled=True, max_intervals=-1),  # 5 seconds
-    # short-check interval used to detect the data_updated.txt flag quickly and enable fast polling
-    dcc.Interval(id='flag-check-interval', interval=3*1000, n_intervals=0)
-], style={
-    'backgroundColor': '#f5f5f5',
-    'minHeight': '100vh',
-    'margin': '0',
-    'padding': '0'
-})
-
-@app.callback(
-    Output('navigation-links', 'children'),
+                # Logo (left)
+                html.Img(src='/assets/gif1.gif', style={'height': '48px', 'marginRight': '18px', 'marginTop': '-8px'}),
+                # Titles and glassy line (right)
+                html.Div([
+                    html.H1(
+                        "SM Insight Board",
+                        style={
+                            'textAlign': 'center',
+                            'margin': '0',
+                            'marginTop': '0',
+                            'padding': '0',
+                            'paddingTop': '0',
+                            'color': '#2c3e50',
+                            'fontSize': '1.3rem',
+                            'fontWeight': 'bold',
+                            'fontFamily': 'Lora, serif',
+                        }
+                    ),
+                    html.Div(style={
+                        'height': '5px',
+                        'width': '100%',
+                        'background': 'linear-gradient(90deg, #1976d2 0%, #40bfff 100%)',
+                        'borderRadius': '6px',
+                        'boxShadow': '0 2px 12px 0 rgba(25, 118, 210, 0.25)',
+                        'backdropFilter': 'blur(2px)',
+                        'opacity': 0.85,
+                        'margin': '0.5rem 0 1.2rem 0',
+                    }),
+                ], style={'flexGrow': 1}),
+            ], style={'width': '100%', 'display': 'flex', 'alignItems': 'center', 'marginBottom': '10px', 'marginTop': '0', 'paddingTop': '0'}),
+            # Navigation
+            html.Div([
+                html.Div(id='navigation-links', children=html.Div(
+                    [dcc.Link(name, href=href, id=f'nav-link-{i}', className='nav-bubble') for i, (name, href) in enumerate(NAV_ITEMS)],
+                    style={'textAlign': 'left', 'marginBottom': '0', 'display': 'flex', 'justifyContent': 'flex-start', 'gap': '20px', 'paddingLeft': '8px'}
+                ), style={'flex': '1', 'display': 'flex', 'alignItems': 'center'}),
+                html.A("⬇ Export all charts (zip)", id='export-all-charts-zip', href=build_chart_zip_url('all'),
+                       style={'fontSize': '0.8rem', 'color': '#1976d2', 'marginRight': '12px', 'whiteSpace': 'nowrap'})
+            ], style={'display': 'flex', 'alignItems': 'center', 'justifyContent': 'flex-start', 'marginBottom': '0'}),
+            html.Hr(style={'margin': '8px 0 10px 0', 'borderColor': '#dee2e6'}),
+            # Main content area - all pages are rendered here but hidden/shown by a callback
+            html.Div(id='page-content', children=[
+                # Page 1: Main Dashboard (mounted at '/')
+                html.Div(create_main_dashboard_layout(), id='page-1-layout', style={'display': 'block'}),
+                # Page 2: Region Analysis (mounted at '/page-2')
+                html.Div(create_page2_layout(), id='page-2-layout', style={'display': 'none'}),
+                # Page 3: SM Analysis (mounted at '/page-3')
+                html.Div(create_page3_layout(), id='page-3-layout', style={'display': 'none'}),
+                # Page 4: Year-wise Analysis (mounted at '/page-4')
+                html.Div(create_page4_layout(), id='page-4-layout', style={'display': 'none'}),
+                # Page 5: PO Analysis (mounted at '/page-5')
+                html.Div(create_page1_layout(), id='page-5-layout', style={'display': 'none'})
+            ])
+        ], className='dash-container'),
+        # with DATA_PUSH the server pushes data changes into data-version-store, and the polling intervals stay off
+        dcc.Store(id='data-version-store', data=data_push_token()),
+        dcc.Store(id='data-push-url', data='/events/data-version' if DATA_PUSH else None),
+        dcc.Interval(id='data-refresh-interval', interval=600*1000, n_intervals=0, disabled=DATA_PUSH),  # every 600 seconds [10 minutes]
+        # hidden fast interval (enabled when data update flag is present)
+        dcc.Interval(id='fast-data-refresh-interval', interval=5*1000, n_intervals=0, disabled=True, max_intervals=-1),  # 5 seconds
+        # short-check interval used to detect the data_updated.txt flag quickly and enable fast polling
+        dcc.Interval(id='flag-check-interval', interval=3*1000, n_intervals=0, disabled=DATA_PUSH)
+    ], style={
+        'backgroundColor': '#f5f5f5',
+        'minHeight': '100vh',
+        'margin': '0',
+        'padding': '0'
+    })
+
+_layout_cache = {'version': None, 'layout': None}
+_layout_lock = threading.Lock()
+
+def serve_layout():
+    """Layout served with each page load, rebuilt only when the data version changes."""
+    version = current_model().version
+    with _layout_lock:
+        if _layout_cache['version'] != version or _layout_cache['layout'] is None:
+            _layout_cache['layout'] = build_layout()
+            _layout_cache['version'] = version
+        return _layout_cache['layout']
+
+# A function, so the import does not need the data: every page load gets the layout of the current model
+app.layout = serve_layout
+
+# Page switching and navigation highlighting only toggle CSS, so they run in the browser (assets/clientside.js)
+app.clientside_callback(
+    ClientsideFunction(namespace='dashboard', function_name='navigation'),
+    [Output(f'nav-link-{i}', 'style') for i in range(len(NAV_ITEMS))],
     Input('url', 'pathname')
 )
-def update_navigation(pathname):
-    nav_items = [
-        {'name': '🏠 Main Dashboard', 'href': '/', 'active': pathname == '/' or pathname is None},
-        {'name': '🌍 Region Analysis', 'href': '/page-2', 'active': pathname == '/page-2'},
-        {'name': '👥 SM Analysis', 'href': '/page-3', 'active': pathname == '/page-3'},
-        {'name': '📈 Year-wise Analysis', 'href': '/page-4', 'active': pathname == '/page-4'},
-        {'name': '📋 PO Analysis', 'href': '/page-5', 'active': pathname == '/page-5'}
-    ]
-    navigation_links = []
-    for i, item in enumerate(nav_items):
-        if item['active']:
-            link_style = {
-                'color': 'white',
-                'backgroundColor': '#1976d2',
-                'fontWeight': 'bold',
-                'textDecoration': 'none',
-                'padding': '6.5px 18px',
-                'borderRadius': '22px',
-                'border': 'none',
-                'boxShadow': '0 2px 8px rgba(25, 118, 210, 0.10)',
-                'fontSize': '0.98rem',
-            }
-        else:
-            link_style = {
-                'color': '#1976d2',
-                'backgroundColor': 'white',
-                'fontWeight': 'bold',
-                'textDecoration': 'none',
-                'padding': '6.5px 18px',
-                'borderRadius': '22px',
-                'border': '1.5px solid #1976d2',
-                'boxShadow': '0 2px 8px rgba(25, 118, 210, 0.05)',
-                'fontSize': '0.98rem',
-            }
-        navigation_links.append(
-            dcc.Link(item['name'], href=item['href'], style=link_style, className='nav-bubble')
-        )
-    return html.Div(
-        navigation_links,
-        style={
-            'textAlign': 'left',
-            'marginBottom': '0',
-            'display': 'flex',
-            'justifyContent': 'flex-start',
-            'gap': '20px',
-            'paddingLeft': '8px'
-        }
-    )
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='dashboard', function_name='display_page'),
     [Output('page-1-layout', 'style'),
      Output('page-2-layout', 'style'),
      Output('page-3-layout', 'style'),
@@ -916,270 +2178,874 @@ def update_navigation(pathname):
      Output('page-5-layout', 'style')],
     Input('url', 'pathname')
 )
-def display_page(pathname):
-    hide = {'display': 'none'}
-    show = {'display': 'block'}
-    
-    if pathname == '/page-2':
-        # Region Analysis
-        return hide, show, hide, hide, hide
-    elif pathname == '/page-3':
-        # SM Analysis
-        return hide, hide, show, hide, hide
-    elif pathname == '/page-4':
-        # Year-wise Analysis
-        return hide, hide, hide, show, hide
-    elif pathname == '/page-5':
-        # PO Analysis
-        return hide, hide, hide, hide, show
-    else:
-        # Default (root): Main Dashboard
-        return show, hide, hide, hide, hide
-        
-@app.callback(
-    Output('measure-store', 'data'),
-    [Input('orders-card', 'n_clicks'),
-     Input('revenues-card', 'n_clicks'),
-     Input('cash-card', 'n_clicks'),
-     Input('backlog-card', 'n_clicks'),
-     Input('pending-card', 'n_clicks')],
-    prevent_initial_call=True
+
+# Opens the EventSource that feeds data-version-store (no-op unless DATA_PUSH is on)
+app.clientside_callback(
+    ClientsideFunction(namespace='dashboard', function_name='connect_data_push'),
+    Input('data-push-url', 'data'),
+    State('data-version-store', 'data')
 )
-def update_selected_measure(orders_clicks, revenues_clicks, cash_clicks, backlog_clicks, pending_clicks):
-    ctx = callback_context
-    if not ctx.triggered:
-        return dash.no_update
-    
-    button_id = ctx.triggered[0]['prop_id'].split('.')[0]
-    
-    if button_id == 'orders-card':
-        return measure_cols["Order Amount"]
-    elif button_id == 'revenues-card':
-        return measure_cols["Revenue Amount"]
-    elif button_id == 'cash-card':
-        return measure_cols["Cash Amount"]
-    elif button_id == 'backlog-card':
-        return measure_cols["Backlog Amount"]
-    elif button_id == 'pending-card':
-        return measure_cols["Pending Amount"]
-    return dash.no_update
 
 @app.callback(
-    [Output("page1-cards", "children"),
-     Output("orders-card-value", "children"),
-     Output("revenues-card-value", "children"),
-     Output("cash-card-value", "children"),
-     Output("backlog-card-value", "children"),
-     Output("pending-card-value", "children"),
-     Output("po-count-value", "children"),
-     Output('orders-card', 'style'),
-     Output('revenues-card', 'style'),
-     Output('cash-card', 'style'),
-     Output('backlog-card', 'style'),
-     Output('pending-card', 'style'),
-     Output('po-count-card', 'style'),
-     Output("sm-summary-table", "children"),
-     Output('p1-chart1-store', 'data'),
-     Output('p1-chart2-store', 'data'),
-     Output('p1-filter-store', 'data')],
-    [Input('dropdown1', 'value'),
-     Input('dropdown2', 'value'),
-     Input('dropdown3', 'value'),
-     Input('dropdown4', 'value'),
-     Input('p1-region-filter', 'value'),
-     Input('year-filter1', 'value'),
-     Input('p1-period-filter', 'value'),
-     Input('measure-store', 'data'),
-     Input('data-refresh-interval', 'n_intervals'),
-     Input('fast-data-refresh-interval', 'n_intervals')]
+    Output('measure-cols-store', 'data'),
+    [Input('data-refresh-interval', 'n_intervals'),
+     Input('fast-data-refresh-interval', 'n_intervals'),
+     Input('data-version-store', 'data')]
 )
-def update_page_content(d1, d2, d3, d4, region, year_filter, p1_period, selected_measure, n_intervals, fast_n_intervals):
-    if is_data_updated():
-        orders, revenues, cash, merged, measure_cols = load_data()
-        try:
-            os.remove('data_updated.txt')
-        except Exception:
-            pass
+def sync_measure_cols(n_intervals, fast_n_intervals, data_token):
+    """Keep the browser's base measure -> column mapping in step with the loaded data."""
+    return current_model().measure_cols
+
+# ---------- Visible page gating ----------
+#
+# All pages stay mounted, but only the visible one is computed. A clientside callback per page turns
+# refresh ticks into a '{page}-refresh' token only while that page is shown, so hidden pages cost no
+# server request per tick. The server callbacks then skip when the page is hidden (e.g. its dropdowns
+# were synced from another page) or when it was already rendered for the same inputs and data version
+# ('{page}-render-key'); a hidden page is therefore computed lazily when it is first shown.
+
+PAGE_PATHS = {'main': '/', 'p2': '/page-2', 'p3': '/page-3', 'p4': '/page-4', 'p1': '/page-5'}
+
+def visible_page(pathname):
+    """Page key shown for a pathname (unknown paths show the Main Dashboard)."""
+    for page, path in PAGE_PATHS.items():
+        if path == pathname:
+            return page
+    return 'main'
+
+def page_render_key(page, pathname, last_key, inputs, token):
+    """
+    Render key of a page for its current inputs and data token; raises PreventUpdate if hidden or already rendered for them.
+
+    token is data_push_token() of the model, not its version counter: the counter is local to a worker, the sheet
+    hash is shared, so a tab whose next request lands on another worker still skips an unchanged render.
+    """
+    if visible_page(pathname) != page:
+        raise dash.exceptions.PreventUpdate
+    key = json.dumps([token] + list(inputs), default=str)
+    if key == last_key:
+        metric_inc('dashboard_cache_requests_total', {'cache': 'page_render', 'result': 'hit'})
+        raise dash.exceptions.PreventUpdate
+    metric_inc('dashboard_cache_requests_total', {'cache': 'page_render', 'result': 'miss'})
+    return key
+
+for _page, _path in PAGE_PATHS.items():
+    app.clientside_callback(
+        f"function(pathname, n, fastN, dataToken) {{ return window.dash_clientside.dashboard.page_refresh('{_path}', pathname); }}",
+        Output(f'{_page}-refresh', 'data'),
+        Input('url', 'pathname'),
+        Input('data-refresh-interval', 'n_intervals'),
+        Input('fast-data-refresh-interval', 'n_intervals'),
+        Input('data-version-store', 'data')
+    )
+
+# ---------- Shared aggregation pass ----------
+
+def with_period(df, period):
+    """Return df with a 'Period' column: the precomputed quarterly or monthly calendar key of each row."""
+    return df.assign(Period=df['PeriodQ' if period == 'Quarterly' else 'PeriodM'])
+
+def category_labels(values):
+    """Plain labels of a categorical Series: each row's category, missing where the row has none."""
+    codes = values.cat.codes.to_numpy()
+    labels = np.asarray(values.cat.categories, dtype=object).take(np.maximum(codes, 0))
+    labels[codes < 0] = np.nan
+    return pd.Series(labels, index=values.index)
+
+def aggregate_once(df, groupings, columns):
+    """
+    Single aggregation pass over the rows: group once at the union of all requested keys, then derive
+    the grand totals (KPI cards) and every requested grouping from that much smaller base aggregate.
+
+    groupings: iterable of key tuples. Returns (totals Series, {keys: DataFrame with keys + columns}).
+    """
+    grain = []
+    for keys in groupings:
+        for key in keys:
+            if key not in grain:
+                grain.append(key)
+    columns = list(dict.fromkeys(columns))
+    if grain:
+        # dropna=False keeps rows with missing keys so totals and coarser roll-ups still include them
+        base = df.groupby(grain, dropna=False, sort=False, observed=True)[columns].sum().reset_index()
+        # categorical keys (precomputed periods) are grouped on their codes and handed on as plain labels;
+        # a missing period stays missing (astype(str) would make it a 'nan' label before pandas 3)
+        for key in grain:
+            if isinstance(base[key].dtype, pd.CategoricalDtype):
+                base[key] = category_labels(base[key])
     else:
-        orders, revenues, cash, merged, measure_cols = load_data()
+        base = df[columns]
+    totals = base[columns].sum()
+    grouped = {}
+    for keys in groupings:
+        grouped[tuple(keys)] = base.groupby(list(keys), as_index=False, observed=True)[columns].sum()
+    return totals, grouped
+
+# ---------- Query engines ----------
+#
+# The filter + group-by + KPI step of every page request runs through aggregate_rows() on the engine named
+# by QUERY_ENGINE: 'pandas' (default), 'duckdb' or 'polars'. DuckDB and Polars are optional; the cached
+# model is handed to them once per data version through Arrow (zero-copy for the numeric columns) and
+# each request then filters and aggregates there using several cores. If the package is missing or a
+# query fails, the request falls back to pandas. test_query_engines.py checks that the engines agree.
+
+QUERY_ENGINE = os.environ.get('QUERY_ENGINE', 'pandas').strip().lower()
+
+_engine_models = {}  # engine -> (model frame, engine handle); replaced when the model changes
+_engine_lock = threading.Lock()
+
+def _engine_model(engine, df, register):
+    """Engine handle of the model frame df, registered once per model (i.e. per data version)."""
+    with _engine_lock:
+        cached = _engine_models.get(engine)
+        hit = cached is not None and cached[0] is df
+        metric_inc('dashboard_cache_requests_total', {'cache': f'{engine}_model', 'result': 'hit' if hit else 'miss'})
+        if not hit:
+            cached = (df, register(df))
+            _engine_models[engine] = cached
+        return cached[1]
+
+def _group_frame(frame, keys, columns):
+    """One grouping of an engine result in pandas roll-up form: no missing keys, sorted by the keys."""
+    frame = frame.dropna(subset=list(keys)).sort_values(list(keys), kind='stable')
+    frame[columns] = frame[columns].fillna(0.0)
+    return frame.reset_index(drop=True)
+
+# ---------- Distinct PO counts ----------
+#
+# Distinct counts cannot be summed across rows, so instead of hashing the PO REF strings of every request
+# (nunique), each model row carries a dense PO id, computed once per model frame. A filter's distinct count
+# is then the number of bits set in the union of its rows' PO bitmaps; per group, one bitmap row per group.
+# Model cells are at sheet-row grain, so the ids are kept per row rather than as bitmaps per cell. The ids of
+# a few frames are kept (the published model, one being built, the as-of models of the history exports), so
+# queries alternating between them do not factorize again.
+
+PO_BITMAP_MAX_CELLS = 1 << 24  # groups x POs above this count distinct (group, PO) pairs by sorting instead
+PO_IDS_CACHE_SIZE = AS_OF_CACHE_SIZE + 2
+
+_po_ids = {}  # id(frame) -> (frame, ids, number of POs), most recently used last
+_po_ids_lock = threading.Lock()
+
+def model_po_ids(df):
+    """Dense PO id of every row of the model frame df (-1 where PO REF is missing) and the number of distinct POs."""
+    key = id(df)
+    with _po_ids_lock:
+        cached = _po_ids.pop(key, None)
+        hit = cached is not None and cached[0] is df  # the frame is held, so its id is not reused meanwhile
+        if hit:
+            _po_ids[key] = cached
+    metric_inc('dashboard_cache_requests_total', {'cache': 'po_ids', 'result': 'hit' if hit else 'miss'})
+    if not hit:
+        codes, uniques = pd.factorize(df['PO REF'])
+        cached = (df, codes.astype(np.int32), len(uniques))
+        with _po_ids_lock:
+            _po_ids[key] = cached
+            while len(_po_ids) > PO_IDS_CACHE_SIZE:
+                _po_ids.pop(next(iter(_po_ids)))
+    return cached[1], cached[2]
+
+def distinct_po_count(ids, n_po):
+    """Exact number of distinct POs among ids: the bits set in the union of their one-PO bitmaps."""
+    bitmap = np.zeros(n_po + 1, dtype=bool)
+    bitmap[ids] = True  # a missing PO (-1) sets the spare last bit
+    return int(np.count_nonzero(bitmap[:n_po]))
+
+def distinct_po_counts(groups, ids, n_groups, n_po):
+    """Exact distinct POs of each group number 0..n_groups-1 (rows with group -1 or no PO are skipped)."""
+    keep = (groups >= 0) & (ids >= 0)
+    cells = groups[keep].astype(np.int64) * n_po + ids[keep]
+    if n_groups * n_po <= PO_BITMAP_MAX_CELLS:
+        bitmap = np.zeros(n_groups * n_po, dtype=bool)
+        bitmap[cells] = True
+        return np.count_nonzero(bitmap.reshape(n_groups, n_po), axis=1)
+    return np.bincount(np.unique(cells) // n_po, minlength=n_groups)
+
+def _aggregate_pandas(df, filters, groupings, columns, period, distinct):
+    # the filtered rows are the request's scratch copy, so only the columns the query reads are taken
+    periodic = any('Period' in keys for keys in groupings)
+    needed = list(dict.fromkeys([key for keys in groupings for key in keys if key != 'Period'] + columns
+                                + (['PeriodQ' if period == 'Quarterly' else 'PeriodM'] if periodic else [])))
+    mask = filter_mask(df, filters)
+    filtered = df.loc[mask, needed]
+    po_ids, n_po = model_po_ids(df)
+    po_ids = po_ids[mask]
+    source = with_period(filtered, period) if periodic else filtered
+    totals, grouped = aggregate_once(source, groupings, columns)
+    for keys in distinct:
+        # counts are computed per group number and joined back on the group labels, not by position
+        by_keys = source.groupby(list(keys), observed=True)
+        groups = by_keys.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+        counts = by_keys.size().reset_index()[list(keys)]
+        counts['PO Count'] = distinct_po_counts(groups, po_ids, len(counts), n_po)
+        for key in keys:
+            if isinstance(counts[key].dtype, pd.CategoricalDtype):
+                counts[key] = category_labels(counts[key])
+        frame = grouped[keys].merge(counts, on=list(keys), how='left')
+        frame['PO Count'] = frame['PO Count'].fillna(0).astype(np.int64)
+        grouped[keys] = frame
+    return {'rows': len(filtered), 'totals': totals, 'grouped': grouped, 'po_count': distinct_po_count(po_ids, n_po)}
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+def _duckdb_register(df):
+    import duckdb
+    import pyarrow as pa
+    return duckdb.connect(), pa.Table.from_pandas(df, preserve_index=False)
+
+def _duckdb_grouping_sets(cur, source, params, sets, columns, distinct):
+    """Run one GROUPING SETS query; returns {keys: frame of that set}. COUNT(DISTINCT) only when distinct."""
+    grain = list(dict.fromkeys(key for keys in sets for key in keys))
+    select = ([_quote(key) for key in grain]
+              + [f"SUM({_quote(col)}) AS {_quote(col)}" for col in columns]
+              + (['COUNT(DISTINCT "PO REF") AS "PO Count"', 'COUNT(*) AS "_rows"'] if distinct else [])
+              + ([f"GROUPING({', '.join(_quote(key) for key in grain)}) AS \"_set\""] if grain else ['0 AS "_set"']))
+    sql = (f"SELECT {', '.join(select)} FROM ({source}) GROUP BY GROUPING SETS "
+           f"({', '.join('(' + ', '.join(_quote(key) for key in keys) + ')' for keys in sets)})")
+    result = cur.execute(sql, params).df()
+    frames = {}
+    for keys in sets:
+        # GROUPING() sets a bit for every grain column that is rolled up, the first column being the highest bit
+        set_id = sum(1 << (len(grain) - 1 - i) for i, key in enumerate(grain) if key not in keys)
+        frames[keys] = result[result['_set'] == set_id]
+    return frames
+
+def _aggregate_duckdb(df, filters, groupings, columns, period, distinct):
+    con, table = _engine_model('duckdb', df, _duckdb_register)
+    where = applied_filters(df, filters)
+    period_col = 'PeriodQ' if period == 'Quarterly' else 'PeriodM'
+    source = (f"SELECT *, CAST({_quote(period_col)} AS VARCHAR) AS \"Period\" FROM model"
+              if any('Period' in keys for keys in groupings) else "SELECT * FROM model")
+    if where:
+        source += " WHERE " + " AND ".join(f"{_quote(col)} = ?" for col, _ in where)
+    params = [val for _, val in where]
+    cur = con.cursor()
     try:
-        filtered_df = merged.copy()
-        filters = [d1, d2, d3, d4]
-        for i, col in enumerate(dropdown_cols):
-            if filters[i]:
-                filtered_df = filtered_df[filtered_df[col] == filters[i]]
-        if year_filter:
-            filtered_df = filtered_df[filtered_df['Year'] == year_filter]
-        if region and region != "All":
-            filtered_df = filtered_df[filtered_df['Region'] == region]
-        if filtered_df.empty or selected_measure not in filtered_df.columns:
-            default = "N/A"
-            default_style = {'padding': '10px', 'textAlign': 'center', 'cursor': 'pointer', 'border': '1px solid #ddd', 'borderRadius': '5px', 'margin': '0 5px'}
-            empty_table = dash_table.DataTable(columns=[], data=[])
-            return [
-                [],  # charts
-                default, default, default, default, default, default,  # card values
-                default_style, default_style, default_style, default_style, default_style, default_style,  # card styles
-                [empty_table],  # sm-summary-table.children (should be a list)
-                None, None, None  # chart store data, filter store data
-            ]
-        total_orders = filtered_df[measure_cols["Order Amount"]].sum()
-        total_revenues = filtered_df[measure_cols["Revenue Amount"]].sum()
-        total_cash = filtered_df[measure_cols["Cash Amount"]].sum()
-        total_backlog = filtered_df[measure_cols["Backlog Amount"]].sum()
-        total_pending = filtered_df[measure_cols["Pending Amount"]].sum()
-        po_count = filtered_df['PO REF'].nunique()
-        
-        period_label = None
-        if p1_period:
-            if p1_period == 'Quarterly':
-                filtered_df['Period'] = filtered_df['Month'].dt.to_period('Q').astype(str)
-                period_label = 'Period'
-            elif p1_period == 'Monthly':
-                filtered_df['Period'] = filtered_df['Month'].dt.to_period('M').astype(str)
-                period_label = 'Period'
-
-        df1 = filtered_df.groupby(dropdown_cols[0], as_index=False)[selected_measure].sum().sort_values(selected_measure, ascending=False)
-        
+        cur.register('model', table)
+        # distinct counts are the expensive part, so only the totals and the PO count groupings get them
+        frames = _duckdb_grouping_sets(cur, source, params, [()] + list(distinct), columns, True)
+        plain = [keys for keys in groupings if keys not in distinct]
+        if plain:
+            frames.update(_duckdb_grouping_sets(cur, source, params, plain, columns, False))
+    finally:
+        cur.close()
+
+    total = frames[()].iloc[0]
+    grouped = {}
+    for keys in groupings:
+        frame = frames[keys][list(keys) + columns + (['PO Count'] if keys in distinct else [])]
+        grouped[keys] = _group_frame(frame, keys, columns)
+    return {'rows': int(total['_rows']), 'totals': total[columns].fillna(0.0).astype(float),
+            'grouped': grouped, 'po_count': int(total['PO Count'])}
+
+def _polars_register(df):
+    import polars as pl
+    return pl.from_pandas(df)
+
+def _aggregate_polars(df, filters, groupings, columns, period, distinct):
+    import polars as pl
+    model = _engine_model('polars', df, _polars_register)
+    lf = model.lazy()
+    where = applied_filters(df, filters)
+    if where:
+        lf = lf.filter(pl.all_horizontal([pl.col(col) == val for col, val in where]))
+    if any('Period' in keys for keys in groupings):
+        lf = lf.with_columns(pl.col('PeriodQ' if period == 'Quarterly' else 'PeriodM').cast(pl.Utf8).alias('Period'))
+    sums = [pl.col(col).sum() for col in columns]
+    po_count = pl.col('PO REF').drop_nulls().n_unique().alias('PO Count')
+    # every grouping is its own lazy query; collect_all runs them in parallel over one filtered scan
+    queries = [lf.select(sums + [po_count, pl.len().alias('_rows')])]
+    queries += [lf.group_by(list(keys)).agg(sums + ([po_count] if keys in distinct else [])) for keys in groupings]
+    results = pl.collect_all(queries)
+    total = results[0].to_pandas().iloc[0]
+    grouped = {tuple(keys): _group_frame(frame.to_pandas(), keys, columns) for keys, frame in zip(groupings, results[1:])}
+    return {'rows': int(total['_rows']), 'totals': total[columns].fillna(0.0).astype(float),
+            'grouped': grouped, 'po_count': int(total['PO Count'])}
+
+QUERY_ENGINES = {'pandas': _aggregate_pandas, 'duckdb': _aggregate_duckdb, 'polars': _aggregate_polars}
+
+# Aggregations running at once in this process; each holds its filtered rows, so with gthread workers this
+# bounds the request path's scratch memory (QUERY_CONCURRENCY=0: no limit)
+QUERY_CONCURRENCY = int(os.environ.get('QUERY_CONCURRENCY', 4))
+_query_slots = threading.BoundedSemaphore(QUERY_CONCURRENCY) if QUERY_CONCURRENCY > 0 else contextlib.nullcontext()
+
+def aggregate_rows(df, filters, groupings, columns, period=None, distinct=(), engine=None):
+    """
+    Filter the model and aggregate it in one pass on the configured engine.
+
+    groupings: key tuples ('Period' is the quarterly or monthly calendar key selected by period).
+    distinct: groupings that also get a 'PO Count' (distinct PO REF) column.
+    Returns {'rows', 'totals' (Series over columns), 'grouped' ({keys: DataFrame}), 'po_count'}.
+    """
+    groupings = [tuple(keys) for keys in groupings]
+    distinct = [tuple(keys) for keys in distinct]
+    columns = list(dict.fromkeys(columns))
+    engine = engine or QUERY_ENGINE
+    with _query_slots:
+        if engine != 'pandas':
+            try:
+                return QUERY_ENGINES[engine](df, filters, groupings, columns, period, distinct)
+            except Exception as e:
+                logger.warning(f"Query engine '{engine}' failed, using pandas: {e}")
+        return _aggregate_pandas(df, filters, groupings, columns, period, distinct)
+
+# ---------- Page specs: declarative description of the four analysis pages ----------
+#
+# Every analysis page has the same shape: filter dropdowns, a measure selected by clicking a KPI card,
+# six KPI cards, two charts and a summary table. A spec describes what differs between pages; one shared
+# execution path (run_page_query / render_page) turns the spec and the current inputs into a query plan,
+# computes each distinct group-by once and reuses it for the KPI cards, both charts and the summary table.
+#
+# Chart spec keys:
+#   name        file name of the chart data in the bulk export
+#   by          group-by keys; '{time}' is 'Period' when a period is selected, else 'Year'
+#   measures    'selected' (the measure chosen on the page, column kept as-is) or a list of base measures
+#   sort        sort descending by the selected measure
+#   top         breakdown chart: plot the BREAKDOWN_TOP_N largest values and an 'Other' bucket for the rest
+#               (the chart data and its exports keep every row)
+#   figure      'bar' | 'pie' | 'line' | 'measure_bars' (one bar per measure) | 'measure_bars_by' (bars per measure and color)
+#   when_period keys overriding the spec when a period is selected
+
+KPI_MEASURES = ["Order Amount", "Revenue Amount", "Cash Amount", "Backlog Amount", "Pending Amount"]
+
+PAGE_SPECS = {
+    # PO Analysis (mounted at '/page-5')
+    'p1': {
+        'filters': {'Customer': 'dropdown1', 'Project': 'dropdown2', 'SM': 'dropdown3', 'PO REF': 'dropdown4', 'Region': 'p1-region-filter', 'Year': 'year-filter1'},
+        'period': 'p1-period-filter',
+        'measure_store': 'measure-store',
+        'kpi_cards': {'Order Amount': ('orders-card', 'orders-card-value'), 'Revenue Amount': ('revenues-card', 'revenues-card-value'),
+                      'Cash Amount': ('cash-card', 'cash-card-value'), 'Backlog Amount': ('backlog-card', 'backlog-card-value'),
+                      'Pending Amount': ('pending-card', 'pending-card-value'), 'PO Count': ('po-count-card', 'po-count-value')},
+        'charts_container': 'page1-cards',
+        'table_container': 'sm-summary-table',
+        'charts': [
+            {'name': 'customer_breakdown', 'by': ['Customer'], 'measures': 'selected', 'sort': True, 'top': True,
+             'figure': 'bar', 'x': 'Customer', 'title': 'Customer Breakdown'},
+            {'name': 'project_breakdown', 'by': ['Project'], 'measures': 'selected', 'sort': True, 'top': True,
+             'figure': 'pie', 'names': 'Project', 'title': 'Project Breakdown',
+             'when_period': {'name': 'period_comparison', 'by': ['Period'], 'top': False, 'figure': 'bar', 'x': 'Period', 'title': '{measure} by {period}'}},
+        ],
+        'summary': {'by': ['SM', 'Project'], 'period_keys': True, 'columns': KPI_MEASURES, 'sort': 'Order Amount'},
+    },
+    # Region Analysis (mounted at '/page-2')
+    'p2': {
+        'filters': {'Customer': 'region-dropdown1', 'Project': 'region-dropdown2', 'SM': 'region-dropdown3', 'PO REF': 'region-dropdown4', 'Region': 'specific-region-filter', 'Year': 'region-year-filter'},
+        'period': 'p2-period-filter',
+        'measure_store': 'region-measure-store',
+        'kpi_cards': {'Order Amount': ('region-orders-card', 'region-orders-card-value'), 'Revenue Amount': ('region-revenue-card', 'region-revenue-card-value'),
+                      'Cash Amount': ('region-cash-card', 'region-cash-card-value'), 'Backlog Amount': ('region-backlog-card', 'region-backlog-card-value'),
+                      'Pending Amount': ('region-pending-card', 'region-pending-card-value'), 'PO Count': ('region-po-count-card', 'region-po-count-value')},
+        'charts_container': 'region-charts',
+        'table_container': 'region-summary-table',
+        'charts': [
+            {'name': 'top_customer', 'by': ['Customer'], 'measures': 'selected', 'sort': True, 'top': True,
+             'figure': 'bar', 'x': 'Customer', 'title': '{measure} by Customer'},
+            {'name': 'year_region_comparison', 'by': ['{time}', 'Region'], 'measures': ['Revenue Amount', 'Order Amount', 'Cash Amount'],
+             'figure': 'measure_bars_by', 'x': '{time}', 'color': 'Region', 'title': 'Revenue, Orders & Cash Comparison by {time} and Region',
+             'layout': {'xaxis_title': '{time}', 'yaxis_title': 'Amount (€)', 'legend_title': 'Region & Measure'},
+             'when_period': {'name': 'period_region_comparison'}},
+        ],
+        'summary': {'by': ['Customer', 'Region', 'Project'], 'columns': KPI_MEASURES,
+                    'sort': 'Revenue Amount', 'sort_selected': ['Order Amount', 'Revenue Amount', 'Backlog Amount']},
+    },
+    # SM Analysis (mounted at '/page-3')
+    'p3': {
+        'filters': {'Customer': 'sm-dropdown1', 'Project': 'sm-dropdown2', 'SM': 'sm-dropdown3', 'PO REF': 'sm-dropdown4', 'Region': 'sm-region-filter', 'Year': 'sm-year-filter'},
+        'period': 'p3-period-filter',
+        'measure_store': 'sm-measure-store',
+        'kpi_cards': {'Order Amount': ('sm-orders-card', 'sm-orders-card-value'), 'Revenue Amount': ('sm-revenue-card', 'sm-revenue-card-value'),
+                      'Cash Amount': ('sm-cash-card', 'sm-cash-card-value'), 'Backlog Amount': ('sm-backlog-card', 'sm-backlog-card-value'),
+                      'Pending Amount': ('sm-pending-card', 'sm-pending-card-value'), 'PO Count': ('sm-po-count-card', 'sm-po-count-value')},
+        'charts_container': 'sm-charts',
+        'table_container': 'sm-summary-table-page3',
+        'charts': [
+            {'name': 'top_sm', 'by': ['SM'], 'measures': 'selected', 'sort': True, 'top': True,
+             'figure': 'bar', 'x': 'SM', 'title': '{measure} by SM'},
+            {'name': 'sm_share', 'by': ['SM'], 'measures': 'selected', 'top': True,
+             'figure': 'pie', 'names': 'SM', 'hole': 0.3, 'title': '{measure} Distribution by SM',
+             'when_period': {'name': 'period_comparison', 'by': ['Period'], 'top': False, 'figure': 'bar', 'x': 'Period', 'title': '{measure} by {period}'}},
+        ],
+        'summary': {'by': ['SM', 'Customer', 'Project'], 'columns': KPI_MEASURES,
+                    'sort': 'Order Amount', 'sort_selected': ['Order Amount', 'Revenue Amount', 'Cash Amount']},
+    },
+    # Year-wise Analysis (mounted at '/page-4')
+    'p4': {
+        'filters': {'Customer': 'year-dropdown1', 'Project': 'year-dropdown2', 'SM': 'year-dropdown3', 'PO REF': 'year-dropdown4', 'Region': 'year-region-filter', 'Year': 'p4-year-filter'},
+        'period': 'p4-period-filter',
+        'measure_store': 'year-measure-store',
+        'kpi_cards': {'Order Amount': ('year-orders-card', 'year-orders-card-value'), 'Revenue Amount': ('year-revenue-card', 'year-revenue-card-value'),
+                      'Cash Amount': ('year-cash-card', 'year-cash-card-value'), 'Backlog Amount': ('year-backlog-card', 'year-backlog-card-value'),
+                      'Pending Amount': ('year-pending-card', 'year-pending-card-value'), 'PO Count': ('year-po-count-card', 'year-po-count-value')},
+        'charts_container': 'year-charts',
+        'table_container': 'year-summary-table',
+        'charts': [
+            {'name': 'year_trend_by_region', 'by': ['{time}', 'Region'], 'measures': 'selected',
+             'figure': 'line', 'x': '{time}', 'color': 'Region', 'title': 'Yearly Trend of {measure}',
+             'when_period': {'name': 'period_trend_by_region', 'title': 'Period Trend of {measure}'}},
+            {'name': 'year_comparison', 'by': ['{time}'], 'measures': ['Revenue Amount', 'Order Amount', 'Cash Amount'],
+             'figure': 'measure_bars', 'x': '{time}', 'title': 'Year-wise Comparison (Revenue, Order, Cash)', 'layout': {'legend_title_text': 'Measure'},
+             'when_period': {'name': 'period_comparison', 'title': 'Period Comparison (Revenue, Order, Cash)'}},
+        ],
+        'summary': {'by': ['Year', 'Region', 'SM'], 'columns': ['Revenue Amount', 'Order Amount', 'Cash Amount', 'Backlog Amount', 'Pending Amount'],
+                    'po_count': True, 'sort': ['Year', 'Revenue Amount'], 'ascending': [True, False]},
+    },
+}
+
+def _page_context(selected_measure, period, mc):
+    """Values substituted into the '{...}' placeholders of a page spec."""
+    return {
+        'measure': get_actual_column_name(selected_measure, mc),
+        'period': period,
+        'time': 'Period' if period else 'Year',
+    }
+
+def _resolve(value, ctx):
+    """Substitute spec placeholders in a string, a list of strings or a dict of strings."""
+    if isinstance(value, str):
+        return value.format(**ctx)
+    if isinstance(value, list):
+        return [_resolve(v, ctx) for v in value]
+    if isinstance(value, dict):
+        return {k: _resolve(v, ctx) for k, v in value.items()}
+    return value
+
+def _chart_spec(chart, ctx):
+    """Chart spec for the current inputs (period override applied, placeholders resolved)."""
+    spec = {**chart, **chart.get('when_period', {})} if ctx['period'] else dict(chart)
+    spec.pop('when_period', None)
+    for key in ('by', 'x', 'title', 'layout'):
+        if key in spec:
+            spec[key] = _resolve(spec[key], ctx)
+    return spec
+
+def _measure_columns(measures, ctx, mc):
+    """[(source column, output column)] for a chart/summary measures entry."""
+    if measures == 'selected':
+        return [(ctx['measure'], ctx['measure'])]
+    return [(mc[m], m) for m in measures]
+
+def compile_page_plan(spec, ctx, mc, with_summary=True):
+    """
+    Compile a page spec into a query plan: the charts and summary of the page, plus the distinct
+    group-bys (keys -> measure columns) that have to be computed to feed them.
+    """
+    charts = [_chart_spec(c, ctx) for c in spec['charts']]
+    summary = dict(spec['summary'])
+    summary['by'] = (['Period'] if ctx['period'] and summary.get('period_keys') else []) + summary['by']
+    summary['measure_columns'] = [(mc[m], m) for m in summary['columns']]
+    for chart in charts:
+        chart['measure_columns'] = _measure_columns(chart['measures'], ctx, mc)
+
+    groupings = {}
+    for item in charts + ([summary] if with_summary else []):
+        cols = groupings.setdefault(tuple(item['by']), {'columns': [], 'po_count': False})
+        for source, _ in item['measure_columns']:
+            if source not in cols['columns']:
+                cols['columns'].append(source)
+        cols['po_count'] = cols['po_count'] or bool(item.get('po_count'))
+    return {'charts': charts, 'summary': summary, 'groupings': groupings}
+
+def _select_grouping(grouped, item):
+    """Slice one chart/summary frame out of a shared group-by result."""
+    frame = grouped[item['by'] + [source for source, _ in item['measure_columns']] + (['PO Count'] if item.get('po_count') else [])]
+    frame = frame.rename(columns={source: name for source, name in item['measure_columns'] if source != name})
+    return frame.reset_index(drop=True)
+
+def run_page_query(spec, df, filters, mc, selected_measure, period, with_summary=True):
+    """
+    Execute a page plan on the model rows matching filters: KPI totals, the chart frames and the summary frame.
+    Each distinct group-by is computed once and shared by every chart/table that needs it.
+    """
+    ctx = _page_context(selected_measure, period, mc)
+    plan = compile_page_plan(spec, ctx, mc, with_summary)
+
+    # One pass over the rows feeds the KPI cards, both charts and the summary table
+    columns = [mc[m] for m in KPI_MEASURES] + [c for need in plan['groupings'].values() for c in need['columns']]
+    result = aggregate_rows(df, filters, list(plan['groupings']), columns, period,
+                            distinct=[keys for keys, need in plan['groupings'].items() if need['po_count']])
+    totals, grouped = result['totals'], result['grouped']
+    kpis = {m: totals[mc[m]] for m in KPI_MEASURES}
+    kpis['PO Count'] = result['po_count']
+
+    charts = []
+    for chart in plan['charts']:
         try:
-            if not is_valid_for_plot(df1, selected_measure):
-                fig1 = px.bar(title="No data available")
+            frame = _select_grouping(grouped[tuple(chart['by'])], chart)
+            if chart.get('sort'):
+                frame = frame.sort_values(ctx['measure'], ascending=False)
+        except Exception:
+            logger.exception(f"Failed to compute chart frame {chart['name']}")
+            frame = pd.DataFrame()
+        charts.append((chart, frame))
+
+    if not with_summary:
+        return {'ctx': ctx, 'rows': result['rows'], 'kpis': kpis, 'charts': charts, 'summary': None}
+    summary = plan['summary']
+    summary_df = _select_grouping(grouped[tuple(summary['by'])], summary)
+    sort_by = summary['sort']
+    selected_base = next((m for m in KPI_MEASURES if mc.get(m) == ctx['measure']), None)
+    if selected_base in summary.get('sort_selected', []):
+        sort_by = selected_base
+    summary_df = summary_df.sort_values(by=sort_by, ascending=summary.get('ascending', False))
+    return {'ctx': ctx, 'rows': result['rows'], 'kpis': kpis, 'charts': charts, 'summary': (summary, summary_df)}
+
+# ---------- Figures (plotly.graph_objects) ----------
+#
+# Charts are built from graph_objects traces laid out the way plotly.express would (one trace per color /
+# pattern group in order of appearance, the same color and pattern sequences and axis/legend titles), which
+# skips px's argument processing, the bulk of a page render. A figure is the dict dcc.Graph receives: the
+# traces, a go.Layout and the default template, without a go.Figure (whose construction and update_layout()
+# cost several times more than the traces). The default views are rendered ahead (see the figure cache below).
+
+FIGURE_COLORS = plotly.colors.qualitative.Plotly
+PATTERN_SHAPES = ['', '/', '\\', 'x', '-', '|', '+', '.']
+CHART_LAYOUT = {'title_font_size': 12, 'title_x': 0.5, 'margin': dict(t=40, b=20, l=20, r=20)}
+
+# Breakdown charts (spec 'top') plot this many categories plus an 'Other' bucket; 0 plots every category
+BREAKDOWN_TOP_N = int(os.environ.get('BREAKDOWN_TOP_N', 10))
+OTHER_LABEL = 'Other'
+
+def top_n_with_other(frame, label, measure, n=None):
+    """
+    The n rows of frame with the largest measure, in descending order (ties keep frame order, like
+    nlargest), followed by an OTHER_LABEL row summing the rest. Selects with a partial sort (np.partition)
+    instead of sorting every category.
+    """
+    n = BREAKDOWN_TOP_N if n is None else n
+    if n <= 0 or len(frame) <= n:
+        return frame
+    values = frame[measure].to_numpy(dtype=float)
+    kth = np.partition(values, len(values) - n)[len(values) - n]  # n-th largest value
+    keep = values > kth
+    keep[np.flatnonzero(values == kth)[:n - keep.sum()]] = True
+    rows = np.flatnonzero(keep)
+    rows = rows[np.argsort(-values[rows], kind='stable')]
+    other = pd.DataFrame({label: [OTHER_LABEL], measure: [values[~keep].sum()]})
+    return pd.concat([frame.iloc[rows][[label, measure]], other], ignore_index=True)
+
+@functools.lru_cache(maxsize=1)
+def _figure_template():
+    return plotly.io.templates[plotly.io.templates.default].to_plotly_json()
+
+def _figure(traces, layout):
+    """Figure dict of graph_objects traces and a layout (magic underscore keys allowed), with the default template."""
+    return {'data': [trace.to_plotly_json() for trace in traces],
+            'layout': {**go.Layout(**layout).to_plotly_json(), 'template': _figure_template()}}
+
+def _trace_groups(frame, keys):
+    """[(group values, rows)] of frame by keys, groups ordered like plotly.express (first appearance, first key first)."""
+    if not keys:
+        return [((), frame)]
+    orders = [{value: i for i, value in enumerate(pd.unique(frame[key]))} for key in keys]
+    groups = [(name if isinstance(name, tuple) else (name,), rows)
+              for name, rows in frame.groupby(keys, sort=False, dropna=False).indices.items()]
+    groups.sort(key=lambda group: [order[value] for order, value in zip(orders, group[0])])
+    return [(name, frame.iloc[rows]) for name, rows in groups]
+
+def _group_figure(frame, kind, x, y, color=None, pattern=None, colors=FIGURE_COLORS, title=None, layout=None):
+    """Bar ('bar') or line-with-markers ('line') figure of y over x, one trace per color/pattern group."""
+    keys = [key for key in (color, pattern) if key]
+    color_index = {value: i for i, value in enumerate(pd.unique(frame[color]))} if color else {}
+    pattern_index = {value: i for i, value in enumerate(pd.unique(frame[pattern]))} if pattern else {}
+    traces = []
+    for name, rows in _trace_groups(frame, keys):
+        values = dict(zip(keys, name))
+        trace_color = colors[color_index.get(values.get(color), 0) % len(colors)]
+        label = ', '.join(str(value) for value in name)
+        if kind == 'line':
+            traces.append(go.Scatter(x=rows[x].values, y=rows[y].values, name=label, legendgroup=label, showlegend=bool(keys),
+                                     mode='lines+markers', line={'color': trace_color}))
+        else:
+            shape = PATTERN_SHAPES[pattern_index[values[pattern]] % len(PATTERN_SHAPES)] if pattern else ''
+            traces.append(go.Bar(x=rows[x].values, y=rows[y].values, name=label, legendgroup=label, showlegend=bool(keys),
+                                 offsetgroup=label, marker={'color': trace_color, 'pattern': {'shape': shape}}))
+    figure_layout = {'title_text': title, 'xaxis_title_text': x, 'yaxis_title_text': y, 'legend_tracegroupgap': 0, **CHART_LAYOUT}
+    if keys:
+        figure_layout['legend_title_text'] = ', '.join(keys)
+    if kind == 'bar':
+        figure_layout['barmode'] = 'group'
+    return _figure(traces, {**figure_layout, **(layout or {})})
+
+def _wide_figure(frame, kind, x, columns, title=None, layout=None):
+    """One bar/line trace per column (plotly.express wide form: legend 'variable', y axis 'value')."""
+    melted = frame.melt(id_vars=[x], value_vars=columns, var_name='variable', value_name='value')
+    return _group_figure(melted, kind, x, 'value', color='variable', title=title, layout=layout)
+
+def _empty_figure(kind, title):
+    return _figure([], {'title_text': title, **CHART_LAYOUT})
+
+def build_chart_figure(chart, frame, ctx):
+    """Build the figure dict of one chart spec from its frame (with the repo's empty/invalid-data fallbacks)."""
+    kind = chart['figure']
+    measure = ctx['measure']
+    try:
+        if kind in ('measure_bars', 'measure_bars_by'):
+            candidate_cols = [name for _, name in chart['measure_columns']]
+            valid_cols = [c for c in candidate_cols if c in frame.columns and is_valid_for_plot(frame, c)]
+            if frame.empty or not valid_cols:
+                fig = _empty_figure(kind, "No data available")
             else:
-                # Clean data to ensure no invalid values
-                clean_df1 = df1.copy()
-                clean_df1[selected_measure] = pd.to_numeric(clean_df1[selected_measure], errors='coerce')
-                clean_df1 = clean_df1.dropna(subset=[selected_measure])
-                
-                if clean_df1.empty:
-                    fig1 = px.bar(title="No valid data available")
+                clean_df = frame.copy()
+                for col in valid_cols:
+                    clean_df[col] = pd.to_numeric(clean_df[col], errors='coerce')
+                clean_df = clean_df.dropna(subset=valid_cols, how='all')
+                if clean_df.empty:
+                    fig = _empty_figure(kind, "No valid data available")
+                elif kind == 'measure_bars':
+                    fig = _wide_figure(clean_df, 'bar', chart['x'], valid_cols, title=chart['title'], layout=chart.get('layout'))
                 else:
-                    fig1 = px.bar(
-                        clean_df1, 
-                        x=dropdown_cols[0], 
-                        y=selected_measure, 
-                        title=f"{dropdown_cols[0]} Breakdown"
-                    )
-        except Exception as e:
-            print(f"Error creating chart 1: {e}")
-            fig1 = px.bar(title="Error loading chart")
-        
-        fig1.update_layout(title_font_size=12, title_x=0.5, margin=dict(t=40, b=20, l=20, r=20))
-        
-        # Second chart: if Period selected, show Period comparison; else keep existing dimension breakdown
-        if period_label:
-            df2 = filtered_df.groupby('Period', as_index=False)[selected_measure].sum().sort_values(selected_measure, ascending=False)
+                    melted_df = clean_df.melt(id_vars=chart['by'], value_vars=valid_cols, var_name='Measure', value_name='Amount')
+                    fig = _group_figure(melted_df, 'bar', chart['x'], 'Amount', color=chart['color'], pattern='Measure',
+                                        colors=plotly.colors.qualitative.Set3, title=chart['title'], layout=chart.get('layout'))
+        elif not is_valid_for_plot(frame, measure):
+            fig = _empty_figure(kind, "No data available")
         else:
-            df2 = filtered_df.groupby(dropdown_cols[1], as_index=False)[selected_measure].sum().sort_values(selected_measure, ascending=False)
-        
-        try:
-            if not is_valid_for_plot(df2, selected_measure):
-                fig2 = px.pie(title="No data available") if not period_label else px.bar(title="No data available")
+            clean_df = frame.copy()
+            clean_df[measure] = pd.to_numeric(clean_df[measure], errors='coerce')
+            clean_df = clean_df.dropna(subset=[measure])
+            if chart.get('top'):
+                clean_df = top_n_with_other(clean_df, chart['names'] if kind == 'pie' else chart['x'], measure)
+            if clean_df.empty:
+                fig = _empty_figure(kind, "No valid data available")
+            elif kind == 'pie':
+                fig = _figure([go.Pie(labels=clean_df[chart['names']].values, values=clean_df[measure].values, hole=chart.get('hole'))],
+                              {'title_text': chart['title'], 'legend_tracegroupgap': 0, **CHART_LAYOUT})
             else:
-                clean_df2 = df2.copy()
-                clean_df2[selected_measure] = pd.to_numeric(clean_df2[selected_measure], errors='coerce')
-                clean_df2 = clean_df2.dropna(subset=[selected_measure])
-                
-                if clean_df2.empty:
-                    fig2 = px.pie(title="No valid data available") if not period_label else px.bar(title="No valid data available")
-                else:
-                    if period_label:
-                        fig2 = px.bar(
-                            clean_df2,
-                            x='Period',
-                            y=selected_measure,
-                            title=f"{selected_measure} by {p1_period}"
-                        )
-                    else:
-                        fig2 = px.pie(
-                            clean_df2, 
-                            names=dropdown_cols[1], 
-                            values=selected_measure, 
-                            title=f"{dropdown_cols[1]} Breakdown"
-                        )
-        except Exception as e:
-            print(f"Error creating chart 2: {e}")
-            fig2 = px.pie(title="Error loading chart")
-        
-        fig2.update_layout(title_font_size=12, title_x=0.5, margin=dict(t=40, b=20, l=20, r=20))
+                fig = _group_figure(clean_df, kind, chart['x'], measure, color=chart.get('color'), title=chart['title'])
+    except Exception as e:
+        logger.error(f"Error creating chart {chart['name']}: {e}")
+        fig = _empty_figure(kind, "Error loading chart")
+    return fig
+
+# ---------- Figure cache ----------
+#
+# Serialized figures keyed by (data version, page, chart, inputs), least recently used evicted past
+# FIGURE_CACHE_SIZE (0 disables it). Each published model (a model registry subscriber) has the default view
+# of every page (filters as the layout starts, no period) rendered for each measure, so the first page loads
+# after a refresh only run their query and table.
+
+FIGURE_CACHE_SIZE = int(os.environ.get('FIGURE_CACHE_SIZE', 128))
+_figure_cache = {}
+_figure_cache_lock = threading.Lock()
+
+def figure_json(fig):
+    """Plain JSON dict of a figure, as dcc.Graph sends it; serialized once instead of on every response."""
+    return json.loads(plotly.io.to_json(fig, validate=False))
+
+def figure_cache_key(version, page, chart, inputs):
+    return (version, page, chart, json.dumps(inputs, default=str))
+
+def cached_figure(key, build):
+    """Serialized figure for key; build() makes it on a miss."""
+    if FIGURE_CACHE_SIZE <= 0:
+        return figure_json(build())
+    with _figure_cache_lock:
+        fig = _figure_cache.pop(key, None)
+        if fig is not None:
+            _figure_cache[key] = fig  # most recently used last
+    metric_inc('dashboard_cache_requests_total', {'cache': 'figure', 'result': 'hit' if fig is not None else 'miss'})
+    if fig is None:
+        fig = figure_json(build())
+        with _figure_cache_lock:
+            _figure_cache[key] = fig
+            while len(_figure_cache) > FIGURE_CACHE_SIZE:
+                _figure_cache.pop(next(iter(_figure_cache)))
+    return fig
+
+def default_filter_values(spec):
+    """Filter values a page starts with: every dropdown empty, Region 'All'."""
+    return ['All' if column == 'Region' else None for column in spec['filters']]
+
+@subscribe_model
+def prerender_default_views(model):
+    """Cache the figures of every page's default view for each measure (and drop those of older versions)."""
+    version, merged, mc = model.version, model.merged, model.measure_cols
+    if FIGURE_CACHE_SIZE <= 0 or merged.empty:
+        return
+    with _figure_cache_lock:
+        for key in [key for key in _figure_cache if key[0] != version]:
+            del _figure_cache[key]
+    for page, spec in PAGE_SPECS.items():
+        filter_values = default_filter_values(spec)
+        filters = dict(zip(spec['filters'], filter_values))
+        for base in KPI_MEASURES:
+            result = run_page_query(spec, merged, filters, mc, mc[base], None, with_summary=False)
+            ctx = result['ctx']
+            for chart, frame in result['charts']:
+                cached_figure(figure_cache_key(version, page, chart['name'], [filter_values, None, ctx['measure']]),
+                              lambda chart=chart, frame=frame: build_chart_figure(chart, frame, ctx))
+    result = run_main_query(merged, {'Year': None, 'Region': None, 'SM': None}, mc, None, None, None)
+    if result['rows']:
+        cached_figure(figure_cache_key(version, 'main', 'performance', [None] * 4), lambda: main_performance_figure(result, None))
+        cached_figure(figure_cache_key(version, 'main', 'trend', [None] * 4), lambda: main_trend_figure(result, None))
+
+def build_summary_table(summary, summary_df):
+    """DataTable for a page summary frame."""
+    columns = [{"name": key, "id": key} for key in summary['by']]
+    columns += [{"name": m, "id": m, "type": "numeric", "format": {"specifier": ",.0f"}} for m in summary['columns']]
+    if summary.get('po_count'):
+        columns.append({"name": "PO Count", "id": "PO Count", "type": "numeric", "format": {"specifier": ",.0f"}})
+    return dash_table.DataTable(
+        columns=columns,
+        data=summary_df.to_dict("records"),
+        style_table={'overflowX': 'auto', 'borderRadius': '8px', 'border': '1px solid #1976d2'},
+        style_cell={'textAlign': 'center', 'padding': '8px'},
+        style_header={'fontWeight': 'bold', 'backgroundColor': '#1976d2', 'color': 'white', 'border': 'none'},
+        style_data_conditional=[{'if': {'row_index': 'even'}, 'backgroundColor': '#e3f2fd'}],
+        export_format='csv',
+    )
+
+def kpi_numbers(kpis, bases):
+    """JSON-safe raw KPI numbers for the clientside cards (PO Count as int, amounts as float)."""
+    return {base: int(kpis[base]) if base == 'PO Count' else float(kpis[base]) for base in bases}
+
+def _page_fallback(spec, key=None):
+    """Outputs shown when there is no data for the current filters (or, with no render key, when the page failed)."""
+    empty_table = dash_table.DataTable(columns=[], data=[])
+    return [None, [], [html.Div([empty_table], style={'marginLeft': '2cm', 'marginRight': '2cm'})], None, None, None, key]
+
+def render_page(page, filter_values, period, selected_measure, key=None, model=None):
+    """Shared execution path of the analysis pages: load, filter, run the page plan and build the outputs."""
+    spec = PAGE_SPECS[page]
+    model = model or current_model()
+    version, merged, measure_cols = model.version, model.merged, model.measure_cols
+    try:
+        filters = dict(zip(spec['filters'], filter_values))
+        actual_measure = get_actual_column_name(selected_measure, measure_cols)
+        if merged.empty or actual_measure not in merged.columns:
+            return _page_fallback(spec, key)
+
+        result = run_page_query(spec, merged, filters, measure_cols, selected_measure, period)
+        if not result['rows']:
+            return _page_fallback(spec, key)
+        ctx = result['ctx']
+
+        # Raw numbers only; the browser formats the cards and highlights the selected one
+        kpis = kpi_numbers(result['kpis'], spec['kpi_cards'])
+
+        inputs = [list(filter_values), period, ctx['measure']]
+        figures = [cached_figure(figure_cache_key(version, page, chart['name'], inputs),
+                                 lambda chart=chart, frame=frame: build_chart_figure(chart, frame, ctx))
+                   for chart, frame in result['charts']]
         charts = html.Div([
-            create_chart_card(fig1, "p1-chart1"), 
-            create_chart_card(fig2, "p1-chart2")
+            create_chart_card(fig, f"{page}-chart{i + 1}") for i, fig in enumerate(figures)
         ], style={'display': 'flex', 'justifyContent': 'center', 'gap': '50px'})
-        default_style = {'padding': '10px', 'textAlign': 'center', 'cursor': 'pointer', 'border': '1px solid #ddd', 'borderRadius': '5px', 'margin': '0 5px'}
-        active_style = default_style.copy()
-        active_style['border'] = '2px solid #007BFF'
-        active_style['boxShadow'] = '0 0 5px #007BFF'
-        orders_style = active_style if selected_measure == measure_cols["Order Amount"] else default_style
-        revenues_style = active_style if selected_measure == measure_cols["Revenue Amount"] else default_style
-        cash_style = active_style if selected_measure == measure_cols["Cash Amount"] else default_style
-        backlog_style = active_style if selected_measure == "Backlog Amount" else default_style
-        pending_style = active_style if selected_measure == "Pending Amount" else default_style
-        po_count_style = default_style
-        formatted_orders = f"€{total_orders:,.0f}"
-        formatted_revenues = f"€{total_revenues:,.0f}"
-        formatted_cash = f"€{total_cash:,.0f}"
-        formatted_backlog = f"€{total_backlog:,.0f}"
-        formatted_pending = f"€{total_pending:,.0f}"
-        formatted_po_count = f"{po_count:,}"
-        group_keys = ["SM", "Project"]
-        if period_label:
-            group_keys = ['Period'] + group_keys
-        summary_df = filtered_df.groupby(group_keys, as_index=False).agg({
-            measure_cols["Order Amount"]: "sum",
-            measure_cols["Revenue Amount"]: "sum",
-            measure_cols["Cash Amount"]: "sum",
-            "Backlog Amount": "sum",
-            "Pending Amount": "sum"
-        }).rename(columns={
-            measure_cols["Order Amount"]: "Order Amount",
-            measure_cols["Revenue Amount"]: "Revenue Amount",
-            measure_cols["Cash Amount"]: "Cash Amount",
-            "Backlog Amount": "Backlog Amount",
-            "Pending Amount": "Pending Amount"
-        }).sort_values(by="Order Amount", ascending=False)
-        table_data = summary_df.to_dict("records")
-        table_columns = []
-        if period_label:
-            table_columns.append({"name": "Period", "id": "Period"})
-        table_columns.extend([
-            {"name": "SM", "id": "SM"},
-            {"name": "Project", "id": "Project"},
-            {"name": "Order Amount", "id": "Order Amount", "type": "numeric", "format": {"specifier": ",.0f"}},
-            {"name": "Revenue Amount", "id": "Revenue Amount", "type": "numeric", "format": {"specifier": ",.0f"}},
-            {"name": "Cash Amount", "id": "Cash Amount", "type": "numeric", "format": {"specifier": ",.0f"}},
-            {"name": "Backlog Amount", "id": "Backlog Amount", "type": "numeric", "format": {"specifier": ",.0f"}},
-            {"name": "Pending Amount", "id": "Pending Amount", "type": "numeric", "format": {"specifier": ",.0f"}},
-        ])
-        table = dash_table.DataTable(
-            columns=table_columns,
-            data=table_data,
-            style_table={'overflowX': 'auto', 'borderRadius': '8px', 'border': '1px solid #1976d2'},
-            style_cell={'textAlign': 'center', 'padding': '8px'},
-            style_header={'fontWeight': 'bold', 'backgroundColor': '#1976d2', 'color': 'white', 'border': 'none'},
-            style_data_conditional=[{'if': {'row_index': 'even'}, 'backgroundColor': '#e3f2fd'}],
-            export_format='csv',
-        )
-        chart1_data = {'df': df1.to_json(orient='split'), 'title': fig1.layout.title.text}
-        chart2_data = {'df': df2.to_json(orient='split'), 'title': fig2.layout.title.text}
-        active_filters = {dropdown_cols[i]: filters[i] for i, f in enumerate(filters) if f}
-        if region and region != "All":
-            active_filters['Region'] = region
-        if year_filter:
-            active_filters['Year'] = year_filter
-        if p1_period:
-            active_filters['Period'] = p1_period
-        return charts, formatted_orders, formatted_revenues, formatted_cash, formatted_backlog, formatted_pending, formatted_po_count, orders_style, revenues_style, cash_style, backlog_style, pending_style, po_count_style, [html.Div([table], style={'marginLeft': '2cm', 'marginRight': '2cm'})], json.dumps(chart1_data), json.dumps(chart2_data), json.dumps(active_filters)
+        table = build_summary_table(*result['summary'])
+        chart_stores = [json.dumps({'df': frame.to_json(orient='split'), 'title': fig['layout']['title']['text']})
+                        for (_, frame), fig in zip(result['charts'], figures)]
+
+        active_filters = {col: val for col, val in filters.items() if col in dropdown_cols and val}
+        if filters.get('Region') and filters['Region'] != "All":
+            active_filters['Region'] = filters['Region']
+        if filters.get('Year'):
+            active_filters['Year'] = filters['Year']
+        if period:
+            active_filters['Period'] = period
+        return ([kpis, charts, [html.Div([table], style={'marginLeft': '2cm', 'marginRight': '2cm'})]]
+                + chart_stores + [json.dumps(active_filters), key])
     except Exception as e:
-        print(f"Exception in update_page_content: {e}")
-        traceback.print_exc()
-        default = "N/A"
-        default_style = {'padding': '10px', 'textAlign': 'center', 'cursor': 'pointer', 'border': '1px solid #ddd', 'borderRadius': '5px', 'margin': '0 5px'}
-        empty_table = dash_table.DataTable(columns=[], data=[])
-        return [
-            [], default, default, default, default, default, default,
-            default_style, default_style, default_style, default_style, default_style, default_style,
-            [html.Div([empty_table], style={'marginLeft': '2cm', 'marginRight': '2cm'})], None, None, None
-        ]
+        logger.exception(f"Exception in render_page({page}): {e}")
+        return _page_fallback(spec)  # no render key, so the next refresh retries
+
+def register_page_callback(page):
+    """Register the content callback of an analysis page from its spec."""
+    spec = PAGE_SPECS[page]
+    outputs = [Output(f"{page}-kpi-store", 'data'),
+               Output(spec['charts_container'], 'children'),
+               Output(spec['table_container'], 'children'),
+               Output(f"{page}-chart1-store", 'data'),
+               Output(f"{page}-chart2-store", 'data'),
+               Output(f"{page}-filter-store", 'data'),
+               Output(f"{page}-render-key", 'data')]
+    inputs = ([Input(dropdown_id, 'value') for dropdown_id in spec['filters'].values()]
+              + [Input(spec['period'], 'value'),
+                 Input(spec['measure_store'], 'data'),
+                 Input(f"{page}-refresh", 'data')])
+
+    # No initial call: the visible page is first rendered from its refresh token
+    @app.callback(outputs, inputs, State('url', 'pathname'), State(f"{page}-render-key", 'data'), prevent_initial_call=True)
+    def update_page(*args):
+        n_filters = len(spec['filters'])
+        filter_values, (period, selected_measure) = args[:n_filters], args[n_filters:n_filters + 2]
+        pathname, last_key = args[-2:]
+        model = current_model()
+        key = page_render_key(page, pathname, last_key, list(filter_values) + [period, selected_measure], data_push_token(model))
+        return render_page(page, filter_values, period, selected_measure, key, model)
+    return update_page
+
+def register_kpi_card_callbacks(page):
+    """Clientside callbacks of a page's KPI cards: measure selection on click, card highlighting and value formatting."""
+    spec = PAGE_SPECS[page]
+    cards = spec['kpi_cards']
+    app.clientside_callback(
+        ClientsideFunction(namespace='dashboard', function_name='select_measure'),
+        Output(spec['measure_store'], 'data'),
+        [Input(cards[base][0], 'n_clicks') for base in KPI_MEASURES],
+        State('measure-cols-store', 'data'),
+        prevent_initial_call=True
+    )
+    app.clientside_callback(
+        ClientsideFunction(namespace='dashboard', function_name='card_styles'),
+        [Output(card_id, 'style') for card_id, _ in cards.values()],
+        Input(spec['measure_store'], 'data'),
+        Input('measure-cols-store', 'data')
+    )
+    app.clientside_callback(
+        ClientsideFunction(namespace='dashboard', function_name='format_kpis'),
+        [Output(value_id, 'children') for _, value_id in cards.values()],
+        Input(f"{page}-kpi-store", 'data')
+    )
+
+for _page in PAGE_SPECS:
+    register_kpi_card_callbacks(_page)
+
+# Callbacks keep their historical names; arguments are (customer, project, sm, po_ref, region, year, period, measure,
+# refresh token, pathname, last render key)
+update_page_content = register_page_callback('p1')
+update_region_analysis = register_page_callback('p2')
+update_sm_analysis = register_page_callback('p3')
+update_year_analysis = register_page_callback('p4')
+
+# ---------- Main dashboard chart frames (shared by its callback and the bulk chart export) ----------
+
+def run_main_query(df, filters, mc, region_value, sm_value, period):
+    """
+    Main Dashboard aggregates from a single pass over the rows matching filters: KPI totals, measures by
+    period and Region (or SM), the period trend and, for quarterly views, the per-year quarter sums of the pivot table.
+    """
+    group_col = 'Region' if region_value or not sm_value else 'SM'
+    groupings = [('Period', group_col)]
+    if period == 'Quarterly':
+        groupings.append(('Year', 'Quarter'))
+    result = aggregate_rows(df, filters, groupings, [mc[m] for m in KPI_MEASURES], period)
+    totals, grouped = result['totals'], result['grouped']
+    renames = {mc[m]: m for m in KPI_MEASURES}
+    order = ['Revenue Amount', 'Order Amount', 'Cash Amount', 'Backlog Amount', 'Pending Amount']
+    agg = grouped[('Period', group_col)].rename(columns=renames)[['Period', group_col] + order]
+    trend = agg.groupby('Period', as_index=False).agg({'Revenue Amount':'sum','Order Amount':'sum','Cash Amount':'sum'})
+    kpis = {m: totals[mc[m]] for m in KPI_MEASURES}
+    kpis['PO Count'] = result['po_count']
+    quarters = grouped[('Year', 'Quarter')].rename(columns=renames) if period == 'Quarterly' else None
+    return {'group_col': group_col, 'rows': result['rows'], 'kpis': kpis, 'agg': agg, 'trend': trend, 'quarters': quarters}
+
+def main_performance_figure(result, period):
+    """Main Dashboard chart 1: grouped bars of the three measures by period, patterned by Region (or SM)."""
+    group_col = result['group_col']
+    melted = result['agg'].melt(id_vars=['Period', group_col], value_vars=['Revenue Amount', 'Order Amount', 'Cash Amount'],
+                                var_name='Measure', value_name='Amount')
+    return _group_figure(melted, 'bar', 'Period', 'Amount', color='Measure', pattern=group_col,
+                         title=f"{period or 'Period'} Performance by {group_col}")
+
+def main_trend_figure(result, period):
+    """Main Dashboard chart 2: line trend of the three measures by period."""
+    return _wide_figure(result['trend'], 'line', 'Period', ['Revenue Amount', 'Order Amount', 'Cash Amount'],
+                        title=f"{period or 'Period'} Trends")
+
+def _main_chart_frames(df, filters, mc, region_value, sm_value, period):
+    """Main Dashboard: measures by period and Region (or SM), plus the period trend."""
+    result = run_main_query(df, filters, mc, region_value, sm_value, period)
+    return [(f"performance_by_{result['group_col'].lower()}", result['agg']), ('trends', result['trend'])]
 
 def _create_export_data(n_clicks, chart_json, filter_json):
     """Helper function to create CSV data for download."""
@@ -1193,14 +3059,7 @@ def _create_export_data(n_clicks, chart_json, filter_json):
     output = io.StringIO()
     
     if filter_json:
-        filters = json.loads(filter_json)
-        if filters:
-            output.write('="Applied Filters:"\n')
-            for key, value in filters.items():
-                s_key = str(key).replace('"', '""')
-                s_value = str(value).replace('"', '""')
-                output.write(f'=" - {s_key}: {s_value}"\n')
-            output.write('\n')
+        output.write(_filter_header_csv(json.loads(filter_json)))
 
     s_title = str(title).replace('"', '""')
     output.write(f'="Chart Data: {s_title}"\n\n')
@@ -1211,6 +3070,316 @@ def _create_export_data(n_clicks, chart_json, filter_json):
     
     return dict(content=output.getvalue(), type="text/csv", filename=filename)
 
+def _filter_header_lines(filters):
+    """Plain-text lines describing the applied filters ("Applied Filters:", " - key: value", ...)."""
+    if not filters:
+        return []
+    return ["Applied Filters:"] + [f" - {key}: {value}" for key, value in filters.items()]
+
+def _filter_header_csv(filters):
+    """Applied-filters header for CSV exports, written as ="..." cells so spreadsheets keep them as text."""
+    lines = _filter_header_lines(filters)
+    if not lines:
+        return ''
+    return ''.join('="' + line.replace('"', '""') + '"\n' for line in lines) + '\n'
+
+def _iter_filtered_chunks(df, mask, chunk_rows=None):
+    """Yield the selected rows of df in chunks of at most chunk_rows rows."""
+    chunk_rows = chunk_rows or EXPORT_CHUNK_ROWS
+    positions = np.flatnonzero(mask)
+    # the calendar columns are derived model keys, not source data
+    columns = [i for i, col in enumerate(df.columns) if col not in CALENDAR_COLS]
+    for start in range(0, len(positions), chunk_rows):
+        yield df.iloc[positions[start:start + chunk_rows], columns]
+
+def _stream_file(path, block_size=64 * 1024):
+    """Yield a file in blocks and delete it once fully sent (or the client disconnects)."""
+    try:
+        with open(path, 'rb') as fh:
+            while True:
+                block = fh.read(block_size)
+                if not block:
+                    break
+                yield block
+    finally:
+        try:
+            os.remove(path)
+        except Exception:
+            pass
+
+def _stream_rows_csv(df, mask, filters):
+    yield _filter_header_csv(filters)
+    header = True
+    for chunk in _iter_filtered_chunks(df, mask):
+        yield chunk.to_csv(index=False, header=header)
+        header = False
+    if header:
+        # No matching rows: still emit the column header
+        yield df.iloc[0:0].to_csv(index=False)
+
+def _xlsx_cell(value):
+    """Convert a pandas value into something openpyxl can write."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def _write_rows_xlsx(df, mask, filters, path):
+    from openpyxl import Workbook
+    # write-only mode streams rows to disk instead of keeping the whole sheet in memory
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Filtered Data")
+    lines = _filter_header_lines(filters)
+    for line in lines:
+        ws.append([line])
+    if lines:
+        ws.append([])
+    ws.append([str(c) for c in df.columns if c not in CALENDAR_COLS])
+    for chunk in _iter_filtered_chunks(df, mask):
+        for row in chunk.itertuples(index=False, name=None):
+            ws.append([_xlsx_cell(v) for v in row])
+    wb.save(path)
+
+def _write_rows_parquet(df, mask, filters, path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    writer = None
+    schema = None
+    try:
+        for chunk in _iter_filtered_chunks(df, mask):
+            if schema is None:
+                schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                # Columns that are entirely empty in the first chunk cannot be typed from it
+                schema = pa.schema([pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f for f in schema])
+                schema = schema.with_metadata({**(schema.metadata or {}), b'applied_filters': json.dumps(filters or {}, default=str).encode('utf-8')})
+                writer = pq.ParquetWriter(path, schema)
+            # Each chunk becomes one row group
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        if writer is None:
+            schema = pa.Schema.from_pandas(df.iloc[0:0], preserve_index=False)
+            schema = schema.with_metadata({**(schema.metadata or {}), b'applied_filters': json.dumps(filters or {}, default=str).encode('utf-8')})
+            pq.write_table(pa.Table.from_pandas(df.iloc[0:0], schema=schema, preserve_index=False), path)
+    finally:
+        if writer is not None:
+            writer.close()
+
+ROW_EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+@server.route("/export/rows")
+def export_filtered_rows():
+    """
+    Stream the row-level merged data matching the page filters.
+    Query params: format=csv|xlsx|parquet, filters=<JSON of the page filter store>, as_of=<stored sheet version> (optional).
+    """
+    fmt = (request.args.get('format') or 'csv').lower()
+    if fmt not in ROW_EXPORT_FORMATS:
+        return f"Unsupported format '{fmt}'", 400
+    try:
+        filters = json.loads(request.args.get('filters') or '{}') or {}
+        if not isinstance(filters, dict):
+            raise ValueError("filters must be a JSON object")
+    except ValueError as e:
+        return f"Invalid filters: {e}", 400
+
+    try:
+        model = request_model()
+    except ValueError:
+        return "Invalid as_of version", 400
+    if model is None:
+        return f"Unknown sheet version {request.args.get('as_of')}", 404
+    merged_df = model.merged
+    if merged_df.empty:
+        return "No data available", 503
+    mask = filter_mask(merged_df, filters)
+
+    mimetype, ext = ROW_EXPORT_FORMATS[fmt]
+    headers = {'Content-Disposition': f'attachment; filename="filtered_data.{ext}"'}
+    if fmt == 'csv':
+        return Response(_stream_rows_csv(merged_df, mask, filters), mimetype=mimetype, headers=headers)
+
+    # XLSX and Parquet need a finished file (zip central directory / parquet footer), so they are
+    # written chunk by chunk to a temp file and streamed from disk.
+    fd, path = tempfile.mkstemp(suffix=f".{ext}")
+    os.close(fd)
+    try:
+        if fmt == 'xlsx':
+            _write_rows_xlsx(merged_df, mask, filters, path)
+        else:
+            _write_rows_parquet(merged_df, mask, filters, path)
+    except ImportError as e:
+        os.remove(path)
+        return f"Export format '{fmt}' is not available on this server: {e}", 501
+    except Exception as e:
+        os.remove(path)
+        logger.exception(f"Row export ({fmt}) failed: {e}")
+        return "Export failed", 500
+    headers['Content-Length'] = str(os.path.getsize(path))
+    return Response(_stream_file(path), mimetype=mimetype, headers=headers)
+
+# Folder name of each page inside the chart zip (also the order pages are written in)
+CHART_EXPORT_PAGES = {
+    'main': 'main_dashboard',
+    'p2': 'region_analysis',
+    'p3': 'sm_analysis',
+    'p4': 'year_analysis',
+    'p1': 'po_analysis',
+}
+# Measure each page starts with (same defaults as the page measure stores)
+PAGE_DEFAULT_MEASURES = {'p1': 'Order Amount', 'p2': 'Revenue Amount', 'p3': 'Order Amount', 'p4': 'Revenue Amount'}
+# Store holding the measure selected on each page
+PAGE_MEASURE_STORES = {'p1': 'measure-store', 'p2': 'region-measure-store', 'p3': 'sm-measure-store', 'p4': 'year-measure-store'}
+
+def compute_chart_frames(page, merged_df, mc, filters, measure=None):
+    """Return [(name, DataFrame)] for every chart of a page, for the model rows matching filters."""
+    period = filters.get('Period') or filters.get('PeriodType')
+    if page == 'main':
+        return _main_chart_frames(merged_df, filters, mc, filters.get('Region'), filters.get('SM'), period)
+    selected_measure = get_actual_column_name(measure or PAGE_DEFAULT_MEASURES[page], mc)
+    if selected_measure not in merged_df.columns:
+        raise ValueError(f"Unknown measure '{measure}'")
+    result = run_page_query(PAGE_SPECS[page], merged_df, filters, mc, selected_measure, period, with_summary=False)
+    return [(chart['name'], frame) for chart, frame in result['charts']]
+
+class _ZipChunkBuffer:
+    """Write-only, non-seekable file object for zipfile: written bytes are handed back to the response generator."""
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def _stream_chart_zip(pages, merged_df, mc, filters, measures, fmt, sheet_version=None):
+    """Yield a zip with the chart frames of every requested page plus a manifest, one entry at a time."""
+    buf = _ZipChunkBuffer()
+    manifest = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'filters': filters,
+        'format': fmt,
+        'sheet_version': sheet_version,
+        'filtered_rows': int(filter_mask(merged_df, filters).sum()),
+        'pages': {},
+    }
+    import zipfile  # only the chart zip export needs it
+    with zipfile.ZipFile(buf, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for page in pages:
+            folder = CHART_EXPORT_PAGES[page]
+            page_info = {'measure': measures.get(page) or PAGE_DEFAULT_MEASURES.get(page), 'files': []}
+            manifest['pages'][folder] = page_info
+            try:
+                frames = compute_chart_frames(page, merged_df, mc, filters, measures.get(page))
+            except Exception as e:
+                logger.warning(f"Chart export skipped page {page}: {e}")
+                page_info['error'] = str(e)
+                continue
+            for name, frame in frames:
+                entry = f"{folder}/{name}.{fmt}"
+                if fmt == 'parquet':
+                    zf.writestr(entry, frame.to_parquet(index=False))
+                else:
+                    zf.writestr(entry, frame.to_csv(index=False))
+                page_info['files'].append({'path': entry, 'rows': int(len(frame))})
+                yield buf.drain()
+        zf.writestr('manifest.json', json.dumps(manifest, indent=2, default=str))
+    yield buf.drain()
+
+@server.route("/export/charts.zip")
+def export_chart_zip():
+    """
+    Stream one zip with the data of every chart of a page (or of the whole dashboard) for the given filters.
+    Query params: page=main|p1|p2|p3|p4|all, format=csv|parquet, filters=<JSON>, measures=<JSON {page: measure}>,
+    as_of=<stored sheet version> (optional).
+    """
+    page = request.args.get('page') or 'all'
+    if page != 'all' and page not in CHART_EXPORT_PAGES:
+        return f"Unknown page '{page}'", 400
+    fmt = (request.args.get('format') or 'csv').lower()
+    if fmt not in ('csv', 'parquet'):
+        return f"Unsupported format '{fmt}'", 400
+    try:
+        filters = json.loads(request.args.get('filters') or '{}') or {}
+        measures = json.loads(request.args.get('measures') or '{}') or {}
+        if not isinstance(filters, dict) or not isinstance(measures, dict):
+            raise ValueError("filters and measures must be JSON objects")
+    except ValueError as e:
+        return f"Invalid parameters: {e}", 400
+    if fmt == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            return f"Export format 'parquet' is not available on this server: {e}", 501
+
+    try:
+        model = request_model()
+    except ValueError:
+        return "Invalid as_of version", 400
+    if model is None:
+        return f"Unknown sheet version {request.args.get('as_of')}", 404
+    merged_df, mc = model.merged, model.measure_cols
+    if merged_df.empty:
+        return "No data available", 503
+    pages = list(CHART_EXPORT_PAGES) if page == 'all' else [page]
+    filename = 'dashboard_charts.zip' if page == 'all' else f"{CHART_EXPORT_PAGES[page]}_charts.zip"
+    return Response(_stream_chart_zip(pages, merged_df, mc, filters, measures, fmt, model.sheet_version), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+# Keep the export links of every page pointing at the page's current filters (and selected measure)
+def _register_export_links(prefix):
+    inputs = [Input(f"{prefix}-filter-store", "data")]
+    if prefix in PAGE_MEASURE_STORES:
+        inputs.append(Input(PAGE_MEASURE_STORES[prefix], "data"))
+
+    @app.callback(
+        [Output(f"{prefix}-export-rows-csv", "href"),
+         Output(f"{prefix}-export-rows-xlsx", "href"),
+         Output(f"{prefix}-export-rows-parquet", "href"),
+         Output(f"{prefix}-export-charts-zip", "href")],
+        inputs
+    )
+    def update_export_links(filter_json, selected_measure=None):
+        try:
+            filters = json.loads(filter_json) if filter_json else {}
+        except ValueError:
+            filters = {}
+        measures = {prefix: selected_measure} if selected_measure else None
+        return (*(build_row_export_url(fmt, filters) for fmt in ('csv', 'xlsx', 'parquet')),
+                build_chart_zip_url(prefix, filters, measures))
+    return update_export_links
+
+for _prefix in CHART_EXPORT_PAGES:
+    _register_export_links(_prefix)
+
+# Shared-store keys mapped to the filter names used by the exports
+SHARED_FILTER_KEYS = {'customer': 'Customer', 'project': 'Project', 'sm': 'SM', 'po_ref': 'PO REF', 'region': 'Region', 'year': 'Year', 'period': 'Period'}
+
+@app.callback(
+    Output('export-all-charts-zip', 'href'),
+    [Input('shared-dropdowns', 'data'),
+     Input('measure-store', 'data'),
+     Input('region-measure-store', 'data'),
+     Input('sm-measure-store', 'data'),
+     Input('year-measure-store', 'data')]
+)
+def update_export_all_link(store_data, p1_measure, p2_measure, p3_measure, p4_measure):
+    filters = {SHARED_FILTER_KEYS[k]: v for k, v in (store_data or {}).items() if k in SHARED_FILTER_KEYS and v is not None}
+    measures = {k: v for k, v in [('p1', p1_measure), ('p2', p2_measure), ('p3', p3_measure), ('p4', p4_measure)] if v}
+    return build_chart_zip_url('all', filters, measures)
+
 # --- Page 1 Export Callbacks ---
 @app.callback(Output("download-p1-chart1", "data"), Input("export-p1-chart1", "n_clicks"), State("p1-chart1-store", "data"), State("p1-filter-store", "data"), prevent_initial_call=True)
 def export_p1_chart1(n_clicks, chart_json, filter_json):
@@ -1247,730 +3416,6 @@ def export_p4_chart1(n_clicks, chart_json, filter_json):
 def export_p4_chart2(n_clicks, chart_json, filter_json):
     return _create_export_data(n_clicks, chart_json, filter_json)
 
-@app.callback(
-    Output('region-measure-store', 'data'),
-    [Input('region-orders-card', 'n_clicks'),
-     Input('region-revenue-card', 'n_clicks'),
-     Input('region-backlog-card', 'n_clicks'),
-     Input('region-cash-card', 'n_clicks'),
-     Input('region-pending-card', 'n_clicks')],
-    prevent_initial_call=True
-)
-def update_region_selected_measure(orders_clicks, revenue_clicks, backlog_clicks, cash_clicks, pending_clicks):
-    ctx = callback_context
-    if not ctx.triggered:
-        return dash.no_update
-    button_id = ctx.triggered[0]['prop_id'].split('.')[0]
-    if button_id == 'region-orders-card':
-        return measure_cols["Order Amount"]
-    elif button_id == 'region-revenue-card':
-        return measure_cols["Revenue Amount"]
-    elif button_id == 'region-backlog-card':
-        return measure_cols["Backlog Amount"]
-    elif button_id == 'region-cash-card':
-        return measure_cols["Cash Amount"]
-    elif button_id == 'region-pending-card':
-        return measure_cols["Pending Amount"]
-    return dash.no_update
-
-@app.callback(
-    [Output("region-orders-card-value", "children"),
-     Output("region-revenue-card-value", "children"),
-     Output("region-backlog-card-value", "children"),
-     Output("region-cash-card-value", "children"),
-     Output("region-pending-card-value", "children"),
-     Output("region-po-count-value", "children"),
-     Output("region-orders-card", "style"),
-     Output("region-revenue-card", "style"),
-     Output("region-backlog-card", "style"),
-     Output("region-cash-card", "style"),
-     Output("region-pending-card", "style"),
-     Output("region-po-count-card", "style"),
-     Output("region-charts", "children"),
-     Output("region-summary-table", "children"),
-     Output("p2-chart1-store", "data"),
-     Output("p2-chart2-store", "data"),
-     Output("p2-filter-store", "data")],
-    [Input('region-dropdown1', 'value'),
-     Input('region-dropdown2', 'value'),
-     Input('region-dropdown3', 'value'),
-     Input('region-dropdown4', 'value'),
-     Input('specific-region-filter', 'value'),
-     Input('region-year-filter', 'value'),
-     Input('p2-period-filter', 'value'),
-     Input('region-measure-store', 'data'),
-     Input('data-refresh-interval', 'n_intervals'),
-     Input('fast-data-refresh-interval', 'n_intervals')]
-)
-def update_region_analysis(d1, d2, d3, d4, specific_region, year_filter, p2_period, selected_measure, n_intervals, fast_n_intervals):
-    if is_data_updated():
-        orders, revenues, cash, merged, measure_cols = load_data()
-        try:
-            os.remove('data_updated.txt')
-        except Exception:
-            pass
-    else:
-        orders, revenues, cash, merged, measure_cols = load_data()
-    try:
-        filtered_df = merged.copy()
-        filters = [d1, d2, d3, d4]
-        for i, col in enumerate(dropdown_cols):
-            if filters[i]:
-                filtered_df = filtered_df[filtered_df[col] == filters[i]]
-        if specific_region and specific_region != "All":
-            filtered_df = filtered_df[filtered_df['Region'] == specific_region]
-        if year_filter:
-            filtered_df = filtered_df[filtered_df['Year'] == year_filter]
-        # Resolve actual_measure and perform validation based on actual column names
-        actual_measure = get_actual_column_name(selected_measure, measure_cols)
-        if filtered_df.empty or actual_measure not in filtered_df.columns:
-            default = "N/A"
-            default_style = {'padding': '10px', 'textAlign': 'center', 'cursor': 'pointer', 'border': '1px solid #ddd', 'borderRadius': '5px', 'margin': '0 5px'}
-            empty_table = dash_table.DataTable(columns=[], data=[])
-            return [
-                default, default, default, default, default, default,
-                default_style, default_style, default_style, default_style, default_style, default_style,
-                [], [html.Div([empty_table], style={'marginLeft': '2cm', 'marginRight': '2cm'})], None, None, None
-            ]
-        total_orders = filtered_df[measure_cols["Order Amount"]].sum()
-        total_revenue = filtered_df[measure_cols["Revenue Amount"]].sum()
-        total_backlog = filtered_df[measure_cols["Backlog Amount"]].sum()
-        total_cash = filtered_df[measure_cols["Cash Amount"]].sum()
-        total_pending = filtered_df[measure_cols["Pending Amount"]].sum()
-        po_count = filtered_df['PO REF'].nunique()
-        formatted_orders = f"€{total_orders:,.0f}"
-        formatted_revenue = f"€{total_revenue:,.0f}"
-        formatted_backlog = f"€{total_backlog:,.0f}"
-        formatted_cash = f"€{total_cash:,.0f}"
-        formatted_pending = f"€{total_pending:,.0f}"
-        formatted_po_count = f"{po_count:,}"
-        default_style = {'padding': '10px', 'textAlign': 'center', 'cursor': 'pointer', 'border': '1px solid #ddd', 'borderRadius': '5px', 'margin': '0 5px'}
-        active_style = default_style.copy()
-        active_style['border'] = '2px solid #007BFF'
-        active_style['boxShadow'] = '0 0 5px #007BFF'
-        orders_style = active_style if selected_measure == measure_cols["Order Amount"] else default_style
-        revenue_style = active_style if selected_measure == measure_cols["Revenue Amount"] else default_style
-        backlog_style = active_style if selected_measure == "Backlog Amount" else default_style
-        cash_style = active_style if selected_measure == measure_cols["Cash Amount"] else default_style
-        pending_style = active_style if selected_measure == "Pending Amount" else default_style
-        po_count_style = default_style
-        # Get the actual column name for the selected measure
-        actual_measure = get_actual_column_name(selected_measure, measure_cols)
-        
-        bar_title = f"{selected_measure.replace('_', ' ').title()} by Region"
-        year_comparison_title = f"{selected_measure.replace('_', ' ').title()} Year Comparison by Region"
-        pie_df = filtered_df.groupby('Region', as_index=False)[actual_measure].sum()
-        # Pick a valid dimension (one of dropdown_cols) that exists in the dataframe
-        dimension = next((col for col in dropdown_cols if col in filtered_df.columns), None)
-        if not dimension:
-            dimension = 'Region' if 'Region' in filtered_df.columns else filtered_df.columns[0]
-
-        try:
-            bar_df = filtered_df.groupby(dimension, as_index=False)[actual_measure].sum().nlargest(10, actual_measure)
-        except Exception as e:
-            import traceback
-            print("Failed to compute bar_df:")
-            print(traceback.format_exc())
-            bar_df = pd.DataFrame()
-        
-        # Create comprehensive year comparison data with Revenue, Orders, and Cash
-        year_comparison_df = filtered_df.groupby(['Year', 'Region'], as_index=False).agg({
-            measure_cols["Revenue Amount"]: "sum",
-            measure_cols["Order Amount"]: "sum", 
-            measure_cols["Cash Amount"]: "sum"
-        }).rename(columns={
-            measure_cols["Revenue Amount"]: "Revenue Amount",
-            measure_cols["Order Amount"]: "Order Amount",
-            measure_cols["Cash Amount"]: "Cash Amount"
-        })
-        
-        try:
-            if not is_valid_for_plot(bar_df, actual_measure):
-                bar_fig = px.bar(title="No data available")
-            else:
-                clean_bar_df = bar_df.copy()
-                clean_bar_df[actual_measure] = pd.to_numeric(clean_bar_df[actual_measure], errors='coerce')
-                clean_bar_df = clean_bar_df.dropna(subset=[actual_measure])
-                
-                if clean_bar_df.empty:
-                    bar_fig = px.bar(title="No valid data available")
-                else:
-                    bar_fig = px.bar(
-                        clean_bar_df, 
-                        x=dimension, 
-                        y=actual_measure, 
-                        title=f"{selected_measure} by {dimension}"
-                    )
-        except Exception as e:
-            print(f"Error creating region bar chart: {e}")
-            bar_fig = px.bar(title="Error loading chart")
-        
-        bar_fig.update_layout(title_font_size=12, title_x=0.5, margin=dict(t=40, b=20, l=20, r=20))
-        
-        # If Period selected, override comparison to be by Period instead of Year
-        if p2_period:
-            temp_df = filtered_df.copy()
-            if p2_period == 'Quarterly':
-                temp_df['Period'] = temp_df['Month'].dt.to_period('Q').astype(str)
-            else:
-                temp_df['Period'] = temp_df['Month'].dt.to_period('M').astype(str)
-            year_comparison_df = temp_df.groupby(['Period', 'Region'], as_index=False).agg({
-                measure_cols["Revenue Amount"]: "sum",
-                measure_cols["Order Amount"]: "sum", 
-                measure_cols["Cash Amount"]: "sum"
-            }).rename(columns={
-                measure_cols["Revenue Amount"]: "Revenue Amount",
-                measure_cols["Order Amount"]: "Order Amount",
-                measure_cols["Cash Amount"]: "Cash Amount"
-            })
-
-        # Create comprehensive year/period comparison bar chart with Revenue, Orders, and Cash
-        try:
-            candidate_cols = ['Revenue Amount', 'Order Amount', 'Cash Amount']
-            valid_cols = [c for c in candidate_cols if c in year_comparison_df.columns and is_valid_for_plot(year_comparison_df, c)]
-            if not valid_cols:
-                year_comparison_fig = px.bar(title="No data available")
-            else:
-                clean_year_comparison_df = year_comparison_df.copy()
-                for col in candidate_cols:
-                    if col in clean_year_comparison_df.columns:
-                        clean_year_comparison_df[col] = pd.to_numeric(clean_year_comparison_df[col], errors='coerce')
-                clean_year_comparison_df = clean_year_comparison_df.dropna(subset=valid_cols, how='all')
-                if clean_year_comparison_df.empty:
-                    year_comparison_fig = px.bar(title="No valid data available")
-                else:
-                    id_vars = ['Region']
-                    if p2_period:
-                        id_vars = ['Period'] + id_vars
-                    else:
-                        id_vars = ['Year'] + id_vars
-                    melted_df = clean_year_comparison_df.melt(id_vars=id_vars, value_vars=valid_cols, var_name='Measure', value_name='Amount')
-                    x_axis = 'Period' if p2_period else 'Year'
-                    title_txt = "Revenue, Orders & Cash Comparison by " + ("Period" if p2_period else "Year") + " and Region"
-                    year_comparison_fig = px.bar(melted_df, x=x_axis, y='Amount', color='Region', pattern_shape='Measure', title=title_txt, barmode='group', color_discrete_sequence=px.colors.qualitative.Set3)
-                    year_comparison_fig.update_layout(xaxis_title=("Period" if p2_period else "Year"), yaxis_title="Amount (€)", legend_title="Region & Measure", barmode='group')
-        except Exception as e:
-            print(f"Error creating region year comparison chart: {e}")
-            year_comparison_fig = px.bar(title="Error loading chart")
-        
-        year_comparison_fig.update_layout(title_font_size=12, title_x=0.5, margin=dict(t=40, b=20, l=20, r=20))
-        charts = html.Div([
-            create_chart_card(bar_fig, "p2-chart1"), 
-            create_chart_card(year_comparison_fig, "p2-chart2")
-        ], style={'display': 'flex', 'justifyContent': 'center', 'gap': '50px'})
-        summary_df = filtered_df.groupby(["Customer", "Region", "Project"], as_index=False).agg({
-            measure_cols["Order Amount"]: "sum",
-            measure_cols["Revenue Amount"]: "sum",
-            "Backlog Amount": "sum",
-            "Pending Amount": "sum",
-            measure_cols["Cash Amount"]: "sum"
-        }).rename(columns={
-            measure_cols["Order Amount"]: "Order Amount",
-            measure_cols["Revenue Amount"]: "Revenue Amount",
-            measure_cols["Cash Amount"]: "Cash Amount",
-            "Backlog Amount": "Backlog Amount",
-            "Pending Amount": "Pending Amount"
-        }).sort_values(by=selected_measure if selected_measure in ["Order Amount", "Revenue Amount", "Backlog Amount"] else "Revenue Amount", ascending=False)
-        table_data = summary_df.to_dict("records")
-        table = dash_table.DataTable(
-            columns=[
-                {"name": "Customer", "id": "Customer"},
-                {"name": "Region", "id": "Region"},
-                {"name": "Project", "id": "Project"},
-                {"name": "Order Amount", "id": "Order Amount", "type": "numeric", "format": {"specifier": ",.0f"}},
-                {"name": "Revenue Amount", "id": "Revenue Amount", "type": "numeric", "format": {"specifier": ",.0f"}},
-                {"name": "Cash Amount", "id": "Cash Amount", "type": "numeric", "format": {"specifier": ",.0f"}},
-                {"name": "Backlog Amount", "id": "Backlog Amount", "type": "numeric", "format": {"specifier": ",.0f"}},
-                {"name": "Pending Amount", "id": "Pending Amount", "type": "numeric", "format": {"specifier": ",.0f"}},
-            ],
-            data=table_data,
-            style_table={'overflowX': 'auto', 'borderRadius': '8px', 'border': '1px solid #1976d2'},
-            style_cell={'textAlign': 'center', 'padding': '8px'},
-            style_header={'fontWeight': 'bold', 'backgroundColor': '#1976d2', 'color': 'white', 'border': 'none'},
-            style_data_conditional=[{'if': {'row_index': 'even'}, 'backgroundColor': '#e3f2fd'}],
-            export_format='csv',
-        )
-        chart1_data = {'df': bar_df.to_json(orient='split'), 'title': bar_fig.layout.title.text}
-        chart2_data = {'df': year_comparison_df.to_json(orient='split'), 'title': year_comparison_fig.layout.title.text}
-        active_filters = {dropdown_cols[i]: filters[i] for i, f in enumerate(filters) if f}
-        if specific_region and specific_region != "All":
-            active_filters['Region'] = specific_region
-        if year_filter:
-            active_filters['Year'] = year_filter
-        if p2_period:
-            active_filters['Period'] = p2_period
-        return formatted_orders, formatted_revenue, formatted_backlog, formatted_cash, formatted_pending, formatted_po_count, orders_style, revenue_style, backlog_style, cash_style, pending_style, po_count_style, charts, [html.Div([table], style={'marginLeft': '2cm', 'marginRight': '2cm'})], json.dumps(chart1_data), json.dumps(chart2_data), json.dumps(active_filters)
-    except Exception as e:
-        print(f"Exception in update_region_analysis: {e}")
-        traceback.print_exc()
-        default = "N/A"
-        default_style = {'padding': '10px', 'textAlign': 'center', 'cursor': 'pointer', 'border': '1px solid #ddd', 'borderRadius': '5px', 'margin': '0 5px'}
-        empty_table = dash_table.DataTable(columns=[], data=[])
-        return [
-            default, default, default, default, default, default,
-            default_style, default_style, default_style, default_style, default_style, default_style,
-            [], [html.Div([empty_table], style={'marginLeft': '2cm', 'marginRight': '2cm'})], None, None, None
-        ]
-
-@app.callback(
-    Output('sm-measure-store', 'data'),
-    [Input('sm-orders-card', 'n_clicks'),
-     Input('sm-revenue-card', 'n_clicks'),
-     Input('sm-cash-card', 'n_clicks'),
-     Input('sm-backlog-card', 'n_clicks'),
-     Input('sm-pending-card', 'n_clicks')],
-    prevent_initial_call=True
-)
-def update_sm_selected_measure(orders_clicks, revenue_clicks, cash_clicks, backlog_clicks, pending_clicks):
-    ctx = callback_context
-    if not ctx.triggered:
-        return dash.no_update
-    button_id = ctx.triggered[0]['prop_id'].split('.')[0]
-    if button_id == 'sm-orders-card':
-        return measure_cols["Order Amount"]
-    elif button_id == 'sm-revenue-card':
-        return measure_cols["Revenue Amount"]
-    elif button_id == 'sm-cash-card':
-        return measure_cols["Cash Amount"]
-    elif button_id == 'sm-backlog-card':
-        return measure_cols["Backlog Amount"]
-    elif button_id == 'sm-pending-card':
-        return measure_cols["Pending Amount"]
-    return dash.no_update
-
-@app.callback(
-    [Output("sm-orders-card-value", "children"),
-     Output("sm-revenue-card-value", "children"),
-     Output("sm-cash-card-value", "children"),
-     Output("sm-backlog-card-value", "children"),
-     Output("sm-pending-card-value", "children"),
-     Output("sm-po-count-value", "children"),
-     Output("sm-orders-card", "style"),
-     Output("sm-revenue-card", "style"),
-     Output("sm-cash-card", "style"),
-     Output("sm-backlog-card", "style"),
-     Output("sm-pending-card", "style"),
-     Output("sm-po-count-card", "style"),
-     Output("sm-charts", "children"),
-     Output("sm-summary-table-page3", "children"),
-     Output("p3-chart1-store", "data"),
-     Output("p3-chart2-store", "data"),
-     Output("p3-filter-store", "data")],
-    [Input('sm-dropdown1', 'value'),
-     Input('sm-dropdown2', 'value'),
-     Input('sm-dropdown3', 'value'),
-     Input('sm-dropdown4', 'value'),
-     Input('sm-region-filter', 'value'),
-     Input('sm-year-filter', 'value'),
-     Input('p3-period-filter', 'value'),
-     Input('sm-measure-store', 'data'),
-     Input('data-refresh-interval', 'n_intervals'),
-     Input('fast-data-refresh-interval', 'n_intervals')]
-)
-def update_sm_analysis(d1, d2, d3, d4, region, year_filter, p3_period, selected_measure, n_intervals, fast_n_intervals):
-    if is_data_updated():
-        orders, revenues, cash, merged, measure_cols = load_data()
-        try:
-            os.remove('data_updated.txt')
-        except Exception:
-            pass
-    else:
-        orders, revenues, cash, merged, measure_cols = load_data()
-    try:
-        filtered_df = merged.copy()
-        filters = [d1, d2, d3, d4]
-        for i, col in enumerate(dropdown_cols):
-            if filters[i]:
-                filtered_df = filtered_df[filtered_df[col] == filters[i]]
-        if year_filter:
-            filtered_df = filtered_df[filtered_df['Year'] == year_filter]
-        if region and region != "All":
-            filtered_df = filtered_df[filtered_df['Region'] == region]
-        if filtered_df.empty or selected_measure not in filtered_df.columns:
-            default = "N/A"
-            default_style = {'padding': '10px', 'textAlign': 'center', 'cursor': 'pointer', 'border': '1px solid #ddd', 'borderRadius': '5px', 'margin': '0 5px'}
-            empty_table = dash_table.DataTable(columns=[], data=[])
-            return [
-                default, default, default, default, default, default,
-                default_style, default_style, default_style, default_style, default_style, default_style,
-                [], [html.Div([empty_table], style={'marginLeft': '2cm', 'marginRight': '2cm'})], None, None, None
-            ]
-        total_orders = filtered_df[measure_cols["Order Amount"]].sum()
-        total_revenue = filtered_df[measure_cols["Revenue Amount"]].sum()
-        total_cash = filtered_df[measure_cols["Cash Amount"]].sum()
-        total_backlog = filtered_df[measure_cols["Backlog Amount"]].sum()
-        total_pending = filtered_df[measure_cols["Pending Amount"]].sum()
-        po_count = filtered_df['PO REF'].nunique()
-        formatted_orders = f"€{total_orders:,.0f}"
-        formatted_revenue = f"€{total_revenue:,.0f}"
-        formatted_cash = f"€{total_cash:,.0f}"
-        formatted_backlog = f"€{total_backlog:,.0f}"
-        formatted_pending = f"€{total_pending:,.0f}"
-        formatted_po_count = f"{po_count:,}"
-        default_style = {'padding': '10px', 'textAlign': 'center', 'cursor': 'pointer', 'border': '1px solid #ddd', 'borderRadius': '5px', 'margin': '0 5px'}
-        active_style = default_style.copy()
-        active_style['border'] = '2px solid #007BFF'
-        active_style['boxShadow'] = '0 0 5px #007BFF'
-        orders_style = active_style if selected_measure == measure_cols["Order Amount"] else default_style
-        revenue_style = active_style if selected_measure == measure_cols["Revenue Amount"] else default_style
-        cash_style = active_style if selected_measure == measure_cols["Cash Amount"] else default_style
-        backlog_style = active_style if selected_measure == "Backlog Amount" else default_style
-        pending_style = active_style if selected_measure == "Pending Amount" else default_style
-        po_count_style = default_style
-        bar_title = f"{selected_measure.replace('_', ' ').title()} by SM"
-        pie_title = f"{selected_measure.replace('_', ' ').title()} Share by SM"
-        # If Period selected, build period dataset for second chart
-        if p3_period:
-            temp = filtered_df.copy()
-            if p3_period == 'Quarterly':
-                temp['Period'] = temp['Month'].dt.to_period('Q').astype(str)
-            else:
-                temp['Period'] = temp['Month'].dt.to_period('M').astype(str)
-            pie_df = temp.groupby('Period', as_index=False)[selected_measure].sum()
-        else:
-            pie_df = filtered_df.groupby('SM', as_index=False)[selected_measure].sum()
-        # Get the actual column name for the selected measure
-        actual_measure = get_actual_column_name(selected_measure, measure_cols)
-        
-        bar_df = filtered_df.groupby('SM', as_index=False)[actual_measure].sum().nlargest(10, actual_measure)
-        
-        try:
-            if not is_valid_for_plot(bar_df, actual_measure):
-                bar_fig = px.bar(title="No data available")
-            else:
-                clean_bar_df = bar_df.copy()
-                clean_bar_df[actual_measure] = pd.to_numeric(clean_bar_df[actual_measure], errors='coerce')
-                clean_bar_df = clean_bar_df.dropna(subset=[actual_measure])
-                
-                if clean_bar_df.empty:
-                    bar_fig = px.bar(title="No valid data available")
-                else:
-                    bar_fig = px.bar(
-                        clean_bar_df, 
-                        x='SM', 
-                        y=actual_measure, 
-                        title=f"{selected_measure} by SM"
-                    )
-        except Exception as e:
-            print(f"Error creating bar chart: {e}")
-            bar_fig = px.bar(title="Error loading chart")
-        
-        bar_fig.update_layout(title_font_size=12, title_x=0.5, margin=dict(t=40, b=20, l=20, r=20))
-       
-        try:
-            if not is_valid_for_plot(pie_df, selected_measure):
-                pie_fig = px.pie(title="No data available")
-            else:
-                clean_pie_df = pie_df.copy()
-                clean_pie_df[selected_measure] = pd.to_numeric(clean_pie_df[selected_measure], errors='coerce')
-                clean_pie_df = clean_pie_df.dropna(subset=[selected_measure])
-                
-                if clean_pie_df.empty:
-                    pie_fig = px.pie(title="No valid data available")
-                else:
-                    if p3_period:
-                        pie_fig = px.bar(clean_pie_df, x='Period', y=selected_measure, title=f"{selected_measure} by {p3_period}")
-                    else:
-                        pie_fig = px.pie(clean_pie_df, names='SM', values=selected_measure, title=f"{selected_measure} Distribution by SM", hole=0.3)
-        except Exception as e:
-            print(f"Error creating pie chart: {e}")
-            pie_fig = px.pie(title="Error loading chart")
-        
-        pie_fig.update_layout(title_font_size=12, title_x=0.5, margin=dict(t=40, b=20, l=20, r=20))
-        charts = html.Div([
-            create_chart_card(bar_fig, "p3-chart1"), 
-            create_chart_card(pie_fig, "p3-chart2")
-        ], style={'display': 'flex', 'justifyContent': 'center', 'gap': '50px'})
-        summary_df = filtered_df.groupby(["SM", "Customer", "Project"], as_index=False).agg({
-            measure_cols["Order Amount"]: "sum",
-            measure_cols["Revenue Amount"]: "sum",
-            measure_cols["Cash Amount"]: "sum",
-            "Backlog Amount": "sum",
-            "Pending Amount": "sum"
-        }).rename(columns={
-            measure_cols["Order Amount"]: "Order Amount",
-            measure_cols["Revenue Amount"]: "Revenue Amount",
-            measure_cols["Cash Amount"]: "Cash Amount",
-            "Backlog Amount": "Backlog Amount",
-            "Pending Amount": "Pending Amount"
-        }).sort_values(by=selected_measure if selected_measure in ["Order Amount", "Revenue Amount", "Cash Amount"] else "Order Amount", ascending=False)
-        table_data = summary_df.to_dict("records")
-        table = dash_table.DataTable(
-            columns=[
-                {"name": "SM", "id": "SM"},
-                {"name": "Customer", "id": "Customer"},
-                {"name": "Project", "id": "Project"},
-                {"name": "Order Amount", "id": "Order Amount", "type": "numeric", "format": {"specifier": ",.0f"}},
-                {"name": "Revenue Amount", "id": "Revenue Amount", "type": "numeric", "format": {"specifier": ",.0f"}},
-                {"name": "Cash Amount", "id": "Cash Amount", "type": "numeric", "format": {"specifier": ",.0f"}},
-                {"name": "Backlog Amount", "id": "Backlog Amount", "type": "numeric", "format": {"specifier": ",.0f"}},
-                {"name": "Pending Amount", "id": "Pending Amount", "type": "numeric", "format": {"specifier": ",.0f"}},
-            ],
-            data=table_data,
-            style_table={'overflowX': 'auto', 'borderRadius': '8px', 'border': '1px solid #1976d2'},
-            style_cell={'textAlign': 'center', 'padding': '8px'},
-            style_header={'fontWeight': 'bold', 'backgroundColor': '#1976d2', 'color': 'white', 'border': 'none'},
-            style_data_conditional=[{'if': {'row_index': 'even'}, 'backgroundColor': '#e3f2fd'}],
-            export_format='csv',
-        )
-        chart1_data = {'df': bar_df.to_json(orient='split'), 'title': bar_fig.layout.title.text}
-        chart2_data = {'df': pie_df.to_json(orient='split'), 'title': pie_fig.layout.title.text}
-        active_filters = {dropdown_cols[i]: filters[i] for i, f in enumerate(filters) if f}
-        if region and region != "All":
-            active_filters['Region'] = region
-        if year_filter:
-            active_filters['Year'] = year_filter
-        if p3_period:
-            active_filters['Period'] = p3_period
-        return formatted_orders, formatted_revenue, formatted_cash, formatted_backlog, formatted_pending, formatted_po_count, orders_style, revenue_style, cash_style, backlog_style, pending_style, po_count_style, charts, [html.Div([table], style={'marginLeft': '2cm', 'marginRight': '2cm'})], json.dumps(chart1_data), json.dumps(chart2_data), json.dumps(active_filters)
-    except Exception as e:
-        print(f"Exception in update_sm_analysis: {e}")
-        traceback.print_exc()
-        default = "N/A"
-        default_style = {'padding': '10px', 'textAlign': 'center', 'cursor': 'pointer', 'border': '1px solid #ddd', 'borderRadius': '5px', 'margin': '0 5px'}
-        empty_table = dash_table.DataTable(columns=[], data=[])
-        return [
-            default, default, default, default, default, default,
-            default_style, default_style, default_style, default_style, default_style, default_style,
-            [], [html.Div([empty_table], style={'marginLeft': '2cm', 'marginRight': '2cm'})], None, None, None
-        ]
-
-@app.callback(
-    Output('year-measure-store', 'data'),
-    [Input('year-orders-card', 'n_clicks'),
-     Input('year-revenue-card', 'n_clicks'),
-     Input('year-cash-card', 'n_clicks'),
-     Input('year-backlog-card', 'n_clicks'),
-     Input('year-pending-card', 'n_clicks')],
-    prevent_initial_call=True
-)
-def update_year_selected_measure(orders_clicks, revenue_clicks, cash_clicks, backlog_clicks, pending_clicks):
-    ctx = callback_context
-    if not ctx.triggered:
-        return dash.no_update
-    button_id = ctx.triggered[0]['prop_id'].split('.')[0]
-
-    if button_id == 'year-orders-card':
-        return measure_cols["Order Amount"]
-    elif button_id == 'year-revenue-card':
-        return measure_cols["Revenue Amount"]
-    elif button_id == 'year-cash-card':
-        return measure_cols["Cash Amount"]
-    elif button_id == 'year-backlog-card':
-        return measure_cols["Backlog Amount"]
-    elif button_id == 'year-pending-card':
-        return measure_cols["Pending Amount"]
-    return dash.no_update
-
-@app.callback(
-    [Output("year-orders-card-value", "children"),
-     Output("year-revenue-card-value", "children"),
-     Output("year-cash-card-value", "children"),
-     Output("year-backlog-card-value", "children"),
-     Output("year-pending-card-value", "children"),
-     Output("year-po-count-value", "children"),
-     Output("year-orders-card", "style"),
-     Output("year-revenue-card", "style"),
-     Output("year-cash-card", "style"),
-     Output("year-backlog-card", "style"),
-     Output("year-pending-card", "style"),
-     Output("year-po-count-card", "style"),
-     Output("year-charts", "children"),
-     Output("year-summary-table", "children"),
-     Output("p4-chart1-store", "data"),
-     Output("p4-chart2-store", "data"),
-     Output("p4-filter-store", "data")],
-    [Input('year-dropdown1', 'value'),
-     Input('year-dropdown2', 'value'),
-     Input('year-dropdown3', 'value'),
-     Input('year-dropdown4', 'value'),
-     Input('year-region-filter', 'value'),
-     Input('p4-year-filter', 'value'),
-     Input('p4-period-filter', 'value'),
-     Input('year-measure-store', 'data'),
-     Input('data-refresh-interval', 'n_intervals'),
-     Input('fast-data-refresh-interval', 'n_intervals')]
-)
-def update_year_analysis(d1, d2, d3, d4, region_filter, year_filter, p4_period, selected_measure, n_intervals, fast_n_intervals):
-    if is_data_updated():
-        orders, revenues, cash, merged, measure_cols = load_data()
-        try:
-            os.remove('data_updated.txt')
-        except Exception:
-            pass
-    else:
-        orders, revenues, cash, merged, measure_cols = load_data()
-    try:
-        filtered_df = merged.copy()
-        filters = [d1, d2, d3, d4]
-        for i, col in enumerate(dropdown_cols):
-            if filters[i]:
-                filtered_df = filtered_df[filtered_df[col] == filters[i]]
-        if region_filter and region_filter != "All":
-            filtered_df = filtered_df[filtered_df['Region'] == region_filter]
-        if year_filter:
-            filtered_df = filtered_df[filtered_df['Year'] == year_filter]
-        
-        # Get the actual column name for the selected measure
-        actual_measure = get_actual_column_name(selected_measure, measure_cols)
-        
-        if filtered_df.empty or actual_measure not in filtered_df.columns:
-            default = "N/A"
-            default_style = {'padding': '10px', 'textAlign': 'center', 'cursor': 'pointer', 'border': '1px solid #ddd', 'borderRadius': '5px', 'margin': '0 5px'}
-            empty_table = dash_table.DataTable(columns=[], data=[])
-            return [
-                default, default, default, default, default, default,
-                default_style, default_style, default_style, default_style, default_style, default_style,
-                [], [html.Div([empty_table], style={'marginLeft': '2cm', 'marginRight': '2cm'})], None, None, None
-            ]
-        total_revenue = filtered_df[measure_cols["Revenue Amount"]].sum()
-        total_orders = filtered_df[measure_cols["Order Amount"]].sum()
-        total_cash = filtered_df[measure_cols["Cash Amount"]].sum()
-        total_backlog = filtered_df[measure_cols["Backlog Amount"]].sum()
-        total_pending = filtered_df[measure_cols["Pending Amount"]].sum()
-        total_pos = filtered_df['PO REF'].nunique()
-        formatted_revenue = f"€{total_revenue:,.0f}"
-        formatted_orders = f"€{total_orders:,.0f}"
-        formatted_cash = f"€{total_cash:,.0f}"
-        formatted_backlog = f"€{total_backlog:,.0f}"
-        formatted_pending = f"€{total_pending:,.0f}"
-        formatted_pos = f"{total_pos:,}"
-        default_style = {'padding': '10px', 'textAlign': 'center', 'cursor': 'pointer', 'border': '1px solid #ddd', 'borderRadius': '5px', 'margin': '0 5px'}
-        active_style = default_style.copy()
-        active_style['border'] = '2px solid #007BFF'
-        active_style['boxShadow'] = '0 0 5px #007BFF'
-        revenue_style = active_style if selected_measure == measure_cols["Revenue Amount"] else default_style
-        orders_style = active_style if selected_measure == measure_cols["Order Amount"] else default_style
-        cash_style = active_style if selected_measure == measure_cols["Cash Amount"] else default_style
-        backlog_style = active_style if selected_measure == "Backlog Amount" else default_style
-        pending_style = active_style if selected_measure == "Pending Amount" else default_style
-        po_count_style = default_style
-        if selected_measure in measure_cols.values():
-            measure_name = [k for k, v in measure_cols.items() if v == selected_measure][0]
-        # If Period selected, create period-based aggregations; otherwise keep Year-based
-        if p4_period:
-            temp = filtered_df.copy()
-            if p4_period == 'Quarterly':
-                temp['Period'] = temp['Month'].dt.to_period('Q').astype(str)
-            else:
-                temp['Period'] = temp['Month'].dt.to_period('M').astype(str)
-            year_trend_df = temp.groupby(['Period', 'Region'], as_index=False)[actual_measure].sum()
-            year_comparison_df = temp.groupby('Period', as_index=False).agg({
-                measure_cols["Revenue Amount"]: "sum",
-                measure_cols["Order Amount"]: "sum",
-                measure_cols["Cash Amount"]: "sum"
-            })
-        else:
-            year_trend_df = filtered_df.groupby(['Year', 'Region'], as_index=False)[actual_measure].sum()
-            year_comparison_df = filtered_df.groupby('Year', as_index=False).agg({
-                measure_cols["Revenue Amount"]: "sum",
-                measure_cols["Order Amount"]: "sum",
-                measure_cols["Cash Amount"]: "sum"
-            })
-        rename_dict = {v: k for k, v in measure_cols.items() if k in ["Revenue Amount", "Order Amount", "Cash Amount"]}
-        year_comparison_df = year_comparison_df.rename(columns=rename_dict)
-        try:
-            if not is_valid_for_plot(year_trend_df, actual_measure):
-                fig_trend = px.line(title="No data available")
-            else:
-                clean_trend_df = year_trend_df.copy()
-                clean_trend_df[actual_measure] = pd.to_numeric(clean_trend_df[actual_measure], errors='coerce')
-                clean_trend_df = clean_trend_df.dropna(subset=[actual_measure])
-                
-                if clean_trend_df.empty:
-                    fig_trend = px.line(title="No valid data available")
-                else:
-                    x_col = 'Period' if p4_period else 'Year'
-                    title_txt = ("Period" if p4_period else "Yearly") + f" Trend of {selected_measure}"
-                    fig_trend = px.line(clean_trend_df, x=x_col, y=actual_measure, color='Region', title=title_txt, markers=True)
-        except Exception as e:
-            print(f"Error creating trend chart: {e}")
-            fig_trend = px.line(title="Error loading chart")
-        
-        fig_trend.update_layout(title_font_size=12, title_x=0.5, margin=dict(t=40, b=20, l=20, r=20))
-        
-        try:
-            valid_cols = [col for col in ["Revenue Amount", "Order Amount", "Cash Amount"] if is_valid_for_plot(year_comparison_df, col)]
-            if year_comparison_df.empty or not valid_cols:
-                fig_compare = px.bar(title="No data available")
-            else:
-                clean_compare_df = year_comparison_df.copy()
-                for col in valid_cols:
-                    clean_compare_df[col] = pd.to_numeric(clean_compare_df[col], errors='coerce')
-                clean_compare_df = clean_compare_df.dropna(subset=valid_cols, how='all')
-                
-                if clean_compare_df.empty:
-                    fig_compare = px.bar(title="No valid data available")
-                else:
-                    x_col = 'Period' if p4_period else 'Year'
-                    title_txt = ("Period" if p4_period else "Year-wise") + " Comparison (Revenue, Order, Cash)"
-                    fig_compare = px.bar(clean_compare_df, x=x_col, y=valid_cols, title=title_txt, barmode='group')
-        except Exception as e:
-            print(f"Error creating comparison chart: {e}")
-            fig_compare = px.bar(title="Error loading chart")
-        
-        fig_compare.update_layout(title_font_size=12, title_x=0.5, margin=dict(t=40, b=20, l=20, r=20), legend_title_text='Measure')
-        charts = html.Div([
-            create_chart_card(fig_trend, "p4-chart1"), 
-            create_chart_card(fig_compare, "p4-chart2")
-        ], style={'display': 'flex', 'justifyContent': 'center', 'gap': '50px'})
-        summary_df = filtered_df.groupby(['Year', 'Region', 'SM'], as_index=False).agg({
-            measure_cols["Revenue Amount"]: "sum",
-            measure_cols["Order Amount"]: "sum",
-            measure_cols["Cash Amount"]: "sum",
-            measure_cols["Backlog Amount"]: "sum",
-            measure_cols["Pending Amount"]: "sum",
-            'PO REF': 'nunique'
-        }).rename(columns={
-            measure_cols["Revenue Amount"]: "Revenue Amount",
-            measure_cols["Order Amount"]: "Order Amount",
-            measure_cols["Cash Amount"]: "Cash Amount",
-            measure_cols["Backlog Amount"]: "Backlog Amount",
-            measure_cols["Pending Amount"]: "Pending Amount",
-            'PO REF': 'PO Count'
-        }).sort_values(['Year', 'Revenue Amount'], ascending=[True, False])
-        table_data = summary_df.to_dict("records")
-        table = dash_table.DataTable(
-            columns=[
-                {"name": "Year", "id": "Year"},
-                {"name": "Region", "id": "Region"},
-                {"name": "SM", "id": "SM"},
-                {"name": "Revenue Amount", "id": "Revenue Amount", "type": "numeric", "format": {"specifier": ",.0f"}},
-                {"name": "Order Amount", "id": "Order Amount", "type": "numeric", "format": {"specifier": ",.0f"}},
-                {"name": "Cash Amount", "id": "Cash Amount", "type": "numeric", "format": {"specifier": ",.0f"}},
-                {"name": "Backlog Amount", "id": "Backlog Amount", "type": "numeric", "format": {"specifier": ",.0f"}},
-                {"name": "Pending Amount", "id": "Pending Amount", "type": "numeric", "format": {"specifier": ",.0f"}},
-                {"name": "PO Count", "id": "PO Count", "type": "numeric", "format": {"specifier": ",.0f"}},
-            ],
-            data=table_data,
-            style_table={'overflowX': 'auto', 'borderRadius': '8px', 'border': '1px solid #1976d2'},
-            style_cell={'textAlign': 'center', 'padding': '8px'},
-            style_header={'fontWeight': 'bold', 'backgroundColor': '#1976d2', 'color': 'white', 'border': 'none'},
-            style_data_conditional=[{'if': {'row_index': 'even'}, 'backgroundColor': '#e3f2fd'}],
-            export_format='csv',
-        )
-        chart1_data = {'df': year_trend_df.to_json(orient='split'), 'title': fig_trend.layout.title.text}
-        chart2_data = {'df': year_comparison_df.to_json(orient='split'), 'title': fig_compare.layout.title.text}
-        active_filters = {dropdown_cols[i]: filters[i] for i, f in enumerate(filters) if f}
-        if region_filter and region_filter != "All":
-            active_filters['Region'] = region_filter
-        if year_filter:
-            active_filters['Year'] = year_filter
-        if p4_period:
-            active_filters['Period'] = p4_period
-        return formatted_orders, formatted_revenue, formatted_cash, formatted_backlog, formatted_pending, formatted_pos, orders_style, revenue_style, cash_style, backlog_style, pending_style, po_count_style, charts, [html.Div([table], style={'marginLeft': '2cm', 'marginRight': '2cm'})], json.dumps(chart1_data), json.dumps(chart2_data), json.dumps(active_filters)
-    except Exception as e:
-        print(f"Exception in update_year_analysis: {e}")
-        traceback.print_exc()
-        default = "N/A"
-        default_style = {'padding': '10px', 'textAlign': 'center', 'cursor': 'pointer', 'border': '1px solid #ddd', 'borderRadius': '5px', 'margin': '0 5px'}
-        empty_table = dash_table.DataTable(columns=[], data=[])
-        return [
-            default, default, default, default, default, default,
-            default_style, default_style, default_style, default_style, default_style, default_style,
-            [], [html.Div([empty_table], style={'marginLeft': '2cm', 'marginRight': '2cm'})], None, None, None
-        ]
-
 # This implementation avoids circular dependencies by separating the "update" and "set" logic.
 # 1. A master callback updates the store when any dropdown changes.
 # 2. Page-specific callbacks use the store's state to set values only when navigating to that page.
@@ -2037,7 +3482,7 @@ def set_page1_dropdowns(pathname, store_data):
 
     # Load current data options and only set values if they are valid (avoid Invalid value errors)
     try:
-        _, _, _, merged, _ = load_data()
+        merged = current_model().merged
     except Exception:
         merged = pd.DataFrame()
 
@@ -2092,7 +3537,7 @@ def set_page2_dropdowns(pathname, store_data):
         return [dash.no_update] * 7
 
     try:
-        _, _, _, merged, _ = load_data()
+        merged = current_model().merged
     except Exception:
         merged = pd.DataFrame()
 
@@ -2145,7 +3590,7 @@ def set_page3_dropdowns(pathname, store_data):
         return [dash.no_update] * 7
 
     try:
-        _, _, _, merged, _ = load_data()
+        merged = current_model().merged
     except Exception:
         merged = pd.DataFrame()
 
@@ -2194,7 +3639,7 @@ def set_page4_dropdowns(pathname, store_data):
         return [dash.no_update] * 7
 
     try:
-        _, _, _, merged, _ = load_data()
+        merged = current_model().merged
     except Exception:
         merged = pd.DataFrame()
 
@@ -2238,11 +3683,11 @@ def set_page4_dropdowns(pathname, store_data):
         # year filters
         Output('year-filter1', 'options'), Output('region-year-filter', 'options'), Output('sm-year-filter', 'options'), Output('p4-year-filter', 'options')
     ],
-    [Input('data-refresh-interval', 'n_intervals'), Input('fast-data-refresh-interval', 'n_intervals'), Input('shared-dropdowns', 'data')]
+    [Input('data-refresh-interval', 'n_intervals'), Input('fast-data-refresh-interval', 'n_intervals'), Input('data-version-store', 'data'), Input('shared-dropdowns', 'data')]
 )
-def update_all_shared_options(n_intervals, fast_n_intervals, store_data):
+def update_all_shared_options(n_intervals, fast_n_intervals, data_token, store_data):
     try:
-        _, _, _, merged, _ = load_data()
+        merged = current_model().merged
     except Exception:
         merged = pd.DataFrame()
 
@@ -2363,9 +3808,6 @@ COLOR_SEQ_MULTI = [
     COLOR_MAP['Pending Amount'],
 ]
 
-def is_data_updated(flag_file="data_updated.txt"):
-    return os.path.exists(flag_file)
-
 def is_valid_for_plot(df, col):
     try:
         if df.empty or col not in df.columns:
@@ -2400,18 +3842,12 @@ def get_actual_column_name(selected_measure, measure_cols):
 @app.callback(
     Output('main-year', 'options'),
     Input('data-refresh-interval', 'n_intervals'),
-    Input('fast-data-refresh-interval', 'n_intervals')
+    Input('fast-data-refresh-interval', 'n_intervals'),
+    Input('data-version-store', 'data')
 )
-def populate_main_year_options(n_intervals, fast_n_intervals):
+def populate_main_year_options(n_intervals, fast_n_intervals, data_token):
     try:
-        if is_data_updated():
-            _o, _r, _c, m, _mc = load_data()
-            try:
-                os.remove('data_updated.txt')
-            except Exception:
-                pass
-        else:
-            _o, _r, _c, m, _mc = load_data()
+        m = current_model().merged
         if 'Year' not in m.columns:
             return []
         years = sorted(m['Year'].dropna().unique())
@@ -2427,99 +3863,74 @@ def populate_main_year_options(n_intervals, fast_n_intervals):
 )
 def populate_main_region_sm_options(selected_year, selected_region):
     try:
-        _o, _r, _c, m, _mc = load_data()
-        df = m.copy()
-        if selected_year and 'Year' in df.columns:
-            df = df[df['Year'] == selected_year]
-        if selected_region and 'Region' in df.columns and selected_region != 'All':
-            df = df[df['Region'] == selected_region]
-        region_opts = [{'label': r, 'value': r} for r in sorted(df['Region'].dropna().unique())]
+        # masks over the snapshot instead of a copy of it; only the two option columns are sliced
+        m = current_model().merged
+        mask = np.ones(len(m), dtype=bool)
+        if selected_year and 'Year' in m.columns:
+            mask &= (m['Year'] == selected_year).to_numpy()
+        if selected_region and 'Region' in m.columns and selected_region != 'All':
+            mask &= (m['Region'] == selected_region).to_numpy()
+        region_opts = [{'label': r, 'value': r} for r in sorted(m['Region'][mask].dropna().unique())]
         if selected_region:
-            df = df[df['Region'] == selected_region]
-        sm_opts = [{'label': s, 'value': s} for s in sorted(df['SM'].dropna().unique())]
+            mask &= (m['Region'] == selected_region).to_numpy()
+        sm_opts = [{'label': s, 'value': s} for s in sorted(m['SM'][mask].dropna().unique())]
         return region_opts, sm_opts
     except Exception:
         return [], []
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='dashboard', function_name='format_kpis'),
     [Output('main-orders', 'children'),
      Output('main-revenue', 'children'),
      Output('main-cash', 'children'),
      Output('main-backlog', 'children'),
      Output('main-pending', 'children'),
-     Output('main-po-count', 'children'),
+     Output('main-po-count', 'children')],
+    Input('main-kpi-store', 'data')
+)
+
+# With no rows the amounts read 'N/A' and the PO count 0
+MAIN_EMPTY_KPIS = {'PO Count': 0}
+
+@app.callback(
+    [Output('main-kpi-store', 'data'),
      Output('main-charts', 'children'),
      Output('main-summary-table', 'children'),
      Output('main-chart1-store', 'data'),
      Output('main-chart2-store', 'data'),
-     Output('main-filter-store', 'data')],
+     Output('main-filter-store', 'data'),
+     Output('main-render-key', 'data')],
     [Input('main-year', 'value'),
      Input('main-region', 'value'),
      Input('main-sm', 'value'),
      Input('main-period', 'value'),
-     Input('data-refresh-interval', 'n_intervals'),
-     Input('fast-data-refresh-interval', 'n_intervals')]
+     Input('main-refresh', 'data')],
+    [State('url', 'pathname'),
+     State('main-render-key', 'data')],
+    prevent_initial_call=True
 )
-def update_main_dashboard(year_value, region_value, sm_value, period_value, n_intervals, fast_n_intervals):
+def update_main_dashboard(year_value, region_value, sm_value, period_value, refresh, pathname, last_key):
+    model = current_model()
+    key = page_render_key('main', pathname, last_key, [year_value, region_value, sm_value, period_value], data_push_token(model))
+    version, m, mc = model.version, model.merged, model.measure_cols
     try:
-        _o, _r, _c, m, mc = load_data()
-        df = m.copy()
-        if year_value:
-            df = df[df['Year'] == year_value]
-        if region_value:
-            df = df[df['Region'] == region_value]
-        if sm_value:
-            df = df[df['SM'] == sm_value]
-        if df.empty:
+        # KPI cards, both charts and the quarterly pivot all come from one aggregation pass
+        result = None
+        if not m.empty:
+            filters = {'Year': year_value, 'Region': region_value, 'SM': sm_value}
+            result = run_main_query(m, filters, mc, region_value, sm_value, period_value)
+        if result is None or not result['rows']:
             empty_table = dash_table.DataTable(columns=[], data=[])
-            return 'N/A','N/A','N/A','N/A','N/A','0', [], [html.Div([empty_table])], None, None, None
-
-        total_orders = df[mc["Order Amount"]].sum()
-        total_revenue = df[mc["Revenue Amount"]].sum()
-        total_cash = df[mc["Cash Amount"]].sum()
-        total_backlog = df['Backlog Amount'].sum() if 'Backlog Amount' in df.columns else 0
-        total_pending = df['Pending Amount'].sum() if 'Pending Amount' in df.columns else 0
-        po_count = df['PO REF'].nunique() if 'PO REF' in df.columns else 0
-
-        formatted = (
-            f"€{total_orders:,.0f}",
-            f"€{total_revenue:,.0f}",
-            f"€{total_cash:,.0f}",
-            f"€{total_backlog:,.0f}",
-            f"€{total_pending:,.0f}",
-            f"{po_count:,}"
-        )
+            return MAIN_EMPTY_KPIS, [], [html.Div([empty_table])], None, None, None, key
 
-        work_df = df.copy()
-        if period_value == 'Quarterly':
-            work_df['Period'] = work_df['Month'].dt.to_period('Q').astype(str)
-        else:
-            work_df['Period'] = work_df['Month'].dt.to_period('M').astype(str)
-
-        group_col = 'Region' if region_value or not sm_value else 'SM'
-        agg = work_df.groupby(['Period', group_col], as_index=False).agg({
-            mc['Revenue Amount']: 'sum',
-            mc['Order Amount']: 'sum',
-            mc['Cash Amount']: 'sum',
-            'Backlog Amount': 'sum',
-            'Pending Amount': 'sum'
-        }).rename(columns={
-            mc['Revenue Amount']: 'Revenue Amount',
-            mc['Order Amount']: 'Order Amount',
-            mc['Cash Amount']: 'Cash Amount',
-            'Backlog Amount': 'Backlog Amount',
-            'Pending Amount': 'Pending Amount'
-        })
-
-        # Chart 1: grouped bars for 3 measures by period and group
-        melted = agg.melt(id_vars=['Period', group_col], value_vars=['Revenue Amount', 'Order Amount', 'Cash Amount'], var_name='Measure', value_name='Amount')
-        fig1 = px.bar(melted, x='Period', y='Amount', color='Measure', pattern_shape=group_col, barmode='group', title=f"{period_value or 'Period'} Performance by {group_col}")
-        fig1.update_layout(title_font_size=12, title_x=0.5, margin=dict(t=40, b=20, l=20, r=20))
-
-        # Chart 2: line trend of measures by period
-        trend = agg.groupby('Period', as_index=False).agg({'Revenue Amount':'sum','Order Amount':'sum','Cash Amount':'sum'})
-        fig2 = px.line(trend, x='Period', y=['Revenue Amount','Order Amount','Cash Amount'], markers=True, title=f"{period_value or 'Period'} Trends")
-        fig2.update_layout(title_font_size=12, title_x=0.5, margin=dict(t=40, b=20, l=20, r=20))
+        kpis = kpi_numbers(result['kpis'], KPI_MEASURES + ['PO Count'])
+
+        group_col = result['group_col']
+        agg, trend = result['agg'], result['trend']
+
+        inputs = [year_value, region_value, sm_value, period_value]
+        fig1 = cached_figure(figure_cache_key(version, 'main', 'performance', inputs), lambda: main_performance_figure(result, period_value))
+        fig2 = cached_figure(figure_cache_key(version, 'main', 'trend', inputs), lambda: main_trend_figure(result, period_value))
 
         charts = html.Div([
             create_chart_card(fig1, 'main-chart1'),
@@ -2529,33 +3940,15 @@ def update_main_dashboard(year_value, region_value, sm_value, period_value, n_in
         # Summary table
         if period_value == 'Quarterly':
             # Build a compact quarterly pivot table for the selected year
-            sel_year = year_value if year_value else (df['Year'].max() if not df.empty else None)
+            sel_year = year_value if year_value else result['quarters']['Year'].max()
             if sel_year is None:
                 empty_table = dash_table.DataTable(columns=[], data=[])
                 table = empty_table
             else:
-                year_df = df.copy()
-                year_df = year_df[year_df['Year'] == sel_year]
-                # Ensure Month is datetime
-                year_df['Quarter'] = year_df['Month'].dt.quarter
-
-                measures_map = {
-                    'Order Amount': mc['Order Amount'],
-                    'Revenue Amount': mc['Revenue Amount'],
-                    'Cash Amount': mc['Cash Amount'],
-                    'Backlog Amount': 'Backlog Amount',
-                    'Pending Amount': 'Pending Amount'
-                }
-
-                # Aggregate sums per quarter
-                quarter_sums = {}
-                for m_name, col in measures_map.items():
-                    if col in year_df.columns:
-                        s = year_df.groupby('Quarter', as_index=False)[col].sum()
-                        s = s.set_index('Quarter')[col].to_dict()
-                    else:
-                        s = {}
-                    quarter_sums[m_name] = s
+                # Quarter sums of the selected year, taken from the shared aggregation pass
+                year_quarters = result['quarters']
+                year_quarters = year_quarters[year_quarters['Year'] == sel_year].set_index('Quarter')
+                quarter_sums = {m_name: year_quarters[m_name].to_dict() for m_name in KPI_MEASURES}
 
                 # Build rows: Measure + Q1..Q4 columns
                 col_names = [f"{sel_year}Q1", f"{sel_year}Q2", f"{sel_year}Q3", f"{sel_year}Q4"]
@@ -2602,15 +3995,15 @@ def update_main_dashboard(year_value, region_value, sm_value, period_value, n_in
                 export_format='csv',
             )
 
-        chart1_data = {'df': agg.to_json(orient='split'), 'title': fig1.layout.title.text}
-        chart2_data = {'df': trend.to_json(orient='split'), 'title': fig2.layout.title.text}
+        chart1_data = {'df': agg.to_json(orient='split'), 'title': fig1['layout']['title']['text']}
+        chart2_data = {'df': trend.to_json(orient='split'), 'title': fig2['layout']['title']['text']}
         filters = {k:v for k,v in [('Year', year_value), ('Region', region_value), ('SM', sm_value), ('PeriodType', period_value)] if v}
 
-        return *formatted, charts, [html.Div([table], style={'marginLeft': '2cm', 'marginRight': '2cm'})], json.dumps(chart1_data), json.dumps(chart2_data), json.dumps(filters)
+        return kpis, charts, [html.Div([table], style={'marginLeft': '2cm', 'marginRight': '2cm'})], json.dumps(chart1_data), json.dumps(chart2_data), json.dumps(filters), key
     except Exception as e:
-        print(f"Exception in update_main_dashboard: {e}")
+        logger.exception(f"Exception in update_main_dashboard: {e}")
         empty_table = dash_table.DataTable(columns=[], data=[])
-        return 'N/A','N/A','N/A','N/A','N/A','0', [], [html.Div([empty_table])], None, None, None
+        return MAIN_EMPTY_KPIS, [], [html.Div([empty_table])], None, None, None, None
 
 # Toggle fast refresh interval based on data_updated.txt presence
 @app.callback(
@@ -2630,24 +4023,26 @@ def export_main_chart1(n_clicks, chart_json, filter_json):
 def export_main_chart2(n_clicks, chart_json, filter_json):
     return _create_export_data(n_clicks, chart_json, filter_json)
 
+# Eager and preload startup load the data here, at the end of the import, once everything the load calls
+# (the figure pre-render included) is defined
+if STARTUP_MODE == 'eager':
+    _warmup.update(pid=os.getpid(), started=datetime.now().isoformat(timespec='seconds'))
+    initialize_data()
+elif STARTUP_MODE == 'preload':
+    # no threads before the fork: start_worker() starts the monitor or follower in the workers
+    _warmup.update(started=datetime.now().isoformat(timespec='seconds'))
+    _preload_started = time.perf_counter()
+    load_initial_model()
+    _warmup['seconds'] = round(time.perf_counter() - _preload_started, 3)
 
 
 if __name__ == "__main__":
-    print("Dashboard will be available at: http://localhost:8053")
-
-    # Run initial transformation from Google Sheets
-    print("Fetching data from Google Sheets...")
-    if get_google_sheets_data() is not None:
-        transform_data()
-        print("✅ Initial transformation completed")
-    else:
-        print("⚠️ Could not fetch from Google Sheets initially")
-
-    # Reload data after transformation
-    orders, revenues, cash, merged, measure_cols = load_data()
+    logger.info("Dashboard will be available at: http://localhost:8053")
 
-    # Note: Monitoring thread removed - data fetched from Google Sheets on demand
-    print("✅ Dashboard initialized successfully")
+    # Load the data before serving (eager mode already did during the import)
+    if STARTUP_MODE != 'eager':
+        start_warmup().join()
+    logger.info("Dashboard initialized successfully")
 
     # Use PORT env var when provided by the host (e.g., Render.com)
     port = int(os.environ.get("PORT", 8053))
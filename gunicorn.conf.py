@@ -0,0 +1,42 @@
+import gc
+import os
+
+# gunicorn -c gunicorn.conf.py dashboard:server
+#
+# With preload (the default) the master imports dashboard in STARTUP_MODE=preload: it loads the model once,
+# before forking, and starts no threads. The workers then share the model's memory pages copy-on-write, so an
+# extra worker costs little more than its own request handling. After the fork each worker starts its data
+# refresh. One worker (the holder of MONITOR_LOCK_FILE) polls the sheet, and the others load each new version
+# from the history store. GUNICORN_PRELOAD=0 makes every worker import and load the data itself (deferred).
+#
+# GUNICORN_PROFILE picks how requests are spread:
+#   processes (default)  WEB_CONCURRENCY sync workers (default 2), one request at a time each
+#   threads              one gthread worker with GUNICORN_THREADS threads (default 8), for small instances:
+#                        a single copy of the model serves every thread. Request handlers only read the
+#                        published model snapshot, and QUERY_CONCURRENCY bounds the aggregations (and their
+#                        scratch rows) running at once.
+# WEB_CONCURRENCY and GUNICORN_THREADS override either profile.
+
+PROFILES = {'processes': {'workers': 2, 'threads': 1}, 'threads': {'workers': 1, 'threads': 8}}
+profile = PROFILES[os.environ.get('GUNICORN_PROFILE', 'processes').lower()]
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8053')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', profile['workers']))
+threads = int(os.environ.get('GUNICORN_THREADS', profile['threads']))
+worker_class = 'gthread' if threads > 1 else 'sync'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1').lower() in ('1', 'true', 'yes')
+
+if preload_app:
+    os.environ['STARTUP_MODE'] = 'preload'
+
+def when_ready(server):
+    if preload_app:
+        # The app and its model are loaded (before the first fork): move them out of the collector's reach.
+        # A collection in a worker would otherwise write to the header of every object and copy the shared pages.
+        # The collector itself stays on in the master and the workers for everything created later.
+        gc.freeze()
+
+def post_fork(server, worker):
+    import dashboard
+    dashboard.start_worker()
@@ -0,0 +1,312 @@
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+from bench_threads import PAGE_PATHS, PERIODS, REGIONS, YEARS, MEASURES, get_json, start_server, write_history
+
+# Load test: virtual analysts replaying dashboard sessions against /_dash-update-component, to size how many
+# concurrent users a deployment handles. Each analyst lands on a page, then switches pages, changes dropdowns
+# and clicks KPI cards with think time in between, while its interval timers tick (flag check every 3 s, data
+# refresh every 10 min). Every action fires the server callbacks the browser would, in order, with inputs and
+# state taken from the responses so far (render keys, filter stores, synced dropdowns).
+#   python loadtest.py                                  20 analysts for 60 s on gunicorn with 100k synthetic rows
+#   python loadtest.py --users 50 --profile threads --threads 8 --record sessions.json
+#   python loadtest.py --replay sessions.json --url http://127.0.0.1:8053
+#                                                       replays recorded sessions against a running instance
+#   python loadtest.py --max-p95 1500                   exits 1 when a callback's p95 exceeds 1500 ms
+# Reports the throughput, and the calls, no-update (204) answers, errors and p50/p95/p99 of each callback.
+
+# First output (and, when shared, first input) of each server callback, by report name
+CALLBACKS = {
+    **{f'render {page}': (f'{page}-kpi-store.data', None) for page in PAGE_PATHS},
+    **{f'exports {page}': (f'{page}-export-rows-csv.href', None) for page in PAGE_PATHS},
+    **{f'restore {page}': (f'{dropdown}.value', 'url.pathname') for page, dropdown in
+       [('p1', 'dropdown1'), ('p2', 'region-dropdown1'), ('p3', 'sm-dropdown1'), ('p4', 'year-dropdown1')]},
+    'sync dropdowns': ('shared-dropdowns.data', 'region-dropdown1.value'),
+    'sync options': ('shared-dropdowns.data', 'dropdown1.options'),
+    'dropdown options': ('dropdown1.options', None),
+    'measure columns': ('measure-cols-store.data', None),
+    'main year options': ('main-year.options', None),
+    'main region options': ('main-region.options', None),
+    'flag check': ('fast-data-refresh-interval.disabled', None),
+}
+# Dropdowns an analyst changes on each page: (dropdown id, values to pick from; None clears it)
+PAGE_DROPDOWNS = {
+    'main': [('main-year', YEARS), ('main-region', REGIONS[:-1] + [None]), ('main-sm', [f'SM {i}' for i in range(1, 13)] + [None]),
+             ('main-period', PERIODS)],
+    **{page: [(ids[0], [f'Customer {i}' for i in range(1, 301)] + [None]), (ids[1], [f'Project {i}' for i in range(1, 81)] + [None]),
+              (ids[2], [f'SM {i}' for i in range(1, 13)] + [None]), (ids[3], REGIONS), (ids[4], YEARS), (ids[5], PERIODS)]
+       for page, ids in [('p1', ['dropdown1', 'dropdown2', 'dropdown3', 'p1-region-filter', 'year-filter1', 'p1-period-filter']),
+                         ('p2', ['region-dropdown1', 'region-dropdown2', 'region-dropdown3', 'specific-region-filter', 'region-year-filter', 'p2-period-filter']),
+                         ('p3', ['sm-dropdown1', 'sm-dropdown2', 'sm-dropdown3', 'sm-region-filter', 'sm-year-filter', 'p3-period-filter']),
+                         ('p4', ['year-dropdown1', 'year-dropdown2', 'year-dropdown3', 'year-region-filter', 'p4-year-filter', 'p4-period-filter'])]},
+}
+MEASURE_STORES = {'p1': 'measure-store', 'p2': 'region-measure-store', 'p3': 'sm-measure-store', 'p4': 'year-measure-store'}
+INTERVALS = {'flag-check-interval': 3, 'data-refresh-interval': 600}  # seconds, as in the layout
+ACTION_WEIGHTS = {'switch': 2, 'dropdown': 5, 'measure': 3}
+
+def session_script(rnd, seconds, think):
+    """Timed actions of one analyst session: [(at seconds, action, args)], interval ticks included."""
+    page = rnd.choice(list(PAGE_PATHS))
+    script = [(0.0, 'land', [page])]
+    at = 0.0
+    while True:
+        at += rnd.expovariate(1 / think)
+        if at >= seconds:
+            break
+        kind = rnd.choices(list(ACTION_WEIGHTS), weights=list(ACTION_WEIGHTS.values()))[0]
+        if kind == 'measure' and page == 'main':
+            kind = 'dropdown'  # the main page has no KPI card measures
+        if kind == 'switch':
+            page = rnd.choice([p for p in PAGE_PATHS if p != page])
+            script.append((at, 'switch', [page]))
+        elif kind == 'dropdown':
+            dropdown, values = rnd.choice(PAGE_DROPDOWNS[page])
+            script.append((at, 'dropdown', [page, dropdown, rnd.choice(values)]))
+        else:
+            script.append((at, 'measure', [page, rnd.choice(MEASURES)]))
+    for interval, every in INTERVALS.items():
+        script.extend((tick * every, 'tick', [interval]) for tick in range(1, int(seconds // every) + 1))
+    return sorted(script, key=lambda step: step[0])
+
+def initial_props(layout):
+    """{'id.property': value} of every component with an id in the layout, as the browser starts with."""
+    props = {}
+    stack = [layout]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif isinstance(node, dict):
+            if 'props' in node and 'type' in node:
+                component = node['props']
+                if isinstance(component.get('id'), str):
+                    props.update({f"{component['id']}.{k}": v for k, v in component.items() if k != 'children'})
+                stack.append(component.get('children'))
+    return props
+
+class Recorder:
+    """Latencies and statuses of every callback call, by callback name."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def add(self, name, status, seconds):
+        with self.lock:
+            self.calls.setdefault(name, []).append((status, seconds))
+
+    def report(self, elapsed):
+        total = sum(len(calls) for calls in self.calls.values())
+        print(f"{total} callbacks in {elapsed:.1f}s: {total / elapsed:.1f} req/s")
+        print(f"{'callback':<20} {'calls':>6} {'204':>5} {'errors':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        p95s = {}
+        for name, calls in sorted(self.calls.items()):
+            millis = np.array([seconds for _, seconds in calls]) * 1000
+            p50, p95, p99 = np.percentile(millis, [50, 95, 99])
+            p95s[name] = p95
+            print(f"{name:<20} {len(calls):>6} {sum(s == 204 for s, _ in calls):>5} {sum(s not in (200, 204) for s, _ in calls):>6} "
+                  f"{len(calls) / elapsed:>7.2f} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f}")
+        return p95s, sum(s not in (200, 204) for calls in self.calls.values() for s, _ in calls)
+
+class Analyst:
+    """One browser tab: the component properties it holds and the callbacks each action fires."""
+
+    def __init__(self, base, callbacks, props, recorder):
+        self.base, self.callbacks, self.recorder = base, callbacks, recorder
+        self.props = dict(props)
+        self.page = None
+
+    def call(self, name, changed):
+        dependency = self.callbacks[name]
+        def item(spec):
+            return {'id': spec['id'], 'property': spec['property'], 'value': self.props.get(f"{spec['id']}.{spec['property']}")}
+        outputs = [dict(zip(('id', 'property'), o.split('.', 1))) for o in dependency['output'].strip('.').split('...')]
+        inputs = [item(spec) for spec in dependency['inputs']]
+        triggered = [f"{i['id']}.{i['property']}" for i in inputs if f"{i['id']}.{i['property']}" in changed]
+        payload = {'output': dependency['output'], 'outputs': outputs if len(outputs) > 1 else outputs[0], 'inputs': inputs,
+                   'state': [item(spec) for spec in dependency['state']],
+                   'changedPropIds': triggered or [f"{inputs[0]['id']}.{inputs[0]['property']}"]}
+        req = urllib.request.Request(self.base + '/_dash-update-component', data=json.dumps(payload).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json', 'Accept-Encoding': 'gzip'})
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=120) as resp:
+                status, body = resp.status, resp.read()
+                if resp.headers.get('Content-Encoding') == 'gzip':
+                    body = gzip.decompress(body)
+        except urllib.error.HTTPError as e:
+            status, body = e.code, b''
+        except (urllib.error.URLError, ConnectionError, TimeoutError):
+            status, body = 0, b''
+        self.recorder.add(name, status, time.perf_counter() - started)
+        if status == 200 and body:
+            for component, values in json.loads(body).get('response', {}).items():
+                for prop, value in values.items():
+                    key = f"{component}.{prop.split('@')[0]}"
+                    self.props[key] = value
+                    changed.add(key)
+
+    def show(self, page, changed):
+        """Page switch: url and refresh token change, the page restores its dropdowns and renders."""
+        self.page = page
+        self.props['url.pathname'] = PAGE_PATHS[page]
+        self.props[f'{page}-refresh.data'] = time.time()
+        changed.update({'url.pathname', f'{page}-refresh.data'})
+        if page != 'main':
+            self.call(f'restore {page}', changed)
+        self.render(changed)
+
+    def render(self, changed):
+        self.call(f'render {self.page}', changed)
+        self.call(f'exports {self.page}', changed)
+
+    def act(self, action, args):
+        changed = set()
+        if action == 'land':
+            for name in ('measure columns', 'dropdown options', 'sync options', 'main year options', 'flag check'):
+                self.call(name, changed)
+            self.show(args[0], changed)
+        elif action == 'switch':
+            self.show(args[0], changed)
+        elif action == 'dropdown':
+            page, dropdown, value = args
+            self.props[f'{dropdown}.value'] = value
+            changed.add(f'{dropdown}.value')
+            if page == 'main':
+                if dropdown in ('main-year', 'main-region'):
+                    self.call('main region options', changed)
+            else:
+                self.call('sync dropdowns', changed)
+            self.render(changed)
+        elif action == 'measure':
+            page, measure = args
+            self.props[f'{MEASURE_STORES[page]}.data'] = measure
+            changed.add(f'{MEASURE_STORES[page]}.data')
+            self.render(changed)
+        elif action == 'tick':
+            interval = args[0]
+            self.props[f'{interval}.n_intervals'] = (self.props.get(f'{interval}.n_intervals') or 0) + 1
+            changed.add(f'{interval}.n_intervals')
+            if interval == 'flag-check-interval':
+                self.call('flag check', changed)
+            else:
+                for name in ('measure columns', 'dropdown options', 'sync options', 'main year options'):
+                    self.call(name, changed)
+                self.props[f'{self.page}-refresh.data'] = time.time()
+                self.render(changed)
+
+def resolve_callbacks(dependencies):
+    """Dependency entry of every callback in CALLBACKS."""
+    resolved = {}
+    for name, (first_output, first_input) in CALLBACKS.items():
+        for dependency in dependencies:
+            output = dependency['output'].strip('.').split('...')[0].split('@')[0]
+            if output == first_output and (first_input is None or
+                                           f"{dependency['inputs'][0]['id']}.{dependency['inputs'][0]['property']}" == first_input):
+                resolved[name] = dependency
+                break
+        else:
+            raise RuntimeError(f"no callback for {name} ({first_output})")
+    return resolved
+
+def run(base, scripts, seconds, recorder):
+    """Replay scripts with one thread per analyst (each starting again from its script's top) until seconds pass."""
+    callbacks = resolve_callbacks(get_json(base, '/_dash-dependencies'))
+    props = initial_props(get_json(base, '/_dash-layout'))
+    deadline = time.monotonic() + seconds
+    counts = {'sessions': 0, 'actions': 0}
+    lock = threading.Lock()
+
+    def analyst(script, offset):
+        time.sleep(offset)
+        while time.monotonic() < deadline:
+            user = Analyst(base, callbacks, props, recorder)
+            started = time.monotonic()
+            for at, action, args in script:
+                wait = started + at - time.monotonic()
+                if started + at >= deadline:
+                    return
+                if wait > 0:
+                    time.sleep(wait)
+                user.act(action, args)
+                with lock:
+                    counts['actions'] += 1
+            with lock:
+                counts['sessions'] += 1
+
+    rnd = random.Random(len(scripts))
+    threads = [threading.Thread(target=analyst, args=(script, rnd.uniform(0, 2))) for script in scripts]  # staggered arrival
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts, time.monotonic() - started
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay analyst sessions against the dashboard callbacks')
+    parser.add_argument('--users', type=int, default=20, help='concurrent analysts')
+    parser.add_argument('--seconds', type=float, default=60, help='test duration')
+    parser.add_argument('--session-seconds', type=float, default=120, help='length of one analyst session')
+    parser.add_argument('--think', type=float, default=3, help='mean think time between actions, in seconds')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--record', help='save the generated session scripts to this JSON file')
+    parser.add_argument('--replay', help='replay session scripts from this JSON file instead of generating them')
+    parser.add_argument('--url', help='test a running instance instead of starting one on synthetic data')
+    parser.add_argument('--rows', type=int, default=100_000, help='synthetic sheet rows')
+    parser.add_argument('--profile', choices=['processes', 'threads'], default='processes', help='GUNICORN_PROFILE of the server')
+    parser.add_argument('--workers', type=int, help='WEB_CONCURRENCY of the server (default: the profile\'s)')
+    parser.add_argument('--threads', type=int, help='GUNICORN_THREADS of the server (default: the profile\'s)')
+    parser.add_argument('--port', type=int, default=8092)
+    parser.add_argument('--max-p95', type=float, help='fail when a callback\'s p95 exceeds this many milliseconds')
+    args = parser.parse_args()
+
+    if args.replay:
+        with open(args.replay) as f:
+            scripts = [[tuple(step) for step in script] for script in json.load(f)]
+    else:
+        rnd = random.Random(args.seed)
+        scripts = [session_script(rnd, args.session_seconds, args.think) for _ in range(args.users)]
+    if args.record:
+        with open(args.record, 'w') as f:
+            json.dump(scripts, f)
+
+    server = None
+    base = args.url.rstrip('/') if args.url else f'http://127.0.0.1:{args.port}'
+    if not args.url:
+        workdir = tempfile.mkdtemp(prefix='loadtest_')
+        history_db = os.path.join(workdir, 'history.sqlite')
+        write_history(history_db, args.rows)
+        extra_env = {'GUNICORN_PROFILE': args.profile, 'FIGURE_CACHE_SIZE': os.environ.get('FIGURE_CACHE_SIZE', '128')}
+        if args.workers:
+            extra_env['WEB_CONCURRENCY'] = str(args.workers)
+        server = start_server(args.port, history_db, args.threads or (8 if args.profile == 'threads' else 1), workdir, extra_env)
+        print(f"gunicorn ({args.profile}) on {args.rows} synthetic rows")
+
+    recorder = Recorder()
+    try:
+        counts, elapsed = run(base, scripts, args.seconds, recorder)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+    print(f"{len(scripts)} analysts, {counts['sessions']} sessions completed, {counts['actions']} actions")
+    p95s, errors = recorder.report(elapsed)
+
+    failed = {name: p95 for name, p95 in p95s.items() if args.max_p95 is not None and p95 > args.max_p95}
+    if failed:
+        print(f"❌ p95 over {args.max_p95:g} ms: " + ', '.join(f"{name} {p95:.0f} ms" for name, p95 in failed.items()))
+    if errors:
+        print(f"❌ {errors} callbacks failed")
+    sys.exit(1 if failed or errors else 0)
@@ -0,0 +1,143 @@
+import os
+import random
+import sys
+
+import pandas as pd
+
+os.environ['HISTORY_DB'] = ''  # keep the check from writing its generated sheet to the history store
+os.environ['STARTUP_MODE'] = 'eager'  # no background warmer fetching alongside the check
+import dashboard
+
+# Parity check: every available query engine must return the same aggregates as the pandas path.
+# Runs on generated sheet data (including unparseable months and blank amounts), no credentials needed.
+
+def make_sheet(n=3000, seed=7):
+    rnd = random.Random(seed)
+    months = ['January/24', 'March/24', 'June/24', 'October/24', 'February/25', '5/22/2025', '8/22/2025', '1/22/2026', 'not a month']
+    rows = []
+    for _ in range(n):
+        rows.append({
+            'SM': rnd.choice(['Alice', 'Bob', 'Carol', 'Dan']),
+            'Month': rnd.choice(months),
+            'Customer': f'Customer {rnd.randint(1, 40)}',
+            'Project': f'Project {rnd.randint(1, 12)}',
+            'PO REF': f'PO{rnd.randint(1, 400)}',
+            'Region': rnd.choice(['North', 'South', 'East', 'West']),
+            'Order Amount': f"€{rnd.randint(100, 90000):,}.{rnd.randint(0, 99):02d}",
+            'Revenue Amount': f"€{rnd.randint(100, 90000):,}.00",
+            'Cash Amount': rnd.choice([f"€{rnd.randint(100, 90000):,}.00", 'nan']),
+            'Pending Amount': f"€{rnd.randint(0, 9000):,}.00",
+            'Backlog Amount': f"€{rnd.randint(0, 9000):,}.00",
+        })
+    return pd.DataFrame(rows)
+
+FILTERS = [
+    {},
+    {'Region': 'North'},
+    {'SM': 'Alice', 'Year': 2025},
+    {'Customer': 'Customer 3', 'Region': 'All'},
+    {'PO REF': 'PO7'},
+    {'SM': 'Nobody'},  # no rows
+]
+PERIODS = [None, 'Monthly', 'Quarterly']
+
+def assert_frames(a, b, what):
+    pd.testing.assert_frame_equal(a.reset_index(drop=True), b.reset_index(drop=True),
+                                  check_dtype=False, check_exact=False, rtol=1e-9, obj=what)
+
+def page_results(engine, merged, mc):
+    dashboard.QUERY_ENGINE = engine
+    results = {}
+    for page, spec in dashboard.PAGE_SPECS.items():
+        for filters in FILTERS:
+            for period in PERIODS:
+                for measure in ['Order Amount', 'Revenue Amount', 'Cash Amount']:
+                    key = (page, tuple(sorted(filters.items())), period, measure)
+                    results[key] = dashboard.run_page_query(spec, merged, filters, mc, mc[measure], period)
+    for filters in FILTERS:
+        for period in PERIODS:
+            key = ('main', tuple(sorted(filters.items())), period)
+            results[key] = dashboard.run_main_query(merged, filters, mc, filters.get('Region'), filters.get('SM'), period)
+    return results
+
+def compare(expected, actual):
+    for key, exp in expected.items():
+        act = actual[key]
+        assert exp['rows'] == act['rows'], f"{key}: rows {exp['rows']} != {act['rows']}"
+        for name, value in exp['kpis'].items():
+            assert abs(float(value) - float(act['kpis'][name])) <= 1e-6 * max(1.0, abs(float(value))), f"{key}: KPI {name}"
+        if key[0] == 'main':
+            for part in ['agg', 'trend', 'quarters']:
+                if exp[part] is not None:
+                    assert_frames(exp[part], act[part], f"{key} {part}")
+            continue
+        for (chart, exp_frame), (_, act_frame) in zip(exp['charts'], act['charts']):
+            assert_frames(exp_frame, act_frame, f"{key} chart {chart['name']}")
+        assert_frames(exp['summary'][1], act['summary'][1], f"{key} summary")
+
+def main():
+    sheet = make_sheet()
+    dashboard.get_google_sheets_data = lambda: sheet.copy()
+    print("Transforming generated sheet data...")
+    assert dashboard.transform_data(), "transform_data() failed"
+    model = dashboard.current_model()
+    merged, mc = model.merged, model.measure_cols
+
+    expected = page_results('pandas', merged, mc)
+    print(f"pandas: {len(expected)} queries")
+
+    failed = False
+    # distinct PO counts by period land on their own period, with rows without a Month in the data
+    assert merged['Month'].isna().any(), "generated sheet should have rows without a Month"
+    period_counts_ok = True
+    for period in ['Monthly', 'Quarterly']:
+        labelled = merged.assign(Period=merged['PeriodQ' if period == 'Quarterly' else 'PeriodM'].astype(object))
+        for keys in [('Period',), ('Period', 'Region')]:
+            reference = labelled.groupby(list(keys))['PO REF'].nunique().sort_index()
+            for engine in ['pandas', 'duckdb', 'polars']:
+                result = dashboard.aggregate_rows(merged, {}, [keys], [mc['Order Amount']], period=period, distinct=[keys], engine=engine)
+                counts = result['grouped'][keys].set_index(list(keys))['PO Count'].sort_index()
+                try:
+                    pd.testing.assert_series_equal(counts, reference, check_dtype=False, check_names=False, check_index_type=False)
+                except AssertionError as e:
+                    failed, period_counts_ok = True, False
+                    print(f"❌ {engine} PO counts by {keys} ({period}) differ from nunique: {e}")
+    if period_counts_ok:
+        print("✅ PO counts by period match nunique on every engine (rows without a Month included)")
+
+    # distinct PO counts per group too large for a bitmap are counted by sorting: same results
+    bitmap_cells = dashboard.PO_BITMAP_MAX_CELLS
+    dashboard.PO_BITMAP_MAX_CELLS = 0
+    try:
+        compare(expected, page_results('pandas', merged, mc))
+        print(f"✅ sorted distinct PO counts match the bitmaps on {len(expected)} queries")
+    except AssertionError as e:
+        failed = True
+        print(f"❌ sorted distinct PO counts differ from the bitmaps: {e}")
+    finally:
+        dashboard.PO_BITMAP_MAX_CELLS = bitmap_cells
+
+    for engine, module in [('duckdb', 'duckdb'), ('polars', 'polars')]:
+        try:
+            __import__(module)
+        except ImportError:
+            print(f"⚠️ {engine} not installed, skipped")
+            continue
+        # the engines fall back to pandas on errors, so make failures visible instead
+        def no_fallback(*args):
+            raise AssertionError(f"{engine} fell back to pandas")
+        fallback = dashboard._aggregate_pandas
+        dashboard._aggregate_pandas = no_fallback
+        try:
+            compare(expected, page_results(engine, merged, mc))
+            print(f"✅ {engine} matches pandas on {len(expected)} queries")
+        except AssertionError as e:
+            failed = True
+            print(f"❌ {engine} differs from pandas: {e}")
+        finally:
+            dashboard._aggregate_pandas = fallback
+
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
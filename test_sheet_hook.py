@@ -0,0 +1,117 @@
+import argparse
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pandas as pd
+
+# Simulates the Apps Script trigger calling /hooks/sheet-changed.
+#   python test_sheet_hook.py                     local check against the Flask test client (no credentials needed)
+#   python test_sheet_hook.py --url http://localhost:8050 --secret <SHEET_HOOK_SECRET> [--count 5]
+#                                                 POSTs a burst of hooks to a running dashboard
+
+def post_hook(url, secret, count, gap):
+    for i in range(count):
+        req = urllib.request.Request(url.rstrip('/') + '/hooks/sheet-changed', data=b'{}', method='POST',
+                                     headers={'X-Hook-Secret': secret, 'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(req, timeout=10) as resp:
+                print(f"hook {i + 1}: {resp.status} {resp.read().decode()}")
+        except urllib.error.HTTPError as e:
+            print(f"hook {i + 1}: {e.code} {e.read().decode()}")
+            return 1
+        time.sleep(gap)
+    return 0
+
+def sheet(amount):
+    return pd.DataFrame([{
+        'SM': 'Alice', 'Month': 'March/25', 'Customer': 'Customer 1', 'Project': 'Project 1', 'PO REF': 'PO1',
+        'Region': 'North', 'Order Amount': f"€{amount:,}.00", 'Revenue Amount': '€100.00', 'Cash Amount': '€50.00',
+        'Pending Amount': '€0.00', 'Backlog Amount': '€0.00',
+    }])
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+def local_check():
+    os.environ['HISTORY_DB'] = ''  # keep the check from writing a history file
+    os.environ['STARTUP_MODE'] = 'eager'  # no background warmer fetching alongside the check
+    import dashboard
+
+    fetches = []
+    current = {'df': sheet(1000)}
+    def fake_fetch():
+        fetches.append(time.monotonic())
+        time.sleep(0.2)  # a slow fetch, so hooks can arrive while a refresh runs
+        return current['df'].copy()
+
+    dashboard.get_google_sheets_data = fake_fetch
+    dashboard.SHEET_HOOK_SECRET = 'test-secret'
+    dashboard.HOOK_DEBOUNCE_SECONDS = 0.3
+    dashboard.HOOK_STAMP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.test_sheet_changed.stamp')
+    client = dashboard.server.test_client()
+    failed = []
+
+    def check(ok, what):
+        print(f"{'✅' if ok else '❌'} {what}")
+        if not ok:
+            failed.append(what)
+
+    check(client.post('/hooks/sheet-changed').status_code == 401, "missing secret is rejected")
+    check(client.post('/hooks/sheet-changed', headers={'X-Hook-Secret': 'wrong'}).status_code == 401, "wrong secret is rejected")
+
+    def refresh_idle():
+        # a refresh runs past the data swap while it pre-renders the default figures
+        return dashboard._refresh_state['due'] is None and not dashboard._refresh_state['running']
+
+    # a burst of edits coalesces into one refresh once the sheet is quiet
+    version = dashboard.current_model().version
+    fetches.clear()
+    for _ in range(5):
+        check(client.post('/hooks/sheet-changed', headers={'X-Hook-Secret': 'test-secret'}).status_code == 202, "hook accepted")
+        time.sleep(0.05)
+    check(wait_for(lambda: dashboard.current_model().version > version), "burst of hooks refreshes the data")
+    wait_for(refresh_idle)
+    time.sleep(0.5)
+    check(len(fetches) == 1, f"burst of 5 hooks fetched the sheet once (fetches: {len(fetches)})")
+
+    # hooks arriving while a refresh runs schedule exactly one follow-up refresh with the newer data
+    current['df'] = sheet(2000)
+    fetches.clear()
+    client.post('/hooks/sheet-changed', headers={'X-Hook-Secret': 'test-secret'})
+    check(wait_for(lambda: dashboard._refresh_state['running']), "refresh started")
+    current['df'] = sheet(3000)
+    for _ in range(3):
+        client.post('/hooks/sheet-changed', headers={'X-Hook-Secret': 'test-secret'})
+    check(wait_for(lambda: dashboard.current_model().merged['Order Amount'].sum() == 3000), "edit made during a refresh is picked up")
+    wait_for(refresh_idle)
+    time.sleep(0.5)
+    check(len(fetches) == 2, f"hooks during a refresh coalesce into one follow-up (fetches: {len(fetches)})")
+
+    # a hook received by another worker shows up as a newer stamp file and schedules a refresh here
+    current['df'] = sheet(4000)
+    with open(dashboard.HOOK_STAMP_FILE, 'a'):
+        os.utime(dashboard.HOOK_STAMP_FILE, ns=(time.time_ns(), time.time_ns() + 10**9))
+    dashboard.monitoring_active = True
+    threading.Thread(target=dashboard._wait_for_next_poll, args=(3,), daemon=True).start()
+    check(wait_for(lambda: dashboard.current_model().merged['Order Amount'].sum() == 4000), "hook stamp from another worker triggers a refresh")
+    os.remove(dashboard.HOOK_STAMP_FILE)
+
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulate the sheet-changed hook')
+    parser.add_argument('--url', help='base URL of a running dashboard; omit for the local check')
+    parser.add_argument('--secret', default=os.environ.get('SHEET_HOOK_SECRET', ''))
+    parser.add_argument('--count', type=int, default=5, help='hooks in the burst')
+    parser.add_argument('--gap', type=float, default=0.2, help='seconds between hooks')
+    args = parser.parse_args()
+    sys.exit(post_hook(args.url, args.secret, args.count, args.gap) if args.url else local_check())